@@ -0,0 +1,103 @@
+"""
+Accuracy of coarse time steps against the monthly reference.
+
+Runs the same scenarios with annual time steps (run_simulation's time_step /
+stock_step="annual") and on the event-driven engine (closed-form stretches
+between events), and reports, per option, the error in final net wealth (and in
+total stock withdrawals) against monthly steps and the speedup, so a sweep can
+pick its speed / accuracy tradeoff knowingly. It runs a default set and a
+withdrawal-heavy set (rent above the owner's costs for years), where averaging
+contributions over a period would hide the withdrawals:
+
+    python accuracy.py
+
+"Flips" counts scenarios where the coarse run picks the other winner
+(House - Stock changes sign), the error that actually changes a conclusion.
+"""
+import time
+
+import numpy as np
+
+import metrics
+import simulation
+import warmup
+
+# Label -> run_simulation options, compared against monthly steps
+STEPS = {
+    "annual": {"time_step": "annual"},
+    "events": {"engine": "events"},
+}
+
+OUTPUTS = {
+    "House Net": lambda r: r["final_house_net"],
+    "Stock Net": lambda r: r["final_stock_net"],
+    "House - Stock": lambda r: r["final_house_net"] - r["final_stock_net"],
+    "Withdrawals": lambda r: r["total_stock_withdrawals"],
+}
+
+
+def default_scenarios():
+    """Every city, every 5th start year, staying put or moving every 7 years."""
+    return [{**s, "move_freq_years": move}
+            for s in warmup.popular_scenarios(start_years=range(1975, 2021, 5))
+            for move in ("Never", 7)]
+
+
+def withdrawal_scenarios():
+    """
+    Scenarios where rent outgrows the owner's costs, so the stock side withdraws for years:
+    a 15-year mortgage paid off mid-run (every city, every 5th start year), and 5% down
+    over 30 years against a $3,000 rent (every city, 2005-2020).
+    """
+    short = [warmup.app_scenario(**{**warmup.DEFAULTS, "city": city, "start_year": year, "amortization": 15})
+             for city in warmup.POPULAR_CITIES for year in range(1975, 2011, 5)]
+    high_rent = [warmup.app_scenario(**{**warmup.DEFAULTS, "city": city, "start_year": year,
+                                        "down_payment_pct": 5, "amortization": 30, "initial_rent": 3000})
+                 for city in warmup.POPULAR_CITIES for year in range(2005, 2021, 5)]
+    return short + high_rent
+
+
+def _run_all(scenarios, options):
+    start = time.perf_counter()
+    results = [simulation.run_simulation(**s, summary_only=True, **options) for s in scenarios]
+    seconds = time.perf_counter() - start
+    return {name: np.array([output(r) for r in results]) for name, output in OUTPUTS.items()}, seconds
+
+
+@metrics.timed("hvs_accuracy", "accuracy_report")
+def accuracy_report(scenarios=None, steps=STEPS):
+    """
+    Error of each coarse option in `steps` against monthly steps over `scenarios`
+    (run_simulation arguments, default_scenarios() by default).
+    Returns one row per option and output: mean / max absolute error ($), max relative
+    error (against the monthly value), winner flips, and the speedup over monthly steps.
+    """
+    scenarios = scenarios if scenarios is not None else default_scenarios()
+    reference, reference_seconds = _run_all(scenarios, {})
+    rows = []
+    for label, options in steps.items():
+        values, seconds = _run_all(scenarios, options)
+        flips = int(np.sum(np.sign(values["House - Stock"]) != np.sign(reference["House - Stock"])))
+        for name in OUTPUTS:
+            error = np.abs(values[name] - reference[name])
+            rows.append({
+                "Time Step": label,
+                "Output": name,
+                "Mean Abs Error": float(error.mean()),
+                "Max Abs Error": float(error.max()),
+                "Max Rel Error": float(np.max(error / np.maximum(np.abs(reference[name]), 1.0))),
+                "Flips": flips,
+                "Speedup": reference_seconds / seconds,
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    for title, scenarios in (("default", default_scenarios()), ("withdrawal-heavy", withdrawal_scenarios())):
+        rows = accuracy_report(scenarios)
+        print(f"{len(scenarios)} {title} scenarios, error against monthly steps")
+        print(f"{'Time Step':<20}{'Output':<15}{'Mean $':>12}{'Max $':>12}{'Max %':>9}{'Flips':>7}{'Speedup':>9}")
+        for r in rows:
+            print(f"{r['Time Step']:<20}{r['Output']:<15}{r['Mean Abs Error']:>12,.0f}{r['Max Abs Error']:>12,.0f}"
+                  f"{r['Max Rel Error'] * 100:>9.3f}{r['Flips']:>7}{r['Speedup']:>8.1f}x")
+        print()
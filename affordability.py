@@ -0,0 +1,121 @@
+"""
+Mortgage affordability per city and year.
+
+Income needed to qualify for the average house, using the lender's debt
+service ratios:
+  GDS = (mortgage payment + property tax + insurance) / gross monthly income
+  TDS = (GDS costs + other debt payments) / gross monthly income
+with the payment qualified at the stress-test rate (MORTGAGE_RATES + buffer,
+never below the floor).
+
+Every housing cost is proportional to the price, so the inverse (the largest
+price an income qualifies for) is closed-form. Both are computed for the whole
+city x year x down payment grid in one vectorized pass.
+"""
+import numpy as np
+import pandas as pd
+
+import data_loader
+import models
+import warmup
+
+# Lender limits (CMHC: GDS 39%, TDS 44%)
+GDS_LIMIT = 0.39
+TDS_LIMIT = 0.44
+
+# Stress test: qualify at contract rate + 2%, minimum 5.25%
+STRESS_BUFFER = 0.02
+STRESS_FLOOR = 0.0525
+
+DOWN_PAYMENT_PCTS = (5, 10, 20)
+
+_FRAME_COLUMNS = {
+    "price": "Price",
+    "monthly_payment": "Monthly Payment (Stress Rate)",
+    "monthly_property_tax": "Monthly Property Tax",
+    "monthly_insurance": "Monthly Insurance",
+    "gds_income": "GDS Income",
+    "tds_income": "TDS Income",
+    "required_income": "Required Income",
+}
+
+
+def _rates(cities, years, stress_buffer, stress_floor):
+    """(contract rates, qualifying rates) per year and property tax rates per city, as fractions."""
+    rates = np.array([data_loader.get_mortgage_rate(y) / 100.0 for y in years])
+    qualifying_rates = np.maximum(rates + stress_buffer, stress_floor)
+    tax_rates = np.array([data_loader.get_property_tax_rate(c) / 100.0 for c in cities])
+    return rates, qualifying_rates, tax_rates
+
+
+def affordability_table(cities=warmup.CITIES, years=range(1975, 2025), down_payment_pcts=DOWN_PAYMENT_PCTS,
+                        amortization_years=25, monthly_debts=0.0, stress_buffer=STRESS_BUFFER,
+                        stress_floor=STRESS_FLOOR, insurance_rate=warmup.INSURANCE_RATE):
+    """
+    Income needed to buy the average house, as (city, year, down payment) arrays.
+    Returns a dict: cities, years, down_payment_pcts, price, mortgage_rate,
+    qualifying_rate, monthly_payment, monthly_property_tax, monthly_insurance,
+    gds_income, tds_income, required_income (annual, the larger of the two).
+    """
+    cities, years = list(cities), np.asarray(list(years))
+    prices = np.array([[data_loader.get_housing_price(y, c) for y in years] for c in cities], dtype=float)
+    rates, qualifying_rates, tax_rates = _rates(cities, years, stress_buffer, stress_floor)
+    down_fraction = np.asarray(down_payment_pcts, dtype=float) / 100.0
+
+    price = prices[:, :, None]
+    loan = price * (1 - down_fraction)[None, None, :]
+    payment = models.mortgage_payment(loan, qualifying_rates[None, :, None], amortization_years)
+    property_tax = np.broadcast_to(price * tax_rates[:, None, None] / 12, loan.shape)
+    insurance = np.broadcast_to(price * insurance_rate / 12, loan.shape)
+    housing_costs = payment + property_tax + insurance
+
+    gds_income = housing_costs / GDS_LIMIT * 12
+    tds_income = (housing_costs + monthly_debts) / TDS_LIMIT * 12
+    return {
+        "cities": cities,
+        "years": years,
+        "down_payment_pcts": np.asarray(down_payment_pcts),
+        "price": np.broadcast_to(price, loan.shape),
+        "mortgage_rate": rates,
+        "qualifying_rate": qualifying_rates,
+        "monthly_payment": payment,
+        "monthly_property_tax": property_tax,
+        "monthly_insurance": insurance,
+        "gds_income": gds_income,
+        "tds_income": tds_income,
+        "required_income": np.maximum(gds_income, tds_income),
+    }
+
+
+def max_affordable_price(income, cities=warmup.CITIES, years=range(1975, 2025), down_payment_pcts=DOWN_PAYMENT_PCTS,
+                         amortization_years=25, monthly_debts=0.0, stress_buffer=STRESS_BUFFER,
+                         stress_floor=STRESS_FLOOR, insurance_rate=warmup.INSURANCE_RATE):
+    """
+    Largest price a gross annual income qualifies for, as a (city, year, down payment) array.
+    Costs are linear in price, so price = min(GDS room, TDS room) / monthly cost per dollar.
+    """
+    _, qualifying_rates, tax_rates = _rates(cities, years, stress_buffer, stress_floor)
+    down_fraction = np.asarray(down_payment_pcts, dtype=float) / 100.0
+
+    cost_per_dollar = (models.mortgage_payment(1 - down_fraction[None, None, :], qualifying_rates[None, :, None],
+                                               amortization_years)
+                       + tax_rates[:, None, None] / 12 + insurance_rate / 12)
+    monthly_income = np.asarray(income, dtype=float) / 12
+    room = np.minimum(GDS_LIMIT * monthly_income, TDS_LIMIT * monthly_income - monthly_debts)
+    return np.maximum(room, 0.0) / cost_per_dollar
+
+
+def to_frame(table):
+    """Long DataFrame (one row per city / year / down payment) of an affordability_table()."""
+    shape = table["price"].shape
+    city_idx, year_idx, dp_idx = np.indices(shape).reshape(3, -1)
+    frame = pd.DataFrame({
+        "City": np.asarray(table["cities"], dtype=object)[city_idx],
+        "Year": table["years"][year_idx],
+        "Down Payment (%)": table["down_payment_pcts"][dp_idx],
+        "Mortgage Rate": table["mortgage_rate"][year_idx],
+        "Qualifying Rate": table["qualifying_rate"][year_idx],
+    })
+    for name, column in _FRAME_COLUMNS.items():
+        frame[column] = table[name].reshape(-1)
+    return frame
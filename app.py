@@ -1,17 +1,44 @@
-
+import os
+import time
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import simulation
-import importlib
-importlib.reload(simulation)
-import models
-importlib.reload(models)
-import data_loader
-importlib.reload(data_loader)
+import plotly.graph_objects as go
+import attribution
+import cache
+import export
+import warmup
+import stress
+import metrics
+import affordability
+import surface
 
 st.set_page_config(page_title="Housing vs Stocks Model", layout="wide")
 
+@st.cache_resource
+def start_cache_warmup():
+    # Once per server process: precompute default + popular scenarios in the background
+    return warmup.start_background_warmup()
+
+start_cache_warmup()
+
+@st.cache_resource
+def start_metrics_endpoint():
+    # Prometheus scrape endpoint, once per server process (opt-in)
+    port = os.environ.get("HVS_METRICS_PORT")
+    return metrics.start_http_server(int(port)) if port else None
+
+start_metrics_endpoint()
+
+
+@st.cache_resource
+def load_surface():
+    # Precomputed outcome surface for the live preview (None until `python surface.py` has been run)
+    return surface.load()
+
+app_run_seconds = metrics.histogram("hvs_app_run_seconds", "Run Simulation button, click to rendered results")
+app_runs = metrics.counter("hvs_app_run_total", "Run Simulation button clicks")
+
 st.title("🏡 Housing vs 📈 Stock Market: Wealth Accumulation Model")
 st.markdown("Compare the historical performance of buying a home in Canada vs investing the equivalent capital in the S&P 500.")
 
@@ -31,120 +58,144 @@ city = st.sidebar.selectbox("City", ["National", "Toronto", "Vancouver", "Calgar
 marginal_tax = st.sidebar.slider("Marginal Tax Rate (%)", 0, 54, 40)
 move_freq = st.sidebar.select_slider("Move Home Every X Years (Friction Costs)", options=["Never", 5, 7, 10, 15], value="Never")
 
-if st.sidebar.button("Run Simulation", type="primary"):
-    # Run Simulation
-    # Estimate Costs automatically
-    est_property_tax = data_loader.get_property_tax_rate(city)
-    
-    # Estimate Insurance: ~0.2% of purchase price annually, divided by 12
+st.sidebar.markdown("---")
+compare_enabled = st.sidebar.checkbox("Explain Gap vs Another Scenario", value=False,
+                                      help="Attributes the difference in outcome to rates, rent, prices, stock returns, tax rules, etc.")
+compare_city = compare_year = None
+if compare_enabled:
+    compare_city = st.sidebar.selectbox("Compare City", ["National", "Toronto", "Vancouver", "Calgary", "Montreal"], index=0)
+    compare_year = st.sidebar.slider("Compare Start Year", 1975, 2020, 2005)
+run_stress = st.sidebar.checkbox("Run Stress Tests", value=False,
+                                 help="Rate spike, price drop, stock crash, rent freeze... applied on top of the historical data.")
+show_affordability = st.sidebar.checkbox("Show Affordability", value=False,
+                                         help="Income needed to qualify for the average house (GDS/TDS at the stress-test rate).")
+household_income = None
+if show_affordability:
+    household_income = st.sidebar.number_input("Household Income ($/yr)", value=100000, step=5000)
+
+# Everything the model reads. The results on screen belong to the inputs of the last Run click.
+inputs = {
+    "start_year": start_year, "amortization": amortization, "down_payment_pct": down_payment_pct,
+    "initial_rent_override": initial_rent_override, "city": city, "marginal_tax": marginal_tax,
+    "move_freq": move_freq, "compare_city": compare_city, "compare_year": compare_year,
+    "run_stress": run_stress, "household_income": household_income,
+}
+
+
+def run_model(inputs):
+    """
+    All the model work for one Run click. The result is kept in st.session_state, so
+    reruns that only change the view (chart options, tables) never touch the model.
+    """
+    # Estimate Costs automatically (Property Tax by city, Insurance ~0.2% of purchase price annually)
     # e.g. 500k house -> $1,000/yr -> $83/mo. 1M house -> $166/mo.
-    # We calculate the start year price first to get this estimate
-    # (simulation does this internally but we need it for the args, or let simulation handle it?
-    # Simulation takes raw values. Let's get price here.)
-    start_price = data_loader.get_housing_price(start_year, city)
-    est_monthly_insurance = (start_price * 0.002) / 12
-    
-    results = simulation.run_simulation(
-        start_year=start_year, 
-        mortgage_years=amortization, 
-        down_payment_pct=down_payment_pct,
-        initial_rent=initial_rent_override,
-        city=city,
-        marginal_tax_rate=marginal_tax/100.0,
-        move_freq_years=move_freq,
-        property_tax_rate_pct=est_property_tax,
-        monthly_insurance=est_monthly_insurance
-    )
-    
-    history_df = pd.DataFrame(results['history'])
-    
-    st.subheader(f"Results for {city} ({start_year}-2024)")
-    
-    # Starting Conditions
-    st.markdown("### 🏁 Starting Conditions")
-    col_start1, col_start2, col_start3 = st.columns(3)
-    
-    with col_start1:
-        st.metric("Home Purchase Price", f"${results['start_house_price']:,.0f}")
-    with col_start2:
-        # Calculate mortgage amount for display
-        mortgage_amt = results['start_house_price'] - results['initial_down_payment']
-        st.metric("Mortgage Amount", f"${mortgage_amt:,.0f}")
-        st.caption(f"Estimated Tax: {est_property_tax}% | Ins: ${est_monthly_insurance:,.0f}/mo")
-    with col_start3:
-        st.metric("Initial Capital (Stocks)", f"${results['total_initial_capital']:,.0f}", 
-                 help=f"Includes Down Payment (${results['initial_down_payment']:,.0f}) + Closing Costs (${results['closing_costs_paid']:,.0f}) saved.")
-        st.caption(f"Fees: 0.15% MER | Tax Drag: {1.8 * marginal_tax/100.0:.2f}% (Taxable)")
+    # Same arguments the startup warm-up uses, so warmed scenarios are cache hits.
+    scenario_current = warmup.app_scenario(inputs["start_year"], inputs["amortization"], inputs["down_payment_pct"],
+                                           inputs["initial_rent_override"], inputs["city"], inputs["marginal_tax"],
+                                           inputs["move_freq"])
+    results = cache.cached_run_simulation(**scenario_current)
+    run = {
+        "inputs": inputs,
+        "scenario": scenario_current,
+        "results": results,
+        "history_df": pd.DataFrame(results['history']),
+        "gap": None,
+        "stress_df": None,
+        "afford_df": None,
+    }
 
-    st.divider()
+    if inputs["compare_city"] is not None:
+        scenario_base = warmup.app_scenario(inputs["compare_year"], inputs["amortization"], inputs["down_payment_pct"],
+                                            inputs["initial_rent_override"], inputs["compare_city"],
+                                            inputs["marginal_tax"], inputs["move_freq"])
+        run["gap"] = attribution.attribute_gap(scenario_base, scenario_current)
 
-    # Final Results
-    st.markdown("### 🏁 Final Outcome (After 25+ Years)")
-    
-    # --- VERDICT BANNER ---
-    final_equity_net = results['final_house_net']
-    final_stock_net = results['final_stock_net']
-    diff = final_equity_net - final_stock_net
-    winner = "Buying a Home" if diff > 0 else "Investing in Stocks"
-    win_amount = abs(diff)
-    
-    st.markdown("### 🏆 The Verdict")
-    if diff > 0:
-        st.success(f"**{winner}** was the better financial decision by **${win_amount:,.0f}**!")
-    else:
-        st.info(f"**{winner}** was the better financial decision by **${win_amount:,.0f}**!")
+    if inputs["run_stress"]:
+        run["stress_df"] = pd.DataFrame(stress.run_stress_tests(scenario_current))
 
-    # --- MAIN CHART (Net Wealth) ---
+    if inputs["household_income"] is not None:
+        dp_options = sorted({*affordability.DOWN_PAYMENT_PCTS, inputs["down_payment_pct"]})
+        afford_years = range(1975, 2025)
+        afford_df = affordability.to_frame(affordability.affordability_table(
+            cities=[inputs["city"]], years=afford_years, down_payment_pcts=dp_options,
+            amortization_years=inputs["amortization"]))
+        afford_df["Max Price for Income"] = affordability.max_affordable_price(
+            inputs["household_income"], cities=[inputs["city"]], years=afford_years, down_payment_pcts=dp_options,
+            amortization_years=inputs["amortization"]).reshape(-1)
+        afford_df["Down Payment"] = afford_df["Down Payment (%)"].astype(str) + "% down"
+        run["afford_df"] = afford_df
+    return run
+
+
+# --- Panels ---
+# Panels with their own view options are fragments: changing an option reruns that panel only.
+# Built figures are kept with the run (per view option), so reruns only send them again.
+
+def cached_figure(run, key, build):
+    figures = run.setdefault("figures", {})
+    if key not in figures:
+        figures[key] = build()
+    return figures[key]
+
+
+def net_wealth_figure(history_df, real, y_axis_type):
+    house, stock = ("Real House Equity", "Real Stock Balance") if real else ("House Equity", "Stock Balance")
+    chart_df = history_df[['Date', house, stock]].melt('Date', var_name='Scenario', value_name='Net Worth')
+    fig = px.line(chart_df, x='Date', y='Net Worth', color='Scenario', markers=False,
+                  color_discrete_map={house: "#1f77b4", stock: "#2ca02c"})
+    fig.update_layout(xaxis_title="Year", yaxis_title="Net Worth (Real $)" if real else "Net Worth ($)",
+                      hovermode="x unified", yaxis_type=y_axis_type)
+    return fig
+
+
+@st.fragment
+def net_wealth_panel(run):
     st.markdown("### 📈 Net Wealth Over Time")
-    
+    log_scale = st.toggle("Log scale", value=False, key="net_wealth_log_scale")
+    y_axis_type = "log" if log_scale else "linear"
+
     tab_nom, tab_real = st.tabs(["Nominal ($)", "Inflation Adjusted (Real $)"])
-    
+
     with tab_nom:
         st.caption("Tracking **Net Worth** (Nominal). Homeowner = Equity (Value - Debt). Renter = Investment Portfolio.")
-        chart_df = history_df[['Date', 'House Equity', 'Stock Balance']].melt('Date', var_name='Scenario', value_name='Net Worth')
-        fig = px.line(chart_df, x='Date', y='Net Worth', color='Scenario', markers=False,
-                      color_discrete_map={
-                          "House Equity": "#1f77b4", 
-                          "Stock Balance": "#2ca02c"
-                      })
-        fig.update_layout(xaxis_title="Year", yaxis_title="Net Worth ($)", hovermode="x unified")
+        fig = cached_figure(run, ("net_wealth", False, y_axis_type),
+                            lambda: net_wealth_figure(run["history_df"], False, y_axis_type))
         st.plotly_chart(fig, use_container_width=True)
-        
+
     with tab_real:
         st.caption("Tracking **Wealth (Buying Power)** adjusted for Inflation.")
-        chart_df_real = history_df[['Date', 'Real House Equity', 'Real Stock Balance']].melt('Date', var_name='Scenario', value_name='Net Worth')
-        fig_real = px.line(chart_df_real, x='Date', y='Net Worth', color='Scenario', markers=False,
-                           color_discrete_map={
-                               "Real House Equity": "#1f77b4", 
-                               "Real Stock Balance": "#2ca02c"
-                           })
-        fig_real.update_layout(xaxis_title="Year", yaxis_title="Net Worth (Real $)", hovermode="x unified")
+        fig_real = cached_figure(run, ("net_wealth", True, y_axis_type),
+                                 lambda: net_wealth_figure(run["history_df"], True, y_axis_type))
         st.plotly_chart(fig_real, use_container_width=True)
-    
+
     with st.expander("ℹ️ How is this calculated?"):
         st.markdown("""
         *   **Stock Strategy**: The Renter takes the *exact* monthly cash flow difference (Mortgage + Tax + Maint - Rent) and invests it in the S&P 500.
+            When rent is the higher cost, the Renter withdraws the difference (Taxable first, then TFSA, then RRSP) and pays tax on the realized gains.
         *   **Housing Strategy**: The Homeowner builds equity by paying down principal and benefiting from property appreciation.
         """)
 
+
+def burn_panel(run):
     # --- UNRECOVERABLE COSTS ("THE BURN CHART") ---
+    results = run["results"]
     st.markdown("### 🔥 Unrecoverable Costs (Where did the money go?)")
     st.info("""
-    **"Rent is throwing money away."** — We hear this all the time. 
-    But Owning has **unrecoverable costs** too: Mortgage Interest (profit for the bank), Maintenance (profit for the glimmer), Property Taxes, and Transaction Fees. 
+    **"Rent is throwing money away."** — We hear this all the time.
+    But Owning has **unrecoverable costs** too: Mortgage Interest (profit for the bank), Maintenance (profit for the glimmer), Property Taxes, and Transaction Fees.
     This chart compares the total "burnt" cash in both scenarios.
     """)
-    
+
     # Calculate Totals First
     total_rent_burn = results['total_rent_paid'] + results['total_stock_fees'] + results['total_stock_tax_drag']
-    total_home_burn = (results['total_mortgage_interest'] + 
-                       results['total_maintenance'] + 
+    total_home_burn = (results['total_mortgage_interest'] +
+                       results['total_maintenance'] +
                        results['total_property_tax'] +
                        results['total_insurance'] +
-                       results['closing_costs_paid'] + 
-                       results['selling_costs_estimated'] + 
+                       results['closing_costs_paid'] +
+                       results['selling_costs_estimated'] +
                        results['total_transaction_friction'])
-    
+
     # Display Totals as Big Metrics
     col_burn1, col_burn2 = st.columns(2)
     with col_burn1:
@@ -170,9 +221,24 @@ if st.sidebar.button("Run Simulation", type="primary"):
         ],
         "Scenario": ["Renter", "Renter", "Renter", "Homeowner", "Homeowner", "Homeowner", "Homeowner", "Homeowner", "Homeowner", "Homeowner"]
     }
+    fig_burn = cached_figure(run, "burn", lambda: burn_figure(burn_data))
+    st.plotly_chart(fig_burn, use_container_width=True)
+
+    # Check if Buying actually "Burned" more than Renting
+    # Always show the Burn Comparison
+    burn_diff = total_home_burn - total_rent_burn
+
+    if burn_diff > 0:
+        msg = f"⚠️ **Myth Buster**: The Homeowner 'threw away' **&#36;{total_home_burn:,.0f}** on interest, maintenance, tax, and fees, while the Renter 'burned' **&#36;{total_rent_burn:,.0f}** on rent and investment friction!"
+        st.warning(msg)
+    else:
+        st.info(f"✅ **Reality Check**: In this expensive rental market, the Homeowner's unrecoverable costs (**&#36;{total_home_burn:,.0f}**) are actually LOWER than the Renter's total burn (**&#36;{total_rent_burn:,.0f}**). Owning wins on 'wasted' money here.")
+
+
+def burn_figure(burn_data):
     burn_df = pd.DataFrame(burn_data)
-    
-    fig_burn = px.bar(burn_df, x="Scenario", y="Amount", color="Category", 
+
+    fig_burn = px.bar(burn_df, x="Scenario", y="Amount", color="Category",
                       title="Total Unrecoverable Costs (Breakdown)",
                       height=400,
                       text_auto='.2s', # Restoring labels as requested
@@ -190,35 +256,27 @@ if st.sidebar.button("Run Simulation", type="primary"):
                       })
     fig_burn.update_layout(legend_title_text="Cost Category")
     fig_burn.update_traces(textfont_size=12, textangle=0, textposition="inside", cliponaxis=False)
-    st.plotly_chart(fig_burn, use_container_width=True)
-    
-    # Check if Buying actually "Burned" more than Renting
-    # Always show the Burn Comparison
-    burn_diff = total_home_burn - total_rent_burn
-    
-    if burn_diff > 0:
-        msg = f"⚠️ **Myth Buster**: The Homeowner 'threw away' **&#36;{total_home_burn:,.0f}** on interest, maintenance, tax, and fees, while the Renter 'burned' **&#36;{total_rent_burn:,.0f}** on rent and investment friction!"
-        st.warning(msg)
-    else:
-        st.info(f"✅ **Reality Check**: In this expensive rental market, the Homeowner's unrecoverable costs (**&#36;{total_home_burn:,.0f}**) are actually LOWER than the Renter's total burn (**&#36;{total_rent_burn:,.0f}**). Owning wins on 'wasted' money here.")
-    
+    return fig_burn
 
 
-    st.divider()
-
+def composition_panel(run):
     # --- WEALTH COMPOSITION ---
+    results = run["results"]
     st.markdown("### 💰 Wealth Composition (Source of Funds)")
     st.caption("""
-    Where did the final number come from? 
+    Where did the final number come from?
     *   **Initial Capital**: Your starting down payment.
     *   **Contributions**: New money added over time (e.g., the Renter saving the difference).
     *   **Net Growth**: Pure investment profit (Market Appreciation).
     """)
-    
+
+    final_equity_net = results['final_house_net']
+    final_stock_net = results['final_stock_net']
+
     col1, col2 = st.columns(2)
-    
+
     with col1:
-        st.metric("Housing Net Cash (After Fees)", f"${final_equity_net:,.0f}", 
+        st.metric("Housing Net Cash (After Fees)", f"${final_equity_net:,.0f}",
                  delta=f"Growth: ${(final_equity_net - results['initial_down_payment']):,.0f}")
     with col2:
         st.metric("Stock Net Cash (After Tax)", f"${final_stock_net:,.0f}",
@@ -226,27 +284,27 @@ if st.sidebar.button("Run Simulation", type="primary"):
 
     # Composition Chart
     # Stack: Initial Capital | Contributions (if any) | Growth
-    
+
     # Stocks Breakdown
     stock_net = final_stock_net
     stock_initial = results['total_initial_capital']
     stock_added = results['total_stock_contributions']
     stock_growth = max(0, stock_net - (stock_initial + stock_added))
-    
+
     # Housing Breakdown
     # Simplified: Initial Downpayment + Paid Principal (Forced Savings) + Growth (Appreciation)
     # Actually, simpler for comparison: Cash In vs Market Growth
-    # Housing Cash In = Downpayment + Principal Payments? 
+    # Housing Cash In = Downpayment + Principal Payments?
     # Let's keep Housing simple for now: Initial vs Growth, as 'Contributions' are mixed with maintenance costs in user mind.
     # Or: Initial | Principal Paid | Appreciation?
     # Let's stick to the user request: Stocks breakdown.
-    
+
     comp_data = {
         "Asset": ["Housing", "Housing", "Housing", "Stocks", "Stocks", "Stocks"],
-        "Type": ["Initial Capital", "Contributions", "Net Growth", 
+        "Type": ["Initial Capital", "Contributions", "Net Growth",
                  "Initial Capital", "Contributions", "Net Growth"],
         "Amount": [
-            results['initial_down_payment'], 
+            results['initial_down_payment'],
             0, # Housing 'Contributions' (Principal paydown) masked for now to keep simple
             max(0, final_equity_net - results['initial_down_payment']),
             stock_initial,
@@ -254,32 +312,233 @@ if st.sidebar.button("Run Simulation", type="primary"):
             stock_growth
         ]
     }
-    comp_df = pd.DataFrame(comp_data)
-    
-    fig_comp = px.bar(comp_df, x="Asset", y="Amount", color="Type", 
-                      title="Net Wealth Composition (Source of Funds)", text_auto='.2s',
-                      color_discrete_map={
-                          "Initial Capital": "#1f77b4", # Blue
-                          "Contributions": "#aec7e8",   # Light Blue
-                          "Net Growth": "#2ca02c"       # Green
-                      })
+    fig_comp = cached_figure(run, "composition", lambda: px.bar(
+        pd.DataFrame(comp_data), x="Asset", y="Amount", color="Type",
+        title="Net Wealth Composition (Source of Funds)", text_auto='.2s',
+        color_discrete_map={
+            "Initial Capital": "#1f77b4", # Blue
+            "Contributions": "#aec7e8",   # Light Blue
+            "Net Growth": "#2ca02c"       # Green
+        }))
     st.plotly_chart(fig_comp, use_container_width=True)
 
-    st.divider()
-    
-    st.divider()
-    
+
+def gap_panel(run):
+    # --- GAP ATTRIBUTION ---
+    run_inputs, gap = run["inputs"], run["gap"]
+    compare_label = f"{run_inputs['compare_city']} {run_inputs['compare_year']}"
+    current_label = f"{run_inputs['city']} {run_inputs['start_year']}"
+    st.markdown("### 🧩 What Explains the Difference?")
+    st.caption(f"How much of the change in (House - Stock) net outcome from **{compare_label}** "
+               f"to **{current_label}** comes from each group of inputs (Shapley attribution).")
+
+    if not gap['contributions']:
+        st.info("Both scenarios use identical inputs, there is no gap to explain.")
+    else:
+        labels = [compare_label] + list(gap['contributions']) + [current_label]
+
+        def gap_figure():
+            fig_gap = go.Figure(go.Waterfall(
+                x=labels,
+                y=[gap['gap_a']] + list(gap['contributions'].values()) + [gap['gap_b']],
+                measure=["absolute"] + ["relative"] * len(gap['contributions']) + ["total"],
+                texttemplate="%{y:$.3s}",
+                textposition="outside"
+            ))
+            fig_gap.update_layout(title="House - Stock Net Outcome: Attribution Waterfall",
+                                  yaxis_title="House Net - Stock Net ($)", showlegend=False)
+            return fig_gap
+        st.plotly_chart(cached_figure(run, "gap", gap_figure), use_container_width=True)
+
+
+def stress_figure(stress_df):
+    fig_stress = px.bar(stress_df.melt(id_vars="Scenario", value_vars=["House Net", "Stock Net"],
+                                       var_name="Outcome", value_name="Net ($)"),
+                        x="Scenario", y="Net ($)", color="Outcome", barmode="group",
+                        color_discrete_map={"House Net": "#1f77b4", "Stock Net": "#2ca02c"})
+    fig_stress.update_layout(xaxis_title="", yaxis_title="Net Cash After Fees/Tax ($)")
+    return fig_stress
+
+
+def stress_panel(run):
+    # --- STRESS TESTS ---
+    stress_df = run["stress_df"]
+    st.markdown("### 🌪️ Stress Tests")
+    st.caption("The same scenario with historical data shocked after purchase. Shocks are timed from the start year.")
+
+    st.plotly_chart(cached_figure(run, "stress", lambda: stress_figure(stress_df)), use_container_width=True)
+    st.dataframe(stress_df.style.format({
+        "House Net": "${:,.0f}",
+        "Stock Net": "${:,.0f}",
+        "House - Stock": "${:,.0f}",
+        "House vs Base": "${:+,.0f}",
+        "Stock vs Base": "${:+,.0f}"
+    }), hide_index=True)
+
+
+def affordability_panel(run):
+    # --- AFFORDABILITY ---
+    run_inputs, afford_df = run["inputs"], run["afford_df"]
+    income = run_inputs["household_income"]
+    st.markdown("### 🏦 Affordability")
+    st.caption(f"Income needed to qualify for the average {run_inputs['city']} house with a {run_inputs['amortization']}-year amortization: "
+               f"payment at the posted rate + {affordability.STRESS_BUFFER:.0%} (min {affordability.STRESS_FLOOR:.2%}), "
+               f"property tax and insurance within {affordability.GDS_LIMIT:.0%} of gross income (GDS).")
+
+    def income_figure():
+        fig_afford = px.line(afford_df, x="Year", y="Required Income", color="Down Payment")
+        fig_afford.add_vline(x=run_inputs["start_year"], line_dash="dot", line_color="gray")
+        fig_afford.update_layout(yaxis_title="Gross Household Income Needed ($/yr)", hovermode="x unified")
+        return fig_afford
+
+    def max_price_figure():
+        prices = afford_df.drop_duplicates("Year")
+        fig_max = px.line(afford_df, x="Year", y="Max Price for Income", color="Down Payment")
+        fig_max.add_trace(go.Scatter(x=prices["Year"], y=prices["Price"],
+                                     name="Average House Price", line=dict(color="black", dash="dash")))
+        fig_max.update_layout(yaxis_title="Price ($)", hovermode="x unified")
+        return fig_max
+
+    tab_income, tab_price = st.tabs(["Income Needed", f"Max Price on ${income:,.0f}"])
+    with tab_income:
+        st.plotly_chart(cached_figure(run, "afford_income", income_figure), use_container_width=True)
+    with tab_price:
+        st.plotly_chart(cached_figure(run, "afford_max_price", max_price_figure), use_container_width=True)
+
+
+@st.fragment
+def raw_data_panel(run):
     # Data Inspection
+    history_df = run["history_df"]
     with st.expander("🔍 View Raw Simulation Data"):
-        st.dataframe(history_df.style.format({
-            "House Price": "${:,.0f}",
-            "House Equity": "${:,.0f}",
-            "Stock Balance": "${:,.0f}",
-            "Real House Equity": "${:,.0f}",
-            "Real Stock Balance": "${:,.0f}",
-            "Rent Paid (Stock Scenario)": "${:,.0f}",
-            "Mortgage Rate (%)": "{:.2f}%"
-        }))
+        rows = st.radio("Rows", ["Monthly", "Year End"], horizontal=True, key="raw_data_rows")
+        if rows == "Year End":
+            history_df = history_df[history_df["Month"] == 12]
+        # Formatted in the browser (a pandas Styler would render every cell on each rerun)
+        dollars = st.column_config.NumberColumn(format="dollar", step=1)
+        st.dataframe(history_df, column_config={
+            "House Price": dollars,
+            "House Equity": dollars,
+            "Stock Balance": dollars,
+            "Real House Equity": dollars,
+            "Real Stock Balance": dollars,
+            "Rent Paid (Stock Scenario)": dollars,
+            "Mortgage Rate (%)": st.column_config.NumberColumn(format="%.2f%%")
+        })
+        # Built once per run, not on every rerun
+        if "parquet" not in run:
+            run["parquet"] = export.to_parquet_bytes(export.history_to_batch(run["results"], run["inputs"]["city"],
+                                                                             run["inputs"]["start_year"]))
+        st.download_button("Download as Parquet",
+                           data=run["parquet"],
+                           file_name=f"history_{run['inputs']['city']}_{run['inputs']['start_year']}.parquet",
+                           mime="application/vnd.apache.parquet")
+
+
+def preview_panel(inputs):
+    """Final outcome for the sidebar as it is now, read off the surface (microseconds, no model call)."""
+    outcome_surface = load_surface()
+    if outcome_surface is None:
+        st.caption("Live preview off: run `python surface.py` once to build the outcome surface.")
+        return
+    if inputs["initial_rent_override"] is not None:
+        st.caption("Live preview needs historical rent. Click 'Run Simulation' for this scenario.")
+        return
+    preview = surface.evaluate(outcome_surface, inputs["city"], inputs["start_year"], inputs["amortization"],
+                               inputs["down_payment_pct"], inputs["marginal_tax"], inputs["move_freq"])
+    error = outcome_surface.error_bound.get("house_minus_stock", {})
+    bound = error.get("max_abs", 0.0)
+    diff = preview["final_house_net"] - preview["final_stock_net"]
+
+    st.markdown(f"### ⚡ Live Preview: {inputs['city']} ({inputs['start_year']}-2024)")
+    col_house, col_stock, col_diff = st.columns(3)
+    col_house.metric("House Net Wealth", f"${preview['final_house_net']:,.0f}")
+    col_stock.metric("Stock Net Wealth", f"${preview['final_stock_net']:,.0f}")
+    col_diff.metric("House - Stock", f"${diff:,.0f}")
+    verdict = "Buying a Home" if diff > 0 else "Investing in Stocks"
+    if abs(diff) <= bound:
+        verdict = "Too close to call from the preview"
+    checks = f"{error['n_samples']:,} " if "n_samples" in error else ""
+    st.caption(f"{verdict} · interpolated from a precomputed grid; off by at most ±${bound:,.0f} from the full model "
+               f"in {checks}random spot checks (an empirical maximum, not a guarantee). "
+               "Click 'Run Simulation' for the detailed charts.")
+
+
+run_started = None
+if st.sidebar.button("Run Simulation", type="primary"):
+    run_started = time.perf_counter()
+    st.session_state["run"] = run_model(inputs)
+
+run = st.session_state.get("run")
+if run is None or run["inputs"] != inputs:
+    preview_panel(inputs)
+    st.divider()
+
+if run is not None:
+    results = run["results"]
+    run_inputs = run["inputs"]
+
+    st.subheader(f"Results for {run_inputs['city']} ({run_inputs['start_year']}-2024)")
+    if run_inputs != inputs:
+        st.caption("Parameters changed since this run. Click 'Run Simulation' to update the results.")
+
+    # Starting Conditions
+    st.markdown("### 🏁 Starting Conditions")
+    col_start1, col_start2, col_start3 = st.columns(3)
+
+    with col_start1:
+        st.metric("Home Purchase Price", f"${results['start_house_price']:,.0f}")
+    with col_start2:
+        # Calculate mortgage amount for display
+        mortgage_amt = results['start_house_price'] - results['initial_down_payment']
+        st.metric("Mortgage Amount", f"${mortgage_amt:,.0f}")
+        st.caption(f"Estimated Tax: {run['scenario']['property_tax_rate_pct']}% | "
+                   f"Ins: ${run['scenario']['monthly_insurance']:,.0f}/mo")
+    with col_start3:
+        st.metric("Initial Capital (Stocks)", f"${results['total_initial_capital']:,.0f}",
+                 help=f"Includes Down Payment (${results['initial_down_payment']:,.0f}) + Closing Costs (${results['closing_costs_paid']:,.0f}) saved.")
+        st.caption(f"Fees: 0.15% MER | Tax Drag: {1.8 * run_inputs['marginal_tax']/100.0:.2f}% (Taxable)")
+
+    st.divider()
+
+    # Final Results
+    st.markdown("### 🏁 Final Outcome (After 25+ Years)")
+
+    # --- VERDICT BANNER ---
+    diff = results['final_house_net'] - results['final_stock_net']
+    winner = "Buying a Home" if diff > 0 else "Investing in Stocks"
+    win_amount = abs(diff)
+
+    st.markdown("### 🏆 The Verdict")
+    if diff > 0:
+        st.success(f"**{winner}** was the better financial decision by **${win_amount:,.0f}**!")
+    else:
+        st.info(f"**{winner}** was the better financial decision by **${win_amount:,.0f}**!")
+
+    # --- MAIN CHART (Net Wealth) ---
+    net_wealth_panel(run)
+    burn_panel(run)
+
+    st.divider()
+
+    composition_panel(run)
+
+    st.divider()
+
+    if run["gap"] is not None:
+        gap_panel(run)
+    if run["stress_df"] is not None:
+        stress_panel(run)
+    if run["afford_df"] is not None:
+        affordability_panel(run)
+
+    st.divider()
+
+    raw_data_panel(run)
+
+    if run_started is not None:
+        app_runs.inc()
+        app_run_seconds.observe(time.perf_counter() - run_started)
 
 else:
     st.info("👈 Adjust parameters in the sidebar and click 'Run Simulation' to start.")
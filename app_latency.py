@@ -0,0 +1,87 @@
+"""
+Interaction latency of the app, measured headless with streamlit's AppTest.
+
+Clicks Run Simulation once (every optional panel on), then repeats view-only
+interactions and a slider move (answered by the live preview, see surface.py)
+and reports their latency and whether they touched the model (results cache
+lookups, which every model call goes through). The target for these is under 100 ms.
+
+AppTest reruns the whole script on every interaction, where the browser only
+reruns the fragment that owns the widget, and it also recompiles the script on
+every run, which a server does once. So these are upper bounds.
+
+    HVS_WARMUP=off python app_latency.py
+"""
+import os
+import statistics
+import time
+
+from streamlit.testing.v1 import AppTest
+
+import cache
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+TARGET_SECONDS = 0.1
+
+# Label -> function(at) applying one view-only change
+INTERACTIONS = {
+    "Log scale toggle": lambda at: at.toggle(key="net_wealth_log_scale").set_value(
+        not at.toggle(key="net_wealth_log_scale").value),
+    "Raw data rows": lambda at: at.radio(key="raw_data_rows").set_value(
+        "Year End" if at.radio(key="raw_data_rows").value == "Monthly" else "Monthly"),
+    "Rerun, nothing changed": lambda at: None,
+    # Changes the inputs: the live preview answers from the outcome surface, the model waits for Run
+    "Down payment slider": lambda at: at.sidebar.slider[1].set_value(
+        21 if at.sidebar.slider[1].value != 21 else 22),
+}
+
+
+def _model_calls():
+    return cache.results_cache.hits + cache.results_cache.misses
+
+
+def _timed_run(at):
+    start = time.perf_counter()
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].value}")
+    return time.perf_counter() - start
+
+
+def start_app(panels=("Explain", "Stress", "Affordability")):
+    """AppTest after one Run Simulation click, with the optional panels whose labels contain `panels` on."""
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.run()
+    for checkbox in at.sidebar.checkbox:
+        if any(panel in checkbox.label for panel in panels):
+            checkbox.check()
+    at.run()
+    at.sidebar.button[0].click()
+    return at, _timed_run(at)
+
+
+def measure_interactions(at, repeats=20, interactions=INTERACTIONS):
+    """Latency of each view-only interaction: one row per interaction (seconds and model calls)."""
+    rows = []
+    for label, interact in interactions.items():
+        times = []
+        calls = _model_calls()
+        for _ in range(repeats):
+            interact(at)
+            times.append(_timed_run(at))
+        rows.append({
+            "Interaction": label,
+            "Median": statistics.median(times),
+            "Max": max(times),
+            "Model Calls": _model_calls() - calls,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    at, run_seconds = start_app()
+    print(f"Run Simulation click: {run_seconds * 1000:.0f} ms")
+    print(f"{'Interaction':<25}{'Median ms':>11}{'Max ms':>9}{'Model Calls':>13}")
+    for r in measure_interactions(at):
+        status = "ok" if r["Median"] < TARGET_SECONDS and r["Model Calls"] == 0 else "SLOW"
+        print(f"{r['Interaction']:<25}{r['Median'] * 1000:>11.1f}{r['Max'] * 1000:>9.1f}{r['Model Calls']:>13}  {status}")
@@ -0,0 +1,173 @@
+"""
+Load test for the app: concurrent headless sessions clicking Run Simulation.
+
+Each session is a streamlit AppTest of app.py on its own thread (a server runs
+every browser session's script on a thread of one process the same way, so
+they contend for the same GIL, caches and memory). Every session sets random
+sidebar values and clicks Run Simulation, `runs` times, all sessions at once.
+
+Reports per concurrency level: time to results (click to finished script)
+p50 / p95 / p99, throughput, process CPU seconds per run and per session, and
+resident memory per live session (RSS growth with every session open / number
+of sessions). One warm-up click comes first (imports, JIT). Run it with the
+startup warm-up off so the results cache starts cold:
+
+    HVS_WARMUP=off python app_load.py                        # 1, 2, 4, 8 sessions x 5 runs
+    HVS_WARMUP=off python app_load.py --concurrency 16 --runs 10 --panels Stress
+
+Random sidebar values rarely repeat, so most clicks miss the results cache;
+--repeat-share sends that share of clicks to the default scenario instead.
+"""
+import argparse
+import os
+import random
+import threading
+import time
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+import app_latency
+
+# Sidebar label -> values a session picks from (the widget ranges in app.py)
+SIDEBAR = {
+    "Start Year": list(range(1975, 2021)),
+    "Mortgage Amortization (Years)": [15, 20, 25, 30],
+    "Down Payment (%)": list(range(5, 51)),
+    "City": ["National", "Toronto", "Vancouver", "Calgary", "Montreal"],
+    "Marginal Tax Rate (%)": list(range(0, 55)),
+    "Move Home Every X Years (Friction Costs)": ["Never", 5, 7, 10, 15],
+}
+
+# The sidebar defaults in app.py, for repeated clicks
+DEFAULT_INPUTS = {
+    "Start Year": 1990,
+    "Mortgage Amortization (Years)": 25,
+    "Down Payment (%)": 20,
+    "City": "National",
+    "Marginal Tax Rate (%)": 40,
+    "Move Home Every X Years (Friction Costs)": "Never",
+}
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        import resource  # Peak, not current, where /proc isn't available (macOS reports bytes)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def _widget(at, label):
+    for widgets in (at.sidebar.slider, at.sidebar.selectbox, at.sidebar.select_slider):
+        for widget in widgets:
+            if widget.label == label:
+                return widget
+    raise KeyError(f"No sidebar widget labelled {label!r}")
+
+
+def random_inputs(rng, repeat_share=0.0):
+    """One click's sidebar values: random, or the defaults with probability repeat_share."""
+    if rng.random() < repeat_share:
+        return dict(DEFAULT_INPUTS)
+    return {label: rng.choice(values) for label, values in SIDEBAR.items()}
+
+
+def new_session(panels=()):
+    """A fresh AppTest session (first render done), with the optional panels in `panels` on."""
+    at = AppTest.from_file(app_latency.APP, default_timeout=300)
+    at.run()
+    for checkbox in at.sidebar.checkbox:
+        if any(panel in checkbox.label for panel in panels):
+            checkbox.check()
+    return at
+
+
+def click_run(at, inputs):
+    """Sets the sidebar and clicks Run Simulation; returns the seconds until the results are rendered."""
+    for label, value in inputs.items():
+        _widget(at, label).set_value(value)
+    at.sidebar.button[0].click()
+    start = time.perf_counter()
+    at.run()
+    seconds = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].value}")
+    return seconds
+
+
+def warm_up(panels=()):
+    """One click in a throwaway session, so imports, the JIT and the figure code aren't charged to the first level."""
+    click_run(new_session(panels), DEFAULT_INPUTS)
+
+
+def _session(at, clicks, barrier, times, errors):
+    barrier.wait()
+    for inputs in clicks:
+        try:
+            times.append(click_run(at, inputs))
+        except Exception as e:  # Count it and keep the load going
+            errors.append(repr(e))
+
+
+def load_test(concurrency, runs=5, panels=(), repeat_share=0.0, seed=0):
+    """
+    `concurrency` sessions clicking Run Simulation `runs` times each, all at once.
+    Returns a row: percentiles of time to results (s), throughput (runs/s), CPU s per run
+    and per session, RSS MB per session (and the process's RSS at the end), errors.
+    """
+    rng = random.Random(seed)
+    rss_before = _rss_mb()
+    sessions = [new_session(panels) for _ in range(concurrency)]
+    clicks = [[random_inputs(rng, repeat_share) for _ in range(runs)] for _ in sessions]
+
+    times, errors = [], []
+    barrier = threading.Barrier(concurrency + 1)
+    threads = [threading.Thread(target=_session, args=(at, session_clicks, barrier, times, errors))
+               for at, session_clicks in zip(sessions, clicks)]
+    for thread in threads:
+        thread.start()
+    cpu_start = time.process_time()
+    barrier.wait()
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    rss_after = _rss_mb()  # Every session is still open, holding its last run
+
+    p50, p95, p99 = np.percentile(times, [50, 95, 99]) if times else (float("nan"),) * 3
+    return {
+        "Sessions": concurrency,
+        "Runs": len(times),
+        "p50": p50,
+        "p95": p95,
+        "p99": p99,
+        "Throughput": len(times) / wall,
+        "CPU per Run": cpu / max(len(times), 1),
+        "CPU per Session": cpu / concurrency,
+        "MB per Session": (rss_after - rss_before) / concurrency,
+        "RSS MB": rss_after,
+        "Errors": len(errors),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent headless sessions of app.py clicking Run Simulation.")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="comma-separated session counts, one level each")
+    parser.add_argument("--runs", type=int, default=5, help="Run Simulation clicks per session")
+    parser.add_argument("--panels", default="", help="comma-separated optional panels to turn on (Explain, Stress, Affordability)")
+    parser.add_argument("--repeat-share", type=float, default=0.0, help="share of clicks on the default scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    panels = tuple(p.strip() for p in args.panels.split(",") if p.strip())
+    warm_up(panels)
+    print(f"{'Sessions':>8}{'Runs':>6}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'Runs/s':>8}"
+          f"{'CPU s/run':>11}{'CPU s/sess':>12}{'MB/sess':>9}{'RSS MB':>8}{'Errors':>8}")
+    for level in (int(c) for c in args.concurrency.split(",")):
+        r = load_test(level, args.runs, panels, args.repeat_share, args.seed + level)
+        print(f"{r['Sessions']:>8}{r['Runs']:>6}{r['p50']:>8.2f}{r['p95']:>8.2f}{r['p99']:>8.2f}{r['Throughput']:>8.1f}"
+              f"{r['CPU per Run']:>11.3f}{r['CPU per Session']:>12.2f}{r['MB per Session']:>9.1f}{r['RSS MB']:>8.0f}"
+              f"{r['Errors']:>8}")
@@ -0,0 +1,154 @@
+"""
+Shapley attribution of the House-minus-Stock gap between two scenarios.
+
+The inputs of a run are split into groups (mortgage rates, rent, house prices,
+stock returns, inflation, tax rules, horizon, buyer choices). A hybrid run takes
+some groups from scenario B and the rest from scenario A. Each group's share of
+the gap change is its marginal contribution averaged over every order in which
+groups can be swapped (the Shapley value), so the shares always add up to
+gap(B) - gap(A).
+
+Needs 2^K hybrid runs for K differing groups; they run on the flat-array kernel
+and each one is computed only once.
+"""
+from itertools import combinations
+from math import factorial
+
+import numpy as np
+
+import data_loader
+import kernel
+import metrics
+import transaction_costs
+
+# Group -> what it swaps. Groups that are identical in both scenarios are left out.
+GROUPS = {
+    "Mortgage Rates": "mortgage_rate",
+    "Rent": "rent",
+    "House Prices": "house_price, monthly_price",
+    "Stock Returns": "stock_return",
+    "Inflation": "inflation",
+    "Tax Rules": "TFSA/RRSP limits, inclusion rate, marginal/property tax, transfer tax & selling costs",
+    "Horizon": "number of years simulated",
+    "Buyer Choices": "amortization, down payment, move frequency, insurance",
+}
+
+_MARKET_GROUP_FIELDS = {
+    "Mortgage Rates": ["mortgage_rate"],
+    "Rent": ["rent"],
+    "House Prices": ["house_price", "monthly_price"],
+    "Stock Returns": ["stock_return"],
+    "Inflation": ["inflation"],
+    "Tax Rules": ["tfsa_limit", "rrsp_limit", "inclusion_rate", "yearly_inclusion_rate"],
+}
+
+# Scenario keys used by attribution (same names/defaults as run_simulation)
+SCENARIO_DEFAULTS = {
+    "initial_rent": None,
+    "city": "National",
+    "marginal_tax_rate": 0.40,
+    "move_freq_years": "Never",
+    "property_tax_rate_pct": 0.6,
+    "monthly_insurance": 150,
+}
+
+
+class _ScenarioInputs:
+    """Kernel inputs for one scenario, with market arrays padded to a common length."""
+
+    def __init__(self, scenario, n_years):
+        scenario = {**SCENARIO_DEFAULTS, **scenario}
+        self.scenario = scenario
+        start_year = scenario["start_year"]
+        self.n_years = kernel.END_YEAR - start_year + 1
+
+        # Padded past the scenario's own end with the data_loader fallbacks, so the
+        # other scenario's horizon can be applied to it
+        padded = kernel.build_market_arrays(start_year, scenario["city"], scenario["initial_rent"],
+                                            start_year + n_years - 1)
+        # ...but the capital gains inclusion rate is the one in force at the real end
+        self.market = padded._replace(inclusion_rate=data_loader.get_inclusion_rate(kernel.END_YEAR))
+
+
+def _hybrid_value(inputs_a, inputs_b, from_b):
+    """House net - Stock net for a run taking the groups in `from_b` from scenario B."""
+    def pick(group):
+        return inputs_b if group in from_b else inputs_a
+
+    market = inputs_a.market._replace(**{
+        field: getattr(pick(group).market, field)
+        for group, fields in _MARKET_GROUP_FIELDS.items()
+        for field in fields
+    })
+    tax = pick("Tax Rules").scenario
+    buyer = pick("Buyer Choices").scenario
+    n_years = pick("Horizon").n_years
+
+    market = market._replace(**{
+        field: getattr(market, field)[:n_years * (12 if field == "monthly_price" else 1)]
+        for field in market._fields if isinstance(getattr(market, field), np.ndarray)
+    })
+
+    closing_costs = transaction_costs.closing_costs(market.house_price, tax["city"], tax["start_year"])
+    params = kernel.make_params(buyer["mortgage_years"], tax["marginal_tax_rate"], buyer["move_freq_years"],
+                                tax["property_tax_rate_pct"], closing_costs, tax["city"])
+    state = kernel.initial_state(market, params, buyer["down_payment_pct"], buyer["monthly_insurance"])
+    kernel.advance(state, params, market, 0, n_years * 12)
+    results = kernel.summarize(state, params, market, buyer["down_payment_pct"])
+    return float(results["final_house_net"] - results["final_stock_net"])
+
+
+def _differing_groups(inputs_a, inputs_b):
+    a, b = inputs_a, inputs_b
+    differs = {}
+    for group, fields in _MARKET_GROUP_FIELDS.items():
+        differs[group] = any(
+            not np.array_equal(getattr(a.market, f), getattr(b.market, f)) for f in fields
+        )
+    tax_keys = ["city", "marginal_tax_rate", "property_tax_rate_pct"]
+    differs["Tax Rules"] |= any(a.scenario[k] != b.scenario[k] for k in tax_keys)
+    differs["Horizon"] = a.n_years != b.n_years
+    buyer_keys = ["mortgage_years", "down_payment_pct", "move_freq_years", "monthly_insurance"]
+    differs["Buyer Choices"] = any(a.scenario[k] != b.scenario[k] for k in buyer_keys)
+    return [group for group in GROUPS if differs[group]]
+
+
+@metrics.timed("hvs_attribution", "attribute_gap")
+def attribute_gap(scenario_a, scenario_b):
+    """
+    Explains how the House-minus-Stock net gap changes from scenario A to scenario B.
+    Scenarios are dicts of run_simulation keyword arguments.
+
+    Returns {"gap_a", "gap_b", "contributions": {group: amount}, "runs"}.
+    Contributions sum to gap_b - gap_a.
+    """
+    n_years = max(kernel.END_YEAR - s["start_year"] + 1 for s in (scenario_a, scenario_b))
+    inputs_a = _ScenarioInputs(scenario_a, n_years)
+    inputs_b = _ScenarioInputs(scenario_b, n_years)
+    groups = _differing_groups(inputs_a, inputs_b)
+    k = len(groups)
+
+    # Memoized value of every coalition (set of groups taken from B)
+    values = {}
+    def value(coalition):
+        if coalition not in values:
+            values[coalition] = _hybrid_value(inputs_a, inputs_b, coalition)
+        return values[coalition]
+
+    contributions = {}
+    for group in groups:
+        others = [g for g in groups if g != group]
+        total = 0.0
+        for size in range(k):
+            weight = factorial(size) * factorial(k - size - 1) / factorial(k)
+            for coalition in combinations(others, size):
+                coalition = frozenset(coalition)
+                total += weight * (value(coalition | {group}) - value(coalition))
+        contributions[group] = total
+
+    return {
+        "gap_a": value(frozenset()),
+        "gap_b": value(frozenset(groups)),
+        "contributions": contributions,
+        "runs": len(values),
+    }
@@ -0,0 +1,161 @@
+"""
+Result cache keyed by (namespace, parameters, dataset fingerprint).
+
+Entries live in memory (LRU bounded), optionally in a cross-process
+shared-memory store (shm_cache.py) and, if a directory is given, on disk as
+pickles so they survive restarts. Keys include the hash of the data tables the
+result was computed from, so an edited table simply stops matching, and
+invalidate_stale() deletes on-disk entries built from tables that have changed.
+"""
+import hashlib
+import json
+import os
+import pickle
+from collections import OrderedDict
+from threading import Lock
+
+import dataset_version
+import metrics
+import shm_cache
+
+
+class ResultCache:
+    def __init__(self, max_entries=1024, directory=None, shared=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.shared = shared
+        self._entries = OrderedDict()  # key -> (stamp, value)
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(namespace, params, tables=dataset_version.SIMULATION_TABLES):
+        """Cache key for `params` (a JSON-able dict) computed from the given data tables."""
+        text = json.dumps([namespace, params, dataset_version.dataset_hash(tables)],
+                          sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pkl")
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][1]
+        if self.shared is not None:
+            entry = self.shared.get_object(key)
+            if entry is not None and dataset_version.is_current(entry[0]):
+                self._remember(key, *entry)
+                with self._lock:
+                    self.hits += 1
+                return entry[1]
+        if self.directory and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), "rb") as f:
+                    entry_stamp, value = pickle.load(f)
+            except (OSError, pickle.PickleError, EOFError):
+                pass
+            else:
+                if dataset_version.is_current(entry_stamp):
+                    self._remember(key, entry_stamp, value)
+                    with self._lock:
+                        self.hits += 1
+                    return value
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def put(self, key, value, tables=dataset_version.SIMULATION_TABLES):
+        entry_stamp = dataset_version.stamp(tables)
+        self._remember(key, entry_stamp, value)
+        if self.shared is not None:
+            try:
+                self.shared.put_object(key, (entry_stamp, value))
+            except (OSError, MemoryError):
+                pass  # Shared memory full or unavailable: skip that tier, like a value over its budget
+        if self.directory:
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump((entry_stamp, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+
+    def _remember(self, key, entry_stamp, value):
+        with self._lock:
+            self._entries[key] = (entry_stamp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, namespace, params, compute, tables=dataset_version.SIMULATION_TABLES):
+        """Returns the cached value for (namespace, params), computing and storing it on a miss."""
+        key = self.make_key(namespace, params, tables)
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value, tables)
+        return value
+
+    def invalidate_stale(self):
+        """Drops entries built from tables that have since changed. Returns how many were dropped."""
+        dropped = set()
+        with self._lock:
+            for key in [k for k, (s, _) in self._entries.items() if not dataset_version.is_current(s)]:
+                del self._entries[key]
+                dropped.add(key)
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if not name.endswith(".pkl"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    with open(path, "rb") as f:
+                        entry_stamp, _ = pickle.load(f)
+                    stale = not dataset_version.is_current(entry_stamp)
+                except (OSError, pickle.PickleError, EOFError):
+                    stale = True
+                if stale:
+                    os.remove(path)
+                    dropped.add(name[:-len(".pkl")])
+        return len(dropped)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared cache for simulation results
+# (HVS_SHM_CACHE_MB shares it between processes, HVS_CACHE_DIR persists it on disk)
+results_cache = ResultCache(directory=os.environ.get("HVS_CACHE_DIR"), shared=shm_cache.default_store())
+
+
+def _cache_metrics():
+    samples = []
+    stores = [("hvs_results_cache", results_cache), ("hvs_shm_cache", results_cache.shared)]
+    for prefix, store in stores:
+        if store is None:
+            continue
+        samples += [
+            (f"{prefix}_hits_total", "counter", "Cache hits", store.hits),
+            (f"{prefix}_misses_total", "counter", "Cache misses", store.misses),
+            (f"{prefix}_evictions_total", "counter", "Cache evictions", store.evictions),
+        ]
+    samples.append(("hvs_results_cache_entries", "gauge", "Entries held in memory", len(results_cache._entries)))
+    return samples
+
+
+metrics.register_collector("results_cache", _cache_metrics)
+
+
+def cached_run_simulation(**kwargs):
+    """run_simulation through the shared results cache."""
+    import simulation
+    return results_cache.get_or_compute(f"run_simulation:v{simulation.MODEL_VERSION}", kwargs,
+                                        lambda: simulation.run_simulation(**kwargs))
@@ -88,19 +88,20 @@ def get_average_rent(year, city="National"):
     """Returns the average monthly rent for a given year and city."""
     base_rent = RENTAL_PRICES.get(year, RENTAL_PRICES.get(2025))
     
-    # Simple scalar approximation for regional rent premiums relative to National
-    # Toronto/Vancouver typically 30-50% higher than National avg
-    # Calgary often close to National or slightly higher in boom times
-    if city == "Toronto":
-        return base_rent * 1.45
-    elif city == "Vancouver":
-        return base_rent * 1.55
-    elif city == "Calgary":
-        return base_rent * 1.10
-    elif city == "Montreal":
-        return base_rent * 0.90
+    if city in RENT_PREMIUMS:
+        return base_rent * RENT_PREMIUMS[city]
     return base_rent
 
+# Simple scalar approximation for regional rent premiums relative to National
+# Toronto/Vancouver typically 30-50% higher than National avg
+# Calgary often close to National or slightly higher in boom times
+RENT_PREMIUMS = {
+    "Toronto": 1.45,
+    "Vancouver": 1.55,
+    "Calgary": 1.10,
+    "Montreal": 0.90
+}
+
 # Dictionary: Year -> 5-Year Fixed Mortgage Rate (%)
 MORTGAGE_RATES = {
     1975: 11.25, 1976: 11.50, 1977: 10.50, 1978: 10.75, 1979: 13.00,
@@ -267,6 +268,17 @@ def get_monthly_housing_price(year, month, city="National"):
     
     return base_price * seasonal_multiplier
 
+def get_monthly_housing_prices(year, city="National"):
+    """get_monthly_housing_price for all 12 months of a year, looking the annual prices up once."""
+    price_curr = get_housing_price(year, city)
+    price_next = get_housing_price(year + 1, city)
+    if price_next is None:
+        price_next = price_curr * 1.03
+    annual_growth = price_next / price_curr if price_curr > 0 else 1.03
+    monthly_growth_factor = annual_growth ** (1/12)
+    return [price_curr * (monthly_growth_factor ** (month - 1)) * SEASONALITY_INDEX.get(month, 1.0)
+            for month in range(1, 13)]
+
 # Property Tax Rates (Approximate % of Assessed Value)
 PROPERTY_TAX_RATES = {
     "Toronto": 0.61,
@@ -279,3 +291,56 @@ PROPERTY_TAX_RATES = {
 def get_property_tax_rate(city):
     """Returns the estimated property tax rate (%) for a given city."""
     return PROPERTY_TAX_RATES.get(city, 1.0)
+
+# Land Transfer Tax Schedules
+# Jurisdiction -> list of (Effective Year, Flat Fee, [(Bracket Floor, Marginal Rate), ...])
+# The schedule in force for a year is the latest one whose effective year is <= that year.
+# Rough brackets, not an exact match of every historical change.
+LAND_TRANSFER_TAX_SCHEDULES = {
+    # 0.5% first 55k, 1.0% to 250k, 1.5% to 400k, 2.0% to 2M, 2.5% over 2M
+    "Ontario": [
+        (1975, 0, [(0, 0.005), (55000, 0.01), (250000, 0.015), (400000, 0.02), (2000000, 0.025)]),
+    ],
+    # Toronto Municipal LTT mirrors the provincial brackets (buyers pay both)
+    "Toronto": [
+        (1975, 0, [(0, 0.005), (55000, 0.01), (250000, 0.015), (400000, 0.02), (2000000, 0.025)]),
+    ],
+    # BC Property Transfer Tax: 1% first 200k, 2% to 2M, 3% to 3M, 5% over 3M
+    "British Columbia": [
+        (1975, 0, [(0, 0.01), (200000, 0.02), (2000000, 0.03), (3000000, 0.05)]),
+    ],
+    # Alberta has no LTT, just small title/registration fees
+    "Alberta": [
+        (1975, 500, [(0, 0.0)]),
+    ],
+    # Generic "Average" LTT used where we have no specific schedule
+    "National": [
+        (1975, 0, [(0, 0.015)]),
+    ],
+}
+
+# City -> Jurisdictions that charge transfer tax on a purchase there
+CITY_LAND_TRANSFER_TAXES = {
+    "Toronto": ["Ontario", "Toronto"],
+    "Vancouver": ["British Columbia"],
+    "Calgary": ["Alberta"],
+    "Montreal": ["National"], # Quebec welcome tax not modelled yet, uses the average
+    "National": ["National"]
+}
+
+# Legal fees on a purchase (approx)
+PURCHASE_LEGAL_FEES = 1500
+
+# Selling Costs: Agent Commission + Sales Tax on the commission
+# City -> (Commission Rate, Sales Tax Rate). Ontario HST (13%) is used as the baseline everywhere.
+SELLING_COSTS = {
+    "National": (0.05, 0.13)
+}
+
+def get_land_transfer_jurisdictions(city):
+    """Returns the jurisdictions whose transfer tax applies to a purchase in the city."""
+    return CITY_LAND_TRANSFER_TAXES.get(city, CITY_LAND_TRANSFER_TAXES["National"])
+
+def get_selling_cost_rates(city="National"):
+    """Returns (commission rate, sales tax rate) for selling a home in the city."""
+    return SELLING_COSTS.get(city, SELLING_COSTS["National"])
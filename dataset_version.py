@@ -0,0 +1,103 @@
+"""
+Dataset fingerprints for the hand-edited tables in data_loader.
+
+Every table gets a content hash. Caches put the hashes of the tables they
+depend on into their keys, and stored artifacts carry a stamp of those hashes,
+so editing e.g. MORTGAGE_RATES invalidates everything that reads rates and
+nothing else.
+
+Tables are treated as immutable once loaded: edit data_loader.py (and reload)
+or replace a table object outright. Hashes are memoized per table object, so
+in-place mutation is not noticed unless refresh() is called.
+"""
+import hashlib
+import json
+
+import data_loader
+
+# Table group -> data_loader attributes it covers
+TABLES = {
+    "prices": ["HOUSING_PRICES"],
+    "returns": ["STOCK_RETURNS"],
+    "cpi": ["INFLATION_RATES"],
+    "rent": ["RENTAL_PRICES", "RENT_PREMIUMS"],
+    "rates": ["MORTGAGE_RATES"],
+    "premiums": ["REGIONAL_PREMIUMS"],
+    "limits": ["TFSA_LIMITS", "RRSP_LIMITS", "CAPITAL_GAINS_INCLUSION"],
+    "seasonality": ["SEASONALITY_INDEX"],
+    "property_tax": ["PROPERTY_TAX_RATES"],
+    "transaction_costs": ["LAND_TRANSFER_TAX_SCHEDULES", "CITY_LAND_TRANSFER_TAXES",
+                          "PURCHASE_LEGAL_FEES", "SELLING_COSTS"],
+}
+
+# What each kind of derived artifact reads
+SIMULATION_TABLES = ("prices", "returns", "cpi", "rent", "rates", "premiums", "limits",
+                     "seasonality", "transaction_costs")
+TRANSACTION_COST_TABLES = ("transaction_costs",)
+
+# attribute name -> (table object, hash)
+_memo = {}
+# component hashes -> combined hash
+_combined_memo = {}
+
+
+def _hash_value(value):
+    # json with sorted keys gives a stable text form (int keys become strings, tuples lists)
+    text = json.dumps(value, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def _attribute_hash(name):
+    value = getattr(data_loader, name)
+    memo = _memo.get(name)
+    if memo is None or memo[0] is not value:
+        memo = (value, _hash_value(value))
+        _memo[name] = memo
+    return memo[1]
+
+
+def _combine(parts):
+    combined = _combined_memo.get(parts)
+    if combined is None:
+        combined = _combined_memo[parts] = _hash_value(parts)
+    return combined
+
+
+def table_hash(table):
+    """Content hash of one table group (e.g. "rates")."""
+    names = TABLES[table]
+    if len(names) == 1:
+        return _attribute_hash(names[0])
+    return _combine(tuple(_attribute_hash(name) for name in names))
+
+
+def table_hashes(tables=None):
+    """{table group: hash} for the given groups (all by default)."""
+    return {table: table_hash(table) for table in (tables or TABLES)}
+
+
+def dataset_hash(tables=None):
+    """Single hash over the given table groups (all by default). Use it in cache keys."""
+    tables = tables or TABLES
+    return _combine(tuple((table, table_hash(table)) for table in tables))
+
+
+def stamp(tables=None):
+    """Stamp to store with an artifact: the hash of every table it was built from."""
+    return table_hashes(tables)
+
+
+def stale_tables(artifact_stamp):
+    """Table groups in the stamp that have changed since it was taken ([] = still valid)."""
+    return [table for table, old_hash in artifact_stamp.items()
+            if table not in TABLES or table_hash(table) != old_hash]
+
+
+def is_current(artifact_stamp):
+    return not stale_tables(artifact_stamp)
+
+
+def refresh():
+    """Forgets memoized hashes (only needed after mutating a table in place)."""
+    _memo.clear()
+    _combined_memo.clear()
@@ -0,0 +1,340 @@
+"""
+Event-driven engine: run_simulation(..., engine="events").
+
+The monthly loop checks every month for things that happen a few times a
+year at most. Here they are dated events in a priority queue instead:
+
+    year      January: the year's stock return, inflation, rent and monthly prices
+    room      January: TFSA / RRSP room grant (plus last year's TFSA withdrawals)
+    renewal   every 5 years: the mortgage renews at that year's rate
+    move      every move_freq_years: selling + buying friction
+    refund    March: last year's RRSP refund (net of capital gains tax) is invested
+    settle    year end: capital gains tax, next March's refund
+    snapshot  a history row (only scheduled when there is a history)
+    overlay   data overlay: changes run state from its month on, see overlay()
+
+Between two events nothing changes but the month, so the house and stock
+accounts advance in closed form over the whole stretch
+(HousingInvestment.simulate_period / StockInvestment.simulate_period): about
+two stretches a year instead of twelve months. Property tax still follows
+every month's price. The stock side gets every month's contribution: a
+stretch with a withdrawal (rent above the month's housing cost) steps month
+by month, any other is averaged over its months (contributions only drift
+with the seasonal price and inflation), the one approximation against the
+monthly loop; accuracy.py reports it.
+
+A new event type is a handler (run, event) in HANDLERS, its place among
+same-month events in ORDER, and either a schedule in SCHEDULES (recurring
+events) or events passed to run_events (one-offs).
+"""
+import heapq
+from collections import namedtuple
+
+import data_loader
+import transaction_costs
+from models import HousingInvestment, StockInvestment
+
+# month: months since the start, the event applies before that month is simulated
+# (month n_months = after the last month). data: whatever the handler needs.
+Event = namedtuple("Event", ["month", "kind", "data"])
+
+# Same-month events run in this order: a snapshot closes the previous month and
+# settling closes the previous year, before January's new data comes in
+ORDER = {"snapshot": 0, "settle": 1, "year": 2, "room": 3, "overlay": 4, "renewal": 5, "move": 6, "refund": 7}
+
+# Investment costs, as in run_simulation
+MER_RATE = 0.0015
+DIVIDEND_YIELD = 0.018
+
+
+class EventQueue:
+    """Events in a heap, popped by month, then ORDER of their kind, then insertion order."""
+
+    def __init__(self, events=()):
+        self._heap = []
+        self._count = 0
+        for event in events:
+            self.push(event)
+
+    def push(self, event):
+        heapq.heappush(self._heap, (event.month, ORDER[event.kind], self._count, event))
+        self._count += 1
+
+    def next_month(self):
+        return self._heap[0][0]
+
+    def pop(self):
+        return heapq.heappop(self._heap)[-1]
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class EventRun:
+    """Everything one run's handlers read and change."""
+
+    def __init__(self, start_year, end_year, mortgage_years, city, marginal_tax_rate, move_freq_years,
+                 initial_rent, closing_costs, housing, stock, snapshot_months):
+        self.start_year = start_year
+        self.end_year = end_year
+        self.n_months = (end_year - start_year + 1) * 12
+        self.mortgage_years = mortgage_years
+        self.city = city
+        self.marginal_tax_rate = marginal_tax_rate
+        self.move_freq_years = move_freq_years
+        self.closing_costs = closing_costs
+        self.snapshot_months = snapshot_months
+        self.housing = housing
+        self.stock = stock
+
+        # Current year's data (set by the year event)
+        self.year = start_year
+        self.stock_return = 0.0
+        self.inflation = 0.0
+        self.rent = 0.0
+        self.prices = []
+        self.rent_override = initial_rent
+        self.inflation_index = 1.0
+
+        # Overlays
+        self.price_factor = 1.0  # multiplies house prices from the overlay on
+        self.rate_add = 0.0      # added to the mortgage rate at later renewals
+
+        self.tfsa_room = 0
+        self.rrsp_room = 0
+        self.pending_refund = 0
+        self.refund_due = 0
+        self.move_month = None
+        self.move_friction = 0
+
+        self.total_rent_paid = 0
+        self.total_stock_contributions = 0
+        self.total_transaction_friction = 0
+        self.period_refund = 0
+        self.period_transaction_cost = 0
+        self.history = []
+
+
+# --- Handlers ---
+
+def _year(run, event):
+    y = run.start_year + event.month // 12
+    run.year = y
+    run.stock_return = data_loader.get_stock_return(y) / 100.0
+    run.inflation = data_loader.get_inflation_rate(y) / 100.0
+    run.inflation_index *= (1 + run.inflation)
+    if run.rent_override is not None:
+        run.rent = run.rent_override
+        run.rent_override *= (1 + run.inflation)
+    else:
+        run.rent = data_loader.get_average_rent(y, city=run.city)
+    run.prices = data_loader.get_monthly_housing_prices(y, city=run.city)
+
+
+def _room(run, event):
+    run.tfsa_room += data_loader.get_tfsa_limit(run.year) + run.stock.tfsa_withdrawn
+    run.stock.tfsa_withdrawn = 0
+    run.rrsp_room += data_loader.get_rrsp_limit(run.year)
+    run.stock.annual_rrsp_contributions = 0
+
+
+def _renewal(run, event):
+    remaining_years = max(0, run.mortgage_years - event.month / 12)
+    if remaining_years > 0:
+        new_rate = data_loader.get_mortgage_rate(run.year) / 100.0 + run.rate_add
+        run.housing.update_interest_rate(new_rate, remaining_years)
+
+
+def _move(run, event):
+    # Sell at this month's price, buy the same house again (closing costs on the original price)
+    price = run.prices[event.month % 12] * run.price_factor
+    friction = transaction_costs.selling_costs(price, run.city) + run.closing_costs
+    run.total_transaction_friction += friction
+    run.period_transaction_cost += friction
+    run.move_month, run.move_friction = event.month, friction
+
+
+def _refund(run, event):
+    run.refund_due = run.pending_refund
+    run.pending_refund = 0
+    run.stock.capital_gains_tax_due = 0
+
+
+def _settle(run, event):
+    capital_gains_tax = run.stock.settle_capital_gains(run.year, run.marginal_tax_rate)
+    run.pending_refund = run.stock.annual_rrsp_contributions * run.marginal_tax_rate - capital_gains_tax
+
+
+def _snapshot(run, event):
+    last = event.month - 1
+    equity = run.housing.equity
+    if run.move_month == last:
+        # The monthly loop shows the move month's friction in its own row
+        equity = max(equity - run.move_friction, 0)
+    run.history.append({
+        "Year": run.start_year + last // 12,
+        "Month": last % 12 + 1,
+        "Date": f"{run.start_year + last // 12}-{last % 12 + 1:02d}",
+        "House Price": run.housing.current_value,
+        "House Equity": equity,
+        "Stock Balance": run.stock.balance,
+        "Real House Equity": equity / run.inflation_index,
+        "Real Stock Balance": run.stock.balance / run.inflation_index,
+        "Inflation Index": run.inflation_index,
+        "Rent Paid (Stock Scenario)": run.rent,
+        "Mortgage Rate (%)": run.housing.interest_rate * 100,
+        "Refund Reinvested": run.period_refund,
+        "Transaction Cost": run.period_transaction_cost,
+    })
+    run.period_refund = 0
+    run.period_transaction_cost = 0
+
+
+def _overlay(run, event):
+    for name, value in event.data.items():
+        setattr(run, name, value)
+
+
+HANDLERS = {
+    "year": _year,
+    "room": _room,
+    "renewal": _renewal,
+    "move": _move,
+    "refund": _refund,
+    "settle": _settle,
+    "snapshot": _snapshot,
+    "overlay": _overlay,
+}
+
+
+def overlay(month, **changes):
+    """
+    A data overlay event: sets run attributes from `month` on, e.g.
+    overlay(24, price_factor=0.7) (house prices 30% lower from year 3),
+    overlay(60, rate_add=0.03) (+300bp at later renewals),
+    overlay(0, stock_return=-0.40) (a crash in the first year; January resets it).
+    """
+    return Event(month, "overlay", changes)
+
+
+# --- Schedules: (run) -> recurring events ---
+
+def _every(kind, first, step, last):
+    return [Event(month, kind, None) for month in range(first, last + 1, step)]
+
+
+SCHEDULES = [
+    lambda run: _every("year", 0, 12, run.n_months - 1),
+    lambda run: _every("room", 0, 12, run.n_months - 1),
+    lambda run: _every("refund", 2, 12, run.n_months - 1),
+    lambda run: _every("settle", 12, 12, run.n_months),
+    lambda run: _every("renewal", 60, 60, run.n_months - 1),
+    lambda run: [] if run.move_freq_years == "Never" else _every("move", run.move_freq_years * 12,
+                                                                 run.move_freq_years * 12, run.n_months - 1),
+    lambda run: [] if run.snapshot_months is None else _every("snapshot", run.snapshot_months,
+                                                              run.snapshot_months, run.n_months),
+]
+
+
+# --- Closed-form advancement between events ---
+
+def advance(run, start, end):
+    """Months [start, end) in one stretch. January events cut every year, so a stretch stays in one year."""
+    n = end - start
+    first = start % 12
+    prices = run.prices[first:first + n]
+    if run.price_factor != 1.0:
+        prices = [p * run.price_factor for p in prices]
+    run.housing.current_value = prices[-1]
+    # Each month's cost, so a month where rent exceeds it withdraws (the stock side then steps monthly)
+    contributions = [cost - run.rent for cost in run.housing.monthly_costs(n, run.inflation, prices)]
+    run.housing.simulate_period(run.year, n, annual_inflation_rate=run.inflation, monthly_values=prices)
+
+    contribution = sum(contributions)
+    run.total_rent_paid += run.rent * n
+    refund, run.refund_due = run.refund_due, 0
+    run.total_stock_contributions += contribution + refund
+    run.period_refund += refund
+
+    s_stat = run.stock.simulate_period(run.year, run.stock_return, contributions,
+                                       refund=refund, refund_month=0,
+                                       tfsa_limit_room=run.tfsa_room,
+                                       rrsp_limit_room=run.rrsp_room,
+                                       mer_fee_rate=MER_RATE,
+                                       tax_drag_rate=DIVIDEND_YIELD * run.marginal_tax_rate,
+                                       marginal_tax_rate=run.marginal_tax_rate)
+    run.tfsa_room -= s_stat['tfsa_used']
+    run.rrsp_room -= s_stat['rrsp_used']
+
+
+def run_events(start_year, mortgage_years, down_payment_pct, initial_rent=None, city="National",
+               marginal_tax_rate=0.40, move_freq_years="Never", property_tax_rate_pct=0.6,
+               monthly_insurance=150, summary_only=False, snapshot_months=1, closing_costs=None,
+               end_year=2024, events=()):
+    """
+    The run_simulation model, driven by events (see the module docstring).
+    events: extra one-off events (e.g. overlay()) on top of the scheduled ones.
+    Returns the run_simulation results dict.
+    """
+    house_price = data_loader.get_housing_price(start_year, city=city)
+    raw_down_payment = house_price * (down_payment_pct / 100.0)
+    if closing_costs is None:
+        closing_costs = HousingInvestment(start_year, house_price, raw_down_payment).get_closing_costs(city)
+    total_initial_capital = raw_down_payment + closing_costs
+
+    housing = HousingInvestment(
+        start_year=start_year,
+        house_price=house_price,
+        down_payment=raw_down_payment,
+        interest_rate=data_loader.get_mortgage_rate(start_year) / 100.0,
+        amortization_years=mortgage_years,
+        property_tax_rate=property_tax_rate_pct / 100.0,
+        monthly_insurance=monthly_insurance
+    )
+    # Lot ledger sized for the initial deposit + at most one purchase per month
+    stock = StockInvestment(start_year=start_year, initial_deposit=total_initial_capital,
+                            max_lots=(end_year - start_year + 1) * 12 + 1)
+    run = EventRun(start_year, end_year, mortgage_years, city, marginal_tax_rate, move_freq_years, initial_rent,
+                   closing_costs, housing, stock, None if summary_only else snapshot_months)
+
+    queue = EventQueue(event for schedule in SCHEDULES for event in schedule(run))
+    for event in events:
+        if not 0 <= event.month <= run.n_months:
+            raise ValueError(f"Event outside the run (0-{run.n_months} months): {event!r}")
+        queue.push(event)
+
+    month = 0
+    while queue:
+        next_month = queue.next_month()
+        if next_month > month:
+            advance(run, month, next_month)
+            month = next_month
+        event = queue.pop()
+        HANDLERS[event.kind](run, event)
+
+    final_net_housing = housing.get_net_proceeds(city)
+    return {
+        "history": run.history,
+        "final_house_equity_gross": housing.equity,
+        "final_house_net": final_net_housing,
+        "final_stock_balance_gross": stock.balance,
+        "final_stock_net": stock.get_after_tax_value(end_year, marginal_tax_rate),
+        "initial_down_payment": raw_down_payment,
+        "closing_costs_paid": closing_costs,
+        "selling_costs_estimated": housing.equity - final_net_housing,
+        "total_initial_capital": total_initial_capital,
+        "start_house_price": house_price,
+        "inflation_index": run.inflation_index,
+        "total_mortgage_interest": housing.total_interest_paid,
+        "total_maintenance": housing.total_maintenance_cost,
+        "total_property_tax": housing.total_property_tax,
+        "total_insurance": housing.total_insurance,
+        "total_rent_paid": run.total_rent_paid,
+        "total_stock_contributions": run.total_stock_contributions,
+        "total_transaction_friction": run.total_transaction_friction,
+        "total_stock_fees": stock.total_fees_paid,
+        "total_stock_tax_drag": stock.total_tax_drag_cost,
+        "total_stock_withdrawals": stock.total_withdrawals,
+        "total_withdrawal_tax": stock.total_withdrawal_tax,
+        "unfunded_shortfall": stock.unfunded_shortfall,
+    }
@@ -0,0 +1,258 @@
+"""
+Server-side queries over sweep results, for the Sweep Explorer page (pages/).
+
+Sweep results live in a Parquet dataset written by export.write_parquet
+(hive-partitioned by city and start year). Picking scattered rows out of
+hundreds of compressed files is slow, so open_index() keeps one uncompressed
+Arrow file next to them (_explorer.arrow inside the dataset directory, which
+Parquet readers skip) and memory-maps it: rows cost nothing until read, and
+server processes share the pages. It is rebuilt when the Parquet files change.
+
+The columns the explorer filters and sorts on form the index. query() filters
+it with Arrow compute and takes one page of rows; only that page goes to the
+browser. Pages within the first TOP_K_ROWS rows come from a partial sort
+(select_k). Deeper pages sort every match once per (filters, sort order) and
+keep the row numbers (the ORDER_CACHE_SIZE most recent orders, 8 bytes a row),
+so any later page just slices them. On a million rows (one core): page 0 in
+~35 ms, the first deep page ~0.3 s, every page after that ~3 ms.
+
+    python explorer.py --build sweep_results      # every sidebar combination, ~500k rows, ~2 minutes
+    streamlit run app.py                          # then open "Sweep Explorer" in the page menu
+"""
+import hashlib
+import os
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import export
+
+DEFAULT_PATH = os.environ.get("HVS_SWEEP_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sweep_results"))
+
+# Columns kept in memory for filtering and sorting (whichever the dataset has)
+INDEX_COLUMNS = ("city", "start_year", "mortgage_years", "down_payment_pct", "marginal_tax_rate", "move_freq_years",
+                 "final_house_net", "final_stock_net")
+
+# Derived from the final net wealth columns
+MARGIN = "House - Stock"
+WINNER = "Winner"
+
+CACHE_NAME = "_explorer.arrow"  # Leading underscore: pyarrow datasets ignore it
+KEY_METADATA = b"explorer_dataset_key"
+
+ORDER_CACHE_SIZE = 8  # Sorted row orders kept per index (filter / sort combinations)
+TOP_K_ROWS = 5000  # Pages ending within this many rows use a partial sort instead of the full order
+
+# table: every row and column (memory-mapped), keys: index columns + "row" (position in table) + MARGIN,
+# columns: column names of table, orders: _OrderCache of sorted, filtered row numbers
+Index = namedtuple("Index", ["table", "keys", "columns", "orders"])
+
+
+class _OrderCache:
+    # LRU of (filters, sort) -> row numbers in display order; server sessions share an index
+    def __init__(self, max_entries=ORDER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        return None
+
+    def put(self, key, rows):
+        with self._lock:
+            self._entries[key] = rows
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def dataset_key(path):
+    """Changes whenever files are added to / replaced in the dataset (cache key for open_index)."""
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            if name.endswith(".parquet"):
+                stat = os.stat(os.path.join(root, name))
+                files.append((os.path.join(root, name), stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(files))
+
+
+def _read_cache(cache_path, key):
+    if not os.path.exists(cache_path):
+        return None
+    table = pa.ipc.open_file(pa.memory_map(cache_path)).read_all()
+    if (table.schema.metadata or {}).get(KEY_METADATA) != key:
+        return None
+    return table
+
+
+def _load_table(path):
+    """The whole dataset as one memory-mapped Arrow table, (re)writing the cache file if the dataset changed."""
+    key = hashlib.sha256(repr(dataset_key(path)).encode()).hexdigest().encode()
+    cache_path = os.path.join(path, CACHE_NAME)
+    table = _read_cache(cache_path, key)
+    if table is not None:
+        return table
+    # One record batch: takes across hundreds of small chunks (one per file) are slow
+    table = export.read_table(path).combine_chunks()
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), KEY_METADATA: key})
+    try:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        return table  # Read-only dataset: keep it in memory instead
+    return _read_cache(cache_path, key)
+
+
+def open_index(path=DEFAULT_PATH):
+    """Opens a sweep results dataset and builds its index (None if there is no dataset at path)."""
+    if not os.path.isdir(path) or not dataset_key(path):
+        return None
+    table = _load_table(path)
+    keys = table.select([c for c in INDEX_COLUMNS if c in table.column_names]).combine_chunks()
+    keys = keys.append_column("row", pa.array(np.arange(keys.num_rows, dtype=np.int64)))
+    keys = keys.append_column(MARGIN, pc.subtract(keys["final_house_net"], keys["final_stock_net"]))
+    return Index(table, keys, table.column_names, _OrderCache())
+
+
+def filter_mask(keys, cities=None, years=None, winner=None, margin=None):
+    """
+    Boolean mask over the index: cities (list), years ((first, last) start years),
+    winner ("House" / "Stocks"), margin ((low, high) House - Stock, either may be None).
+    """
+    mask = pa.array(np.ones(keys.num_rows, dtype=bool))
+    if cities:
+        mask = pc.and_(mask, pc.is_in(keys["city"].cast(pa.string()), value_set=pa.array(list(cities))))
+    if years:
+        mask = pc.and_(mask, pc.and_(pc.greater_equal(keys["start_year"], years[0]),
+                                     pc.less_equal(keys["start_year"], years[1])))
+    if winner == "House":
+        mask = pc.and_(mask, pc.greater(keys[MARGIN], 0))
+    elif winner == "Stocks":
+        mask = pc.and_(mask, pc.less_equal(keys[MARGIN], 0))
+    if margin:
+        low, high = margin
+        if low is not None:
+            mask = pc.and_(mask, pc.greater_equal(keys[MARGIN], low))
+        if high is not None:
+            mask = pc.and_(mask, pc.less_equal(keys[MARGIN], high))
+    return mask
+
+
+def _order_key(cities, years, winner, margin, sort_by, descending):
+    return repr((sorted(cities or []), years, winner, margin, sort_by, descending))
+
+
+def _matching(index, cities, years, winner, margin, sort_by):
+    # (sort_by, row) of the matching rows, ready to sort
+    matching = index.keys.select([sort_by, "row"])
+    if cities or years or winner or margin:
+        matching = matching.filter(filter_mask(index.keys, cities, years, winner, margin))
+    if pa.types.is_dictionary(matching.schema.field(sort_by).type):
+        # Partition columns (city, start year) come dictionary-encoded, which sort_indices can't order
+        column = matching[sort_by]
+        matching = matching.set_column(0, sort_by, column.cast(column.type.value_type))
+    return matching
+
+
+def _sort_keys(sort_by, descending):
+    # Ties keep dataset order
+    return [(sort_by, "descending" if descending else "ascending"), ("row", "ascending")]
+
+
+def sorted_rows(index, cities=None, years=None, winner=None, margin=None, sort_by=MARGIN, descending=True):
+    """Row numbers of every match in display order (cached on the index per filters and sort)."""
+    key = _order_key(cities, years, winner, margin, sort_by, descending)
+    rows = index.orders.get(key)
+    if rows is None:
+        matching = _matching(index, cities, years, winner, margin, sort_by)
+        rows = pc.take(matching["row"], pc.sort_indices(matching, sort_keys=_sort_keys(sort_by, descending)))
+        index.orders.put(key, rows)
+    return rows
+
+
+def query(index, cities=None, years=None, winner=None, margin=None, sort_by=MARGIN, descending=True,
+          page=0, page_size=50, columns=None):
+    """
+    One page of the filtered, sorted results: (DataFrame, number of matching rows).
+    sort_by is an index column or MARGIN; ties keep dataset order so pages never overlap.
+    columns: dataset columns to return (default all); MARGIN and WINNER are always added.
+    """
+    start = page * page_size
+    key = _order_key(cities, years, winner, margin, sort_by, descending)
+    if index.orders.get(key) is None and start + page_size <= TOP_K_ROWS:
+        # Near the top: order just the rows up to the end of this page
+        matching = _matching(index, cities, years, winner, margin, sort_by)
+        n_matching = matching.num_rows
+        k = min(start + page_size, n_matching)
+        if start >= k:
+            rows = pa.array([], type=pa.int64())
+        else:
+            order = pc.select_k_unstable(matching, k=k, sort_keys=_sort_keys(sort_by, descending))
+            rows = pc.take(matching["row"], order[start:k])
+    else:
+        order = sorted_rows(index, cities, years, winner, margin, sort_by, descending)
+        n_matching = len(order)
+        rows = order[start:start + page_size]
+
+    columns = [c for c in (columns or index.columns) if c in index.columns]
+    frame = index.table.select(columns).take(rows).to_pandas()
+    margin_values = pc.take(index.keys[MARGIN], rows).to_numpy()
+    frame[MARGIN] = margin_values
+    frame[WINNER] = np.where(margin_values > 0, "House", "Stocks")
+    return frame, n_matching
+
+
+def build(path=DEFAULT_PATH):
+    """Sweeps every sidebar combination (surface.AXES grid) on the tree engine and writes it to path."""
+    import surface
+    import sweep
+    import warmup
+
+    axes = surface.AXES
+    n_rows = 0
+    for city in axes["city"]:
+        for start_year in axes["start_year"]:
+            scenarios = [warmup.app_scenario(start_year, amortization, dp, None, city, tax, move)
+                         for amortization in axes["amortization"] for move in axes["move_freq"]
+                         for dp in axes["down_payment_pct"] for tax in axes["marginal_tax_pct"]]
+            rows = sweep.run_sweep(scenarios, engine="tree")
+            for row in rows:
+                del row["initial_rent"]  # Always historical rent here
+            export.write_parquet(export.sweep_to_batch(rows), path)
+            n_rows += len(rows)
+    return n_rows
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if "--build" in sys.argv:
+        target = sys.argv[sys.argv.index("--build") + 1] if len(sys.argv) > sys.argv.index("--build") + 1 else DEFAULT_PATH
+        start = time.perf_counter()
+        print(f"{build(target):,} rows -> {target} in {time.perf_counter() - start:.0f}s")
+    else:
+        target = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+        start = time.perf_counter()
+        index = open_index(target)
+        if index is None:
+            sys.exit(f"No sweep results at {target}; build them with: python explorer.py --build {target}")
+        print(f"Index of {index.keys.num_rows:,} rows in {time.perf_counter() - start:.2f}s")
+        for label, kwargs in {
+            "Top margin, all rows": {},
+            "Toronto 1990-2000, stocks win": {"cities": ["Toronto"], "years": (1990, 2000), "winner": "Stocks"},
+            "Page 100 by stock net": {"sort_by": "final_stock_net", "page": 100},
+        }.items():
+            start = time.perf_counter()
+            frame, n = query(index, **kwargs)
+            print(f"{label:<32}{n:>10,} matching, {len(frame)} rows in {(time.perf_counter() - start) * 1000:.0f} ms")
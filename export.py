@@ -0,0 +1,130 @@
+"""
+Arrow / Parquet export of simulation histories and sweep results.
+
+Histories and sweep rows are turned into Arrow record batches (one typed
+column per field) and written as compressed Parquet datasets, hive-partitioned
+by city and start year. Every file carries the dataset_version stamp of the
+tables it was computed from, and read_parquet() loads back into pandas backed
+by the Arrow buffers (no copy into NumPy / Python objects).
+"""
+import io
+import json
+import uuid
+import warnings
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import dataset_version
+
+PARTITION_COLS = ("city", "start_year")
+STAMP_KEY = b"dataset_version"
+
+# run_simulation history columns. Explicit, because flow columns are int 0 in months without events.
+HISTORY_TYPES = {
+    "Year": pa.int16(),
+    "Month": pa.int8(),
+    "Date": pa.string(),
+}
+
+
+def _column(values):
+    """Arrow array for a column; columns mixing numbers and text (e.g. move_freq_years) become text."""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def _with_stamp(schema, tables=dataset_version.SIMULATION_TABLES):
+    metadata = dict(schema.metadata or {})
+    metadata[STAMP_KEY] = json.dumps(dataset_version.stamp(tables)).encode()
+    return schema.with_metadata(metadata)
+
+
+def records_to_batch(records, types=None, **constant_columns):
+    """
+    Record batch from a list of flat dicts (run_simulation history rows or sweep rows).
+    types: {column: Arrow type} for columns that should not be inferred.
+    constant_columns (e.g. city="Toronto", start_year=1990) are added to every row.
+    """
+    types = types or {}
+    columns = {}
+    if records:
+        for name in records[0]:
+            values = [r[name] for r in records]
+            columns[name] = pa.array(values, type=types[name]) if name in types else _column(values)
+    n_rows = len(records)
+    for name, value in constant_columns.items():
+        if name == "city":
+            # Dictionary-encoded: one string per batch instead of one per row
+            columns[name] = pa.DictionaryArray.from_arrays(pa.array([0] * n_rows, pa.int32()), pa.array([value]))
+        else:
+            columns[name] = pa.array([value] * n_rows)
+    batch = pa.RecordBatch.from_pydict(columns)
+    return batch.replace_schema_metadata(_with_stamp(batch.schema).metadata)
+
+
+def history_to_batch(results, city, start_year):
+    """Record batch of a run_simulation history, tagged with its city and start year."""
+    history = results["history"]
+    types = {name: HISTORY_TYPES.get(name, pa.float64()) for name in (history[0] if history else [])}
+    return records_to_batch(history, types=types, city=city, start_year=start_year)
+
+
+def sweep_to_batch(rows):
+    """Record batch of run_sweep result rows (one row per scenario)."""
+    rows = [{"city": "National", **row} for row in rows]
+    return records_to_batch(rows)
+
+
+def write_parquet(batches, path, partition_cols=PARTITION_COLS, compression="zstd"):
+    """
+    Writes record batches as a Parquet dataset under `path`, partitioned by partition_cols
+    (hive style: path/city=Toronto/start_year=1990/part-<id>-0.parquet).
+    Writing again to the same path adds files next to the existing ones.
+    """
+    if isinstance(batches, pa.RecordBatch):
+        batches = [batches]
+    table = pa.Table.from_batches(batches)
+    table = table.replace_schema_metadata(_with_stamp(table.schema).metadata)
+    # Partition keys must be plain (non-dictionary) values for the hive partitioning
+    for name in partition_cols:
+        column = table.column(name)
+        if pa.types.is_dictionary(column.type):
+            table = table.set_column(table.schema.get_field_index(name), name,
+                                     column.cast(column.type.value_type))
+    ds.write_dataset(
+        table, path, format="parquet",
+        partitioning=ds.partitioning(table.select(list(partition_cols)).schema, flavor="hive"),
+        file_options=ds.ParquetFileFormat().make_write_options(compression=compression),
+        basename_template=f"part-{uuid.uuid4().hex[:12]}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def read_table(path, filter=None, columns=None):
+    """Reads a Parquet dataset (optionally filtered, e.g. ds.field("city") == "Toronto") as an Arrow table."""
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    table = dataset.to_table(filter=filter, columns=columns)
+
+    metadata = dataset.schema.metadata or {}
+    if STAMP_KEY in metadata:
+        stale = dataset_version.stale_tables(json.loads(metadata[STAMP_KEY]))
+        if stale:
+            warnings.warn(f"{path} was built from older data tables (changed: {', '.join(stale)})")
+    return table
+
+
+def read_parquet(path, filter=None, columns=None):
+    """Reads a Parquet dataset into a pandas DataFrame backed by the Arrow buffers (zero-copy)."""
+    return read_table(path, filter, columns).to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def to_parquet_bytes(batch, compression="zstd"):
+    """Single Parquet file in memory (for download buttons)."""
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_batches([batch]), buffer, compression=compression)
+    return buffer.getvalue()
@@ -0,0 +1,676 @@
+"""
+Flat-array simulation kernel.
+
+Runs the same month loop as simulation.run_simulation, but over pre-built
+NumPy arrays and a flat state vector instead of model objects and dict
+lookups. When Numba is installed the loop is JIT-compiled (and cached on disk
+next to this module, so only the very first process pays the compile cost).
+Without Numba the exact same function runs as plain Python.
+
+The taxable account's lots (for FIFO adjusted cost base on withdrawals) are
+stored in the same state vector, after the fixed fields: one (units, cost)
+pair per possible purchase, so a run's memory is fixed up front.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+import data_loader
+import dataset_version
+import shm_cache
+import transaction_costs
+
+try:
+    import numba
+except ImportError:  # Optional dependency
+    numba = None
+
+JIT_AVAILABLE = numba is not None
+
+END_YEAR = 2024
+
+# Investment cost assumptions (same as simulation.run_simulation)
+MER_RATE = 0.0015
+DIVIDEND_YIELD = 0.018
+
+# Maintenance: 1% of purchase price per year, inflating with CPI (same as HousingInvestment)
+MAINTENANCE_RATE = 0.01
+
+# --- State vector layout ---
+# Everything the month loop carries from one month to the next lives in a
+# single float64 array, so a run can be paused/resumed at any month.
+S_VALUE = 0            # Current market value of the house
+S_PRINCIPAL = 1        # Remaining mortgage principal
+S_EQUITY = 2
+S_RATE = 3             # Current mortgage rate (fraction)
+S_AMORT_YEARS = 4      # Amortization used for the current payment
+S_PAYMENT = 5          # Monthly mortgage payment
+S_MAINTENANCE = 6      # Current monthly maintenance cost
+S_INSURANCE = 7        # Current monthly insurance cost
+S_TOTAL_INTEREST = 8
+S_TOTAL_MAINTENANCE = 9
+S_TOTAL_PROPERTY_TAX = 10
+S_TOTAL_INSURANCE = 11
+S_TFSA = 12
+S_RRSP = 13
+S_TAXABLE = 14
+S_TAXABLE_BOOK = 15
+S_ANNUAL_RRSP = 16     # RRSP contributions this calendar year (refund calc)
+S_TOTAL_FEES = 17
+S_TOTAL_DRAG = 18
+S_TFSA_ROOM = 19
+S_RRSP_ROOM = 20
+S_PENDING_REFUND = 21
+S_INFLATION_INDEX = 22
+S_TOTAL_CONTRIBUTIONS = 23
+S_TOTAL_RENT = 24
+S_TOTAL_FRICTION = 25
+S_NAV = 26             # Unit value of the taxable account (lots are held in units)
+S_LOT_HEAD = 27        # First open lot (lots are sold first in, first out)
+S_LOT_TAIL = 28        # One past the last lot
+S_TFSA_WITHDRAWN = 29  # TFSA withdrawals this year (the room comes back next January)
+S_REALIZED_GAINS = 30  # Net capital gains realized this calendar year
+S_LOSS_CARRYFORWARD = 31
+S_CG_TAX_DUE = 32      # Capital gains tax owed for last year, settled in March
+S_TOTAL_WITHDRAWALS = 33
+S_TOTAL_WITHDRAWAL_TAX = 34  # Capital gains tax + income tax on RRSP withdrawals
+S_UNFUNDED = 35        # Withdrawals no account could cover
+STATE_SIZE = 36
+
+# Lot ledger: LOT_FIELDS values per lot, starting at state[STATE_SIZE]
+L_UNITS = 0
+L_COST = 1
+LOT_FIELDS = 2
+
+# --- Parameter vector layout ---
+P_MORTGAGE_YEARS = 0
+P_MARGINAL_TAX = 1
+P_MOVE_MONTHS = 2      # 0 = never move
+P_PROPERTY_TAX_RATE = 3
+P_CLOSING_COSTS = 4    # Buying costs charged again on every move
+P_COMMISSION = 5
+P_SALES_TAX = 6
+P_MER = 7
+P_TAX_DRAG = 8
+PARAM_SIZE = 9
+
+# --- History columns (one row per recorded month) ---
+H_HOUSE_PRICE = 0
+H_HOUSE_EQUITY = 1
+H_STOCK_BALANCE = 2
+H_INFLATION_INDEX = 3
+H_RENT = 4
+H_MORTGAGE_RATE = 5
+H_REFUND = 6
+H_TRANSACTION_COST = 7
+HISTORY_SIZE = 8
+
+# Market data for one (start_year, city, rent) combination, flattened into arrays.
+# Per-year arrays have one entry per simulated year, monthly_price has 12 per year.
+# inclusion_rate is the rate at the end (final liquidation), yearly_inclusion_rate the one for gains realized each year.
+MarketArrays = namedtuple("MarketArrays", [
+    "start_year", "house_price", "inclusion_rate",
+    "stock_return", "inflation", "rent", "mortgage_rate",
+    "tfsa_limit", "rrsp_limit", "yearly_inclusion_rate", "monthly_price",
+])
+
+
+def build_market_arrays(start_year, city="National", initial_rent=None, end_year=END_YEAR):
+    """Looks up every data_loader series needed for a run and returns them as arrays."""
+    # The dataset hash is part of the cache key, so edited tables are never served stale
+    return _build_market_arrays(dataset_version.dataset_hash(dataset_version.SIMULATION_TABLES),
+                                start_year, city, initial_rent, end_year)
+
+
+_YEARLY_FIELDS = ("stock_return", "inflation", "rent", "mortgage_rate", "tfsa_limit", "rrsp_limit",
+                  "yearly_inclusion_rate")
+
+
+def _pack_market(market):
+    """All arrays + scalars of a MarketArrays in one flat array (for the shared-memory store)."""
+    return np.concatenate(([market.house_price, market.inclusion_rate],
+                           *[getattr(market, f) for f in _YEARLY_FIELDS], market.monthly_price))
+
+
+def _unpack_market(start_year, flat):
+    """Inverse of _pack_market; the arrays are views into `flat`."""
+    n_years = (len(flat) - 2) // (len(_YEARLY_FIELDS) + 12)
+    yearly = {f: flat[2 + i * n_years:2 + (i + 1) * n_years] for i, f in enumerate(_YEARLY_FIELDS)}
+    return MarketArrays(start_year=start_year, house_price=float(flat[0]), inclusion_rate=float(flat[1]),
+                        monthly_price=flat[2 + len(_YEARLY_FIELDS) * n_years:], **yearly)
+
+
+@lru_cache(maxsize=256)
+def _build_market_arrays(dataset_hash, start_year, city, initial_rent, end_year):
+    # Other processes may have built these already (see shm_cache.py)
+    store = shm_cache.default_store()
+    if store is not None:
+        shm_key = f"market:{dataset_hash}:{start_year}:{city}:{initial_rent}:{end_year}"
+        flat = store.get_array(shm_key)
+        if flat is not None:
+            return _unpack_market(start_year, flat)
+        arrays = _compute_market_arrays(start_year, city, initial_rent, end_year)
+        store.put_array(shm_key, _pack_market(arrays))
+        return arrays
+    return _compute_market_arrays(start_year, city, initial_rent, end_year)
+
+
+def _compute_market_arrays(start_year, city, initial_rent, end_year):
+    years = range(start_year, end_year + 1)
+    inflation = np.array([data_loader.get_inflation_rate(y) / 100.0 for y in years])
+
+    if initial_rent is not None:
+        # Rent override: starts at the given rent and inflates with CPI each year
+        rent = initial_rent * np.concatenate(([1.0], np.cumprod(1 + inflation[:-1])))
+    else:
+        rent = np.array([data_loader.get_average_rent(y, city=city) for y in years], dtype=float)
+
+    monthly_price = np.array([
+        data_loader.get_monthly_housing_price(y, m, city) for y in years for m in range(1, 13)
+    ])
+
+    arrays = MarketArrays(
+        start_year=start_year,
+        house_price=data_loader.get_housing_price(start_year, city=city),
+        inclusion_rate=data_loader.get_inclusion_rate(end_year),
+        stock_return=np.array([data_loader.get_stock_return(y) / 100.0 for y in years]),
+        inflation=inflation,
+        rent=rent,
+        mortgage_rate=np.array([data_loader.get_mortgage_rate(y) / 100.0 for y in years]),
+        tfsa_limit=np.array([data_loader.get_tfsa_limit(y) for y in years], dtype=float),
+        rrsp_limit=np.array([data_loader.get_rrsp_limit(y) for y in years], dtype=float),
+        yearly_inclusion_rate=np.array([data_loader.get_inclusion_rate(y) for y in years], dtype=float),
+        monthly_price=monthly_price,
+    )
+    # Cached arrays are shared between callers, keep them read-only
+    for field in arrays:
+        if isinstance(field, np.ndarray):
+            field.flags.writeable = False
+    return arrays
+
+
+def _payment(principal, annual_rate, years):
+    """Same formula as HousingInvestment.calculate_monthly_payment."""
+    if principal <= 0:
+        return 0.0
+    if annual_rate == 0:
+        return principal / (years * 12)
+    r = annual_rate / 12
+    n = years * 12
+    return principal * (r * (1 + r)**n) / ((1 + r)**n - 1)
+
+
+def _advance(state, params, stock_return, inflation, rent, mortgage_rate,
+             tfsa_limit, rrsp_limit, inclusion_rate, monthly_price, month_start, month_end, history):
+    """
+    Advances `state` in place from month_start (inclusive) to month_end (exclusive).
+    Month indices count from the first simulated month (January of start_year).
+    If `history` has rows, row k receives the snapshot of month k.
+    """
+    # Unpack into locals: much faster in plain Python, free under Numba
+    value = state[S_VALUE]
+    principal = state[S_PRINCIPAL]
+    equity = state[S_EQUITY]
+    rate = state[S_RATE]
+    amort_years = state[S_AMORT_YEARS]
+    payment = state[S_PAYMENT]
+    maintenance = state[S_MAINTENANCE]
+    insurance = state[S_INSURANCE]
+    total_interest = state[S_TOTAL_INTEREST]
+    total_maintenance = state[S_TOTAL_MAINTENANCE]
+    total_property_tax = state[S_TOTAL_PROPERTY_TAX]
+    total_insurance = state[S_TOTAL_INSURANCE]
+    tfsa = state[S_TFSA]
+    rrsp = state[S_RRSP]
+    taxable = state[S_TAXABLE]
+    taxable_book = state[S_TAXABLE_BOOK]
+    annual_rrsp = state[S_ANNUAL_RRSP]
+    total_fees = state[S_TOTAL_FEES]
+    total_drag = state[S_TOTAL_DRAG]
+    tfsa_room = state[S_TFSA_ROOM]
+    rrsp_room = state[S_RRSP_ROOM]
+    pending_refund = state[S_PENDING_REFUND]
+    inflation_index = state[S_INFLATION_INDEX]
+    total_contributions = state[S_TOTAL_CONTRIBUTIONS]
+    total_rent = state[S_TOTAL_RENT]
+    total_friction = state[S_TOTAL_FRICTION]
+    nav = state[S_NAV]
+    lot_head = int(state[S_LOT_HEAD])
+    lot_tail = int(state[S_LOT_TAIL])
+    tfsa_withdrawn = state[S_TFSA_WITHDRAWN]
+    realized_gains = state[S_REALIZED_GAINS]
+    loss_carryforward = state[S_LOSS_CARRYFORWARD]
+    cg_tax_due = state[S_CG_TAX_DUE]
+    total_withdrawals = state[S_TOTAL_WITHDRAWALS]
+    total_withdrawal_tax = state[S_TOTAL_WITHDRAWAL_TAX]
+    unfunded = state[S_UNFUNDED]
+
+    mortgage_years = params[P_MORTGAGE_YEARS]
+    marginal_tax = params[P_MARGINAL_TAX]
+    move_months = int(params[P_MOVE_MONTHS])
+    property_tax_rate = params[P_PROPERTY_TAX_RATE]
+    closing_costs = params[P_CLOSING_COSTS]
+    commission = params[P_COMMISSION]
+    sales_tax = params[P_SALES_TAX]
+    mer = params[P_MER]
+    tax_drag = params[P_TAX_DRAG]
+    record = history.shape[0] > 0
+
+    for k in range(month_start, month_end):
+        yi = k // 12
+        m = k % 12
+
+        # Start of year: CPI index, new TFSA/RRSP room, reset refund tracker
+        if m == 0:
+            inflation_index *= (1 + inflation[yi])
+            tfsa_room += tfsa_limit[yi] + tfsa_withdrawn
+            tfsa_withdrawn = 0.0
+            rrsp_room += rrsp_limit[yi]
+            annual_rrsp = 0.0
+
+        # Market value comes straight from the (seasonal) monthly price table
+        value = monthly_price[k]
+        equity = value - principal
+
+        # Mortgage renewal every 5 years at that year's rate
+        if k > 0 and k % 60 == 0:
+            remaining_years = max(0.0, mortgage_years - (k / 12))
+            if remaining_years > 0:
+                rate = mortgage_rate[yi]
+                amort_years = remaining_years
+                payment = _payment(principal, rate, amort_years)
+
+        # Mortgage payment
+        interest_payment = principal * (rate / 12)
+        if principal > 0:
+            principal -= payment - interest_payment
+            if principal < 0:
+                principal = 0.0
+            total_interest += interest_payment
+        equity = value - principal
+
+        # Maintenance / insurance inflate with CPI, property tax on market value
+        monthly_inflation = (1 + inflation[yi])**(1 / 12) - 1
+        maintenance *= (1 + monthly_inflation)
+        total_maintenance += maintenance
+        property_tax = (value * property_tax_rate) / 12
+        total_property_tax += property_tax
+        insurance *= (1 + monthly_inflation)
+        total_insurance += insurance
+
+        # Periodic moves: sell + buy an equivalent house
+        transaction_cost = 0.0
+        if move_months > 0 and k > 0 and k % move_months == 0:
+            selling_friction = value * commission * (1 + sales_tax)
+            transaction_cost = selling_friction + closing_costs
+            total_friction += transaction_cost
+            equity -= transaction_cost
+            if equity < 0:
+                equity = 0.0
+
+        # Cash flow difference goes to the renter's portfolio
+        contribution = payment + maintenance + property_tax + insurance - rent[yi]
+        total_rent += rent[yi]
+
+        # RRSP refund from last year lands in March, net of capital gains tax owed
+        refund = 0.0
+        if m == 2:
+            if pending_refund != 0:
+                contribution += pending_refund
+                refund = pending_refund
+                pending_refund = 0.0
+            cg_tax_due = 0.0
+        total_contributions += contribution
+
+        # Stock accounts
+        rate_registered = stock_return[yi] - mer
+        rate_taxable = stock_return[yi] - mer - tax_drag
+        monthly_return_reg = (1 + rate_registered)**(1 / 12) - 1
+        monthly_return_tax = (1 + rate_taxable)**(1 / 12) - 1
+
+        total_fees += (tfsa + rrsp + taxable) * (mer / 12)
+        total_drag += taxable * (tax_drag / 12)
+
+        tfsa *= (1 + monthly_return_reg)
+        rrsp *= (1 + monthly_return_reg)
+        taxable *= (1 + monthly_return_tax)
+        nav *= (1 + monthly_return_tax)
+
+        # Contribution waterfall: TFSA -> RRSP -> Taxable
+        if contribution > 0:
+            remaining = contribution
+            if tfsa_room > 0:
+                amount = min(remaining, tfsa_room)
+                tfsa += amount
+                tfsa_room -= amount
+                remaining -= amount
+            if remaining > 0 and rrsp_room > 0:
+                amount = min(remaining, rrsp_room)
+                rrsp += amount
+                rrsp_room -= amount
+                annual_rrsp += amount
+                remaining -= amount
+            if remaining > 0:
+                taxable += remaining
+                taxable_book += remaining
+                lot = STATE_SIZE + lot_tail * LOT_FIELDS
+                state[lot + L_UNITS] = remaining / nav
+                state[lot + L_COST] = remaining
+                lot_tail += 1
+
+        # Withdrawal waterfall: Taxable (FIFO lots) -> TFSA -> RRSP
+        elif contribution < 0:
+            need = -contribution
+            if taxable > 0:
+                amount = min(need, taxable)
+                sell_all = amount >= taxable
+                units_left = amount / nav
+                cost_sold = 0.0
+                while lot_head < lot_tail and (sell_all or units_left > 0):
+                    lot = STATE_SIZE + lot_head * LOT_FIELDS
+                    lot_units = state[lot + L_UNITS]
+                    if sell_all or lot_units <= units_left:
+                        cost_sold += state[lot + L_COST]
+                        units_left -= lot_units
+                        lot_head += 1
+                    else:
+                        part_cost = state[lot + L_COST] * (units_left / lot_units)
+                        state[lot + L_UNITS] = lot_units - units_left
+                        state[lot + L_COST] -= part_cost
+                        cost_sold += part_cost
+                        units_left = 0.0
+                if sell_all:
+                    taxable = 0.0
+                    taxable_book = 0.0
+                else:
+                    taxable -= amount
+                    taxable_book -= cost_sold
+                realized_gains += amount - cost_sold
+                need -= amount
+            if need > 0 and tfsa > 0:
+                amount = min(need, tfsa)
+                tfsa -= amount
+                tfsa_withdrawn += amount
+                need -= amount
+            if need > 0 and rrsp > 0 and marginal_tax < 1:
+                # Taxed as income: withdraw enough to net `need` after tax
+                gross = min(need / (1 - marginal_tax), rrsp)
+                rrsp -= gross
+                total_withdrawal_tax += gross * marginal_tax
+                need -= gross * (1 - marginal_tax)
+            if need > 0:
+                unfunded += need
+            total_withdrawals += -contribution - need
+
+        if record:
+            history[k, H_HOUSE_PRICE] = value
+            history[k, H_HOUSE_EQUITY] = equity
+            history[k, H_STOCK_BALANCE] = tfsa + taxable + rrsp
+            history[k, H_INFLATION_INDEX] = inflation_index
+            history[k, H_RENT] = rent[yi]
+            history[k, H_MORTGAGE_RATE] = rate * 100
+            history[k, H_REFUND] = refund
+            history[k, H_TRANSACTION_COST] = transaction_cost
+
+        # End of year: refund on this year's RRSP contributions minus tax on realized gains, paid next March
+        if m == 11:
+            net_gains = realized_gains - loss_carryforward
+            if net_gains > 0:
+                cg_tax_due = net_gains * inclusion_rate[yi] * marginal_tax
+                loss_carryforward = 0.0
+            else:
+                cg_tax_due = 0.0
+                loss_carryforward = -net_gains
+            realized_gains = 0.0
+            total_withdrawal_tax += cg_tax_due
+            pending_refund = annual_rrsp * marginal_tax - cg_tax_due
+
+    state[S_VALUE] = value
+    state[S_PRINCIPAL] = principal
+    state[S_EQUITY] = equity
+    state[S_RATE] = rate
+    state[S_AMORT_YEARS] = amort_years
+    state[S_PAYMENT] = payment
+    state[S_MAINTENANCE] = maintenance
+    state[S_INSURANCE] = insurance
+    state[S_TOTAL_INTEREST] = total_interest
+    state[S_TOTAL_MAINTENANCE] = total_maintenance
+    state[S_TOTAL_PROPERTY_TAX] = total_property_tax
+    state[S_TOTAL_INSURANCE] = total_insurance
+    state[S_TFSA] = tfsa
+    state[S_RRSP] = rrsp
+    state[S_TAXABLE] = taxable
+    state[S_TAXABLE_BOOK] = taxable_book
+    state[S_ANNUAL_RRSP] = annual_rrsp
+    state[S_TOTAL_FEES] = total_fees
+    state[S_TOTAL_DRAG] = total_drag
+    state[S_TFSA_ROOM] = tfsa_room
+    state[S_RRSP_ROOM] = rrsp_room
+    state[S_PENDING_REFUND] = pending_refund
+    state[S_INFLATION_INDEX] = inflation_index
+    state[S_TOTAL_CONTRIBUTIONS] = total_contributions
+    state[S_TOTAL_RENT] = total_rent
+    state[S_TOTAL_FRICTION] = total_friction
+    state[S_NAV] = nav
+    state[S_LOT_HEAD] = lot_head
+    state[S_LOT_TAIL] = lot_tail
+    state[S_TFSA_WITHDRAWN] = tfsa_withdrawn
+    state[S_REALIZED_GAINS] = realized_gains
+    state[S_LOSS_CARRYFORWARD] = loss_carryforward
+    state[S_CG_TAX_DUE] = cg_tax_due
+    state[S_TOTAL_WITHDRAWALS] = total_withdrawals
+    state[S_TOTAL_WITHDRAWAL_TAX] = total_withdrawal_tax
+    state[S_UNFUNDED] = unfunded
+
+
+if JIT_AVAILABLE:
+    # cache=True stores the compiled machine code in __pycache__,
+    # so later processes (app restarts, pool workers) skip compilation.
+    _payment = numba.njit(cache=True)(_payment)
+    _advance_compiled = numba.njit(cache=True)(_advance)
+
+
+def advance(state, params, market, month_start, month_end, history=None):
+    """Advances a state vector over [month_start, month_end). Dispatches to the JIT if available."""
+    if history is None:
+        history = np.empty((0, HISTORY_SIZE))
+    if JIT_AVAILABLE:
+        _advance_compiled(state, params, market.stock_return, market.inflation, market.rent,
+                          market.mortgage_rate, market.tfsa_limit, market.rrsp_limit,
+                          market.yearly_inclusion_rate, market.monthly_price, month_start, month_end, history)
+    else:
+        # Plain Python is much quicker on lists of floats than on NumPy scalars
+        py_state = state.tolist()
+        _advance(py_state, params.tolist(), market.stock_return.tolist(), market.inflation.tolist(),
+                 market.rent.tolist(), market.mortgage_rate.tolist(), market.tfsa_limit.tolist(),
+                 market.rrsp_limit.tolist(), market.yearly_inclusion_rate.tolist(), market.monthly_price.tolist(),
+                 month_start, month_end, history)
+        state[:] = py_state
+    return state
+
+
+def make_params(mortgage_years, marginal_tax_rate=0.40, move_freq_years="Never",
+                property_tax_rate_pct=0.6, closing_costs=0.0, city="National",
+                mer=MER_RATE, dividend_yield=DIVIDEND_YIELD, selling_rates=None):
+    """
+    Packs the scalar run options into a parameter vector.
+    selling_rates: (commission, sales tax) overriding the city's SELLING_COSTS entry.
+    """
+    commission, sales_tax = selling_rates or data_loader.get_selling_cost_rates(city)
+    params = np.zeros(PARAM_SIZE)
+    params[P_MORTGAGE_YEARS] = mortgage_years
+    params[P_MARGINAL_TAX] = marginal_tax_rate
+    params[P_MOVE_MONTHS] = 0 if move_freq_years == "Never" else move_freq_years * 12
+    params[P_PROPERTY_TAX_RATE] = property_tax_rate_pct / 100.0
+    params[P_CLOSING_COSTS] = closing_costs
+    params[P_COMMISSION] = commission
+    params[P_SALES_TAX] = sales_tax
+    params[P_MER] = mer
+    params[P_TAX_DRAG] = dividend_yield * marginal_tax_rate
+    return params
+
+
+def initial_state(market, params, down_payment_pct, monthly_insurance=150, maintenance_rate=MAINTENANCE_RATE):
+    """
+    Builds the month-0 state: house bought, full capital in the taxable account (as its first lot).
+    Room is reserved for one lot per simulated month.
+    """
+    house_price = market.house_price
+    down_payment = house_price * (down_payment_pct / 100.0)
+    total_initial_capital = down_payment + params[P_CLOSING_COSTS]
+    rate = market.mortgage_rate[0]
+    mortgage_years = params[P_MORTGAGE_YEARS]
+
+    max_lots = len(market.monthly_price) + 1
+    state = np.zeros(STATE_SIZE + max_lots * LOT_FIELDS)
+    state[S_VALUE] = house_price
+    state[S_PRINCIPAL] = house_price - down_payment
+    state[S_EQUITY] = down_payment
+    state[S_RATE] = rate
+    state[S_AMORT_YEARS] = mortgage_years
+    state[S_PAYMENT] = _payment(house_price - down_payment, rate, mortgage_years)
+    state[S_MAINTENANCE] = (house_price * maintenance_rate) / 12
+    state[S_INSURANCE] = monthly_insurance
+    state[S_TAXABLE] = total_initial_capital
+    state[S_TAXABLE_BOOK] = total_initial_capital
+    state[S_INFLATION_INDEX] = 1.0
+    state[S_NAV] = 1.0
+    state[STATE_SIZE + L_UNITS] = total_initial_capital
+    state[STATE_SIZE + L_COST] = total_initial_capital
+    state[S_LOT_TAIL] = 1
+    return state
+
+
+def summarize(state, params, market, down_payment_pct):
+    """Turns a finished state vector into the run_simulation result dict (without history)."""
+    marginal_tax = params[P_MARGINAL_TAX]
+    down_payment = market.house_price * (down_payment_pct / 100.0)
+
+    equity = state[S_EQUITY]
+    final_net_housing = equity - state[S_VALUE] * params[P_COMMISSION] * (1 + params[P_SALES_TAX])
+
+    # Unrealized gains (less carried-forward losses) taxed on liquidation, plus last year's tax not settled yet
+    gain = max(0.0, state[S_TAXABLE] - state[S_TAXABLE_BOOK] - state[S_LOSS_CARRYFORWARD])
+    final_net_stocks = (state[S_TFSA]
+                        + state[S_RRSP] * (1 - marginal_tax)
+                        + state[S_TAXABLE] - gain * market.inclusion_rate * marginal_tax
+                        - state[S_CG_TAX_DUE])
+
+    return {
+        "final_house_equity_gross": equity,
+        "final_house_net": final_net_housing,
+        "final_stock_balance_gross": state[S_TFSA] + state[S_TAXABLE] + state[S_RRSP],
+        "final_stock_net": final_net_stocks,
+        "initial_down_payment": down_payment,
+        "closing_costs_paid": params[P_CLOSING_COSTS],
+        "selling_costs_estimated": equity - final_net_housing,
+        "total_initial_capital": down_payment + params[P_CLOSING_COSTS],
+        "start_house_price": market.house_price,
+        "inflation_index": state[S_INFLATION_INDEX],
+        "total_mortgage_interest": state[S_TOTAL_INTEREST],
+        "total_maintenance": state[S_TOTAL_MAINTENANCE],
+        "total_property_tax": state[S_TOTAL_PROPERTY_TAX],
+        "total_insurance": state[S_TOTAL_INSURANCE],
+        "total_rent_paid": state[S_TOTAL_RENT],
+        "total_stock_contributions": state[S_TOTAL_CONTRIBUTIONS],
+        "total_transaction_friction": state[S_TOTAL_FRICTION],
+        "total_stock_fees": state[S_TOTAL_FEES],
+        "total_stock_tax_drag": state[S_TOTAL_DRAG],
+        "total_stock_withdrawals": state[S_TOTAL_WITHDRAWALS],
+        "total_withdrawal_tax": state[S_TOTAL_WITHDRAWAL_TAX],
+        "unfunded_shortfall": state[S_UNFUNDED],
+    }
+
+
+def snapshot_history(history, snapshot_months):
+    """
+    Keeps one row per period (its last month) and sums the flow columns over the period.
+    Returns (month_indices, rows).
+    """
+    if snapshot_months == 1:
+        return np.arange(len(history)), history
+    n_periods = len(history) // snapshot_months
+    rows = history[snapshot_months - 1::snapshot_months][:n_periods].copy()
+    flows = history[:n_periods * snapshot_months, [H_REFUND, H_TRANSACTION_COST]]
+    rows[:, [H_REFUND, H_TRANSACTION_COST]] = flows.reshape(n_periods, snapshot_months, 2).sum(axis=1)
+    return np.arange(snapshot_months - 1, n_periods * snapshot_months, snapshot_months), rows
+
+
+def history_records(history, start_year, month_indices=None):
+    """Converts a history array into the list-of-dicts format used by run_simulation."""
+    if month_indices is None:
+        month_indices = range(len(history))
+    records = []
+    for k, row in zip(month_indices, history.tolist()):
+        k = int(k)
+        y = start_year + k // 12
+        m = k % 12
+        inflation_index = row[H_INFLATION_INDEX]
+        records.append({
+            "Year": y,
+            "Month": m + 1,
+            "Date": f"{y}-{m+1:02d}",
+            "House Price": row[H_HOUSE_PRICE],
+            "House Equity": row[H_HOUSE_EQUITY],
+            "Stock Balance": row[H_STOCK_BALANCE],
+            "Real House Equity": row[H_HOUSE_EQUITY] / inflation_index,
+            "Real Stock Balance": row[H_STOCK_BALANCE] / inflation_index,
+            "Inflation Index": inflation_index,
+            "Rent Paid (Stock Scenario)": row[H_RENT],
+            "Mortgage Rate (%)": row[H_MORTGAGE_RATE],
+            "Refund Reinvested": row[H_REFUND],
+            "Transaction Cost": row[H_TRANSACTION_COST],
+        })
+    return records
+
+
+def prepare_run(start_year, mortgage_years, down_payment_pct, initial_rent=None, city="National",
+                marginal_tax_rate=0.40, move_freq_years="Never", property_tax_rate_pct=0.6,
+                monthly_insurance=150, closing_costs=None, end_year=END_YEAR):
+    """Builds (market, params, month-0 state) for a run from run_simulation arguments."""
+    market = build_market_arrays(start_year, city, initial_rent, end_year)
+
+    # Closing costs depend only on the purchase price, so they are charged the same on every move
+    if closing_costs is None:
+        closing_costs = transaction_costs.closing_costs(market.house_price, city, start_year)
+
+    params = make_params(mortgage_years, marginal_tax_rate, move_freq_years,
+                         property_tax_rate_pct, closing_costs, city)
+    state = initial_state(market, params, down_payment_pct, monthly_insurance)
+    return market, params, state
+
+
+def run_kernel(start_year, mortgage_years, down_payment_pct, initial_rent=None, city="National",
+               marginal_tax_rate=0.40, move_freq_years="Never", property_tax_rate_pct=0.6,
+               monthly_insurance=150, summary_only=False, snapshot_freq="monthly", closing_costs=None,
+               end_year=END_YEAR):
+    """
+    Drop-in equivalent of simulation.run_simulation backed by the flat-array kernel.
+    """
+    from simulation import SNAPSHOT_MONTHS
+
+    market, params, state = prepare_run(start_year, mortgage_years, down_payment_pct, initial_rent, city,
+                                        marginal_tax_rate, move_freq_years, property_tax_rate_pct,
+                                        monthly_insurance, closing_costs, end_year)
+
+    n_months = len(market.monthly_price)
+    history = None if summary_only else np.zeros((n_months, HISTORY_SIZE))
+    advance(state, params, market, 0, n_months, history)
+
+    results = summarize(state, params, market, down_payment_pct)
+    if summary_only:
+        results["history"] = []
+    else:
+        month_indices, rows = snapshot_history(history, SNAPSHOT_MONTHS[snapshot_freq])
+        results["history"] = history_records(rows, start_year, month_indices)
+    return results
+
+
+def warmup():
+    """Triggers (or loads from the on-disk cache) JIT compilation with a tiny run."""
+    if JIT_AVAILABLE:
+        market = build_market_arrays(END_YEAR, "National")
+        params = make_params(25)
+        state = initial_state(market, params, 20)
+        advance(state, params, market, 0, 12)
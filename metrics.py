@@ -0,0 +1,197 @@
+"""
+Operational metrics in Prometheus text format.
+
+Counters and latency histograms are plain in-process objects (an increment is
+a lock and an add). Everything that can be read on demand (cache counters,
+memory) is registered as a collector and only evaluated when the endpoint is
+scraped, so nothing is paid for it otherwise.
+
+Start the endpoint with start_http_server(port) or HVS_METRICS_PORT for the app.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = {}     # name -> Counter / Gauge / Histogram
+_collectors = {}  # name -> callable returning [(name, type, help, value)]
+_registry_lock = threading.Lock()
+
+
+def _format(value):
+    # Full precision (":g" would round large counters to 6 digits)
+    return repr(float(value))
+
+
+def _get_or_create(cls, name, *args):
+    # Scripts that define metrics run again (streamlit reruns app.py on every interaction), so reuse by name
+    with _registry_lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, *args)
+        return metric
+
+
+def counter(name, help_text):
+    return _get_or_create(Counter, name, help_text)
+
+
+def gauge(name, help_text):
+    return _get_or_create(Gauge, name, help_text)
+
+
+def histogram(name, help_text, buckets=LATENCY_BUCKETS):
+    return _get_or_create(Histogram, name, help_text, buckets)
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter",
+                f"{self.name} {_format(self.value)}"]
+
+
+class Gauge(Counter):
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_format(self.value)}"]
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last = +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager / decorator that observes the elapsed seconds."""
+        return _Timer(self)
+
+    def render(self):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{self.name}_sum {_format(total)}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, counter=None):
+        self.histogram = histogram
+        self.counter = counter
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        if self.counter is not None:
+            self.counter.inc()
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.histogram, self.counter):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def timed(name, help_text):
+    """Decorator counting calls (<name>_total) and timing them (<name>_seconds histogram)."""
+    return _Timer(histogram(f"{name}_seconds", f"{help_text} latency"),
+                  counter(f"{name}_total", f"{help_text} calls"))
+
+
+def register_collector(name, collector):
+    """collector() -> [(name, type, help, value)], evaluated only at scrape time."""
+    _collectors[name] = collector
+    return collector
+
+
+def _process_memory():
+    samples = []
+    try:
+        with open("/proc/self/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        samples.append(("process_resident_memory_bytes", "gauge", "Resident memory size in bytes",
+                        rss_pages * os.sysconf("SC_PAGE_SIZE")))
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        samples.append(("process_max_resident_memory_bytes", "gauge", "Peak resident memory in bytes",
+                        max_rss_kb * 1024))
+    except ImportError:
+        pass
+    return samples
+
+
+register_collector("process_memory", _process_memory)
+
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    lines = []
+    for metric in list(_metrics.values()):
+        lines.extend(metric.render())
+    for collector in list(_collectors.values()):
+        for name, kind, help_text, value in collector():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {_format(value)}"]
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port=9464, host="127.0.0.1"):
+    """Serves /metrics from a daemon thread. Returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -1,6 +1,28 @@
 
 import math
 
+import numpy as np
+
+import transaction_costs
+
+
+def mortgage_payment(principal, annual_rate, amortization_years):
+    """
+    Monthly payment that pays off `principal` over `amortization_years` at `annual_rate`.
+    Works on scalars or NumPy arrays (broadcast against each other, e.g. a whole
+    city x year x down payment grid at once). Scalars in, float out.
+    """
+    principal, annual_rate, amortization_years = np.broadcast_arrays(
+        np.asarray(principal, dtype=float), np.asarray(annual_rate, dtype=float),
+        np.asarray(amortization_years, dtype=float))
+    r = annual_rate / 12
+    n = amortization_years * 12
+    growth = (1 + r)**n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payment = np.where(r == 0, principal / n, principal * (r * growth) / (growth - 1))
+    payment = np.where(principal <= 0, 0.0, payment)
+    return float(payment) if payment.ndim == 0 else payment
+
 class InvestmentSimulation:
     def __init__(self, start_year, initial_deposit, monthly_contribution=0):
         self.start_year = start_year
@@ -9,7 +31,8 @@ class InvestmentSimulation:
         self.history = []  # List of dicts with yearly status
 
 class HousingInvestment:
-    def __init__(self, start_year, house_price, down_payment, interest_rate=0.05, amortization_years=25, property_tax_rate=0.006, monthly_insurance=100):
+    def __init__(self, start_year, house_price, down_payment, interest_rate=0.05, amortization_years=25, property_tax_rate=0.006, monthly_insurance=100,
+                 maintenance_rate=0.01):
         self.start_year = start_year
         self.purchase_price = house_price
         self.down_payment = down_payment
@@ -27,7 +50,7 @@ class HousingInvestment:
         # Instead of % of CURRENT value (which inflates with housing bubble),
         # we start with % of PURCHASE value, and inflate with General Inflation (CPI).
         # This represents labor/materials cost.
-        initial_maintenance_rate = 0.01 # 1% rule
+        initial_maintenance_rate = maintenance_rate # 1% rule by default
         self.monthly_maintenance_cost = (house_price * initial_maintenance_rate) / 12
         
         # New Costs (Tax & Insurance)
@@ -45,21 +68,14 @@ class HousingInvestment:
             self.monthly_payment = 0
             return 0
             
-        if self.interest_rate == 0:
-            self.monthly_payment = self.remaining_principal / (self.amortization_years * 12)
-        else:
-            r = self.interest_rate / 12
-            # Remaining amortization months calculation would be complex if we tracked "months remaining".
-            # Simplified: We assume standard amortization schedule initially, then re-amortize on renewal?
-            # Actually, standard Canadian mortgages: payment is calculated to pay off by end of original amortization.
-            # Upon renewal, we re-calculate payment based on REMAINING amortization period and NEW rate.
-            # We need to track 'months_elapsed' to know remaining amortization.
-            # However, for simplicity in this function, we assume 'amortization_years' passed in is the REMAINING years.
-            # We'll need a way to track remaining years properly.
-            pass
-            
-            n = self.amortization_years * 12
-            self.monthly_payment = self.remaining_principal * (r * (1 + r)**n) / ((1 + r)**n - 1)
+        # Remaining amortization months calculation would be complex if we tracked "months remaining".
+        # Simplified: We assume standard amortization schedule initially, then re-amortize on renewal?
+        # Actually, standard Canadian mortgages: payment is calculated to pay off by end of original amortization.
+        # Upon renewal, we re-calculate payment based on REMAINING amortization period and NEW rate.
+        # We need to track 'months_elapsed' to know remaining amortization.
+        # However, for simplicity in this function, we assume 'amortization_years' passed in is the REMAINING years.
+        # We'll need a way to track remaining years properly.
+        self.monthly_payment = mortgage_payment(self.remaining_principal, self.interest_rate, self.amortization_years)
             
     def update_interest_rate(self, new_rate, remaining_amortization_years):
         """Updates the interest rate and recalculates the monthly payment based on remaining amortization."""
@@ -111,59 +127,98 @@ class HousingInvestment:
             "payment": self.monthly_payment
         }
 
-    def get_closing_costs(self, city):
+    def monthly_costs(self, n_months, annual_inflation_rate=0.02, monthly_values=None):
+        """
+        Payment + maintenance + property tax + insurance in each of the next n_months, as
+        simulate_month would charge them (nothing is changed). Call before simulate_period.
+        monthly_values: the house value in each month (default: current_value every month).
+        """
+        growth = (1 + annual_inflation_rate)**(1/12)
+        upkeep = self.monthly_maintenance_cost + self.monthly_insurance
+        if monthly_values is None:
+            monthly_values = [self.current_value] * n_months
+        tax_rate = self.property_tax_rate / 12
+        return [self.monthly_payment + upkeep * growth**(j + 1) + value * tax_rate
+                for j, value in enumerate(monthly_values[:n_months])]
+
+    def simulate_period(self, year, n_months, annual_inflation_rate=0.02, monthly_values=None):
+        """
+        n_months of simulate_month in closed form, for coarse time steps (the caller sets
+        current_value; there is no appreciation). Costs in the result are the period's totals.
+        monthly_values: the house value in each month of the period, for property tax
+        (default: current_value every month).
+        """
+        r = self.interest_rate / 12
+        payment = self.monthly_payment
+        
+        def balance_after(k):
+            # Principal left after k payments (unclamped: negative once paid off)
+            if r == 0:
+                return self.remaining_principal - payment * k
+            growth = (1 + r)**k
+            return self.remaining_principal * growth - payment * (growth - 1) / r
+        
+        if self.remaining_principal > 0:
+            balance = balance_after(n_months)
+            payments = n_months
+            if balance < 0:
+                # Paid off during the period: interest stops after the last payment
+                if r == 0:
+                    payments = math.ceil(self.remaining_principal / payment)
+                else:
+                    payments = math.ceil(math.log(payment / (payment - self.remaining_principal * r)) / math.log(1 + r))
+                payments = min(max(payments, 1), n_months)
+                balance = balance_after(payments)
+            self.total_interest_paid += payments * payment - (self.remaining_principal - balance)
+            self.remaining_principal = max(balance, 0)
+        
+        self.equity = self.current_value - self.remaining_principal
+        
+        # Maintenance and insurance inflate every month: geometric series over the period
+        monthly_inflation = (1 + annual_inflation_rate)**(1/12)
+        if monthly_inflation == 1:
+            period_factor = n_months
+        else:
+            period_factor = monthly_inflation * (monthly_inflation**n_months - 1) / (monthly_inflation - 1)
+        maintenance = self.monthly_maintenance_cost * period_factor
+        insurance = self.monthly_insurance * period_factor
+        self.monthly_maintenance_cost *= monthly_inflation**n_months
+        self.monthly_insurance *= monthly_inflation**n_months
+        self.total_maintenance_cost += maintenance
+        self.total_insurance += insurance
+        
+        if monthly_values is None:
+            property_tax = self.current_value * self.property_tax_rate / 12 * n_months
+        else:
+            property_tax = sum(monthly_values) * self.property_tax_rate / 12
+        self.total_property_tax += property_tax
+        
+        return {
+            "year": year,
+            "equity": self.equity,
+            "value": self.current_value,
+            "maintenance": maintenance,
+            "property_tax": property_tax,
+            "insurance": insurance,
+            "payment": payment * n_months
+        }
+
+    def get_closing_costs(self, city, year=None):
         """Calculates Land Transfer Tax and other closing costs on PURCHASE."""
-        # Simplified LTT Logic
-        price = self.purchase_price
-        ltt = 0
-        
-        # Ontario/Toronto LTT (Approximate Rule)
-        # 0.5% first 55k, 1.0% to 250k, 1.5% to 400k, 2.0% to 2M, 2.5% over 2M
-        # This is surprisingly complex to exact match history, using rough brackets
-        def calc_ontario_ltt(val):
-            ex = 0
-            if val > 2000000: ex += (val - 2000000) * 0.025; val = 2000000
-            if val > 400000: ex += (val - 400000) * 0.02; val = 400000
-            if val > 250000: ex += (val - 250000) * 0.015; val = 250000
-            if val > 55000: ex += (val - 55000) * 0.01; val = 55000
-            ex += val * 0.005
-            return ex
-            
-        if city == "Toronto":
-            # Double tax (City + Prov)
-            ltt = calc_ontario_ltt(price) * 2
-        elif city in ["National", "Calgary", "Vancouver", "Montreal"]:
-             # Using Ontario scalar as a "High avg" proxy or simplified
-             # Vancouver PTT is different (1% on first 200k, 2% to 2M, 3% > 2M)
-             # Calgary has no LTT (Just small title fees)
-             if city == "Calgary":
-                 ltt = 500 # Nominal
-             elif city == "Vancouver":
-                 v_ltt = 0
-                 val = price
-                 if val > 3000000: v_ltt += (val - 3000000) * 0.05; val = 3000000 # recent higher tiers? ignore for history
-                 if val > 2000000: v_ltt += (val - 2000000) * 0.03; val = 2000000
-                 if val > 200000: v_ltt += (val - 200000) * 0.02; val = 200000
-                 v_ltt += val * 0.01
-                 ltt = v_ltt
-             else:
-                 # Default "Avg" LTT
-                 ltt = price * 0.015 
-        
-        legal_fees = 1500 # approx
-        return ltt + legal_fees
+        # Brackets live in data_loader.LAND_TRANSFER_TAX_SCHEDULES (see transaction_costs.py)
+        if year is None:
+            year = self.start_year
+        return transaction_costs.closing_costs(self.purchase_price, city, year)
 
-    def get_net_proceeds(self):
+    def get_net_proceeds(self, city="National"):
         """Calculates net cash after selling (Agent fees)."""
-        # Commission: 5% + HST (13%) -> 5.65% approx
-        agent_commission_rate = 0.05
-        sales_tax = 0.13 # Using Ontario HST as baseline
-        total_fees = self.current_value * agent_commission_rate * (1 + sales_tax)
+        # Commission + Sales Tax on it (data_loader.SELLING_COSTS)
+        total_fees = transaction_costs.selling_costs(self.current_value, city)
         
         return self.equity - total_fees
 
 class StockInvestment:
-    def __init__(self, start_year, initial_deposit):
+    def __init__(self, start_year, initial_deposit, max_lots=601):
         self.start_year = start_year
         # Accounts
         self.tfsa_balance = 0
@@ -178,6 +233,26 @@ class StockInvestment:
         # Let's assume Taxable for consistency with previous.
         self.taxable_balance = initial_deposit
         self.taxable_book_cost = initial_deposit
+        
+        # Lot ledger for the taxable account: one (units, cost) row per purchase, sold first in, first out.
+        # Units are priced at unit_value, which grows with the taxable return.
+        # Fixed size: once max_lots rows are in use, sold rows are dropped and then the closest-basis
+        # neighbours merged (see _make_room). Runs pass one row per month, so they never need to.
+        self.lots = np.zeros((max(max_lots, 2), 2))
+        self.lot_head = 0
+        self.lot_tail = 0
+        self.unit_value = 1.0
+        self._add_lot(initial_deposit)
+        
+        # Withdrawals (when the renter's costs exceed the owner's)
+        self.annual_realized_gains = 0
+        self.capital_loss_carryforward = 0
+        self.capital_gains_tax_due = 0 # Last year's, settled in March
+        self.tfsa_withdrawn = 0 # This year, room comes back next January
+        self.total_withdrawals = 0
+        self.total_withdrawal_tax = 0
+        self.unfunded_shortfall = 0
+        
         self.total_dividends = 0
         self.annual_rrsp_contributions = 0 # Track for refund calc
         
@@ -185,7 +260,98 @@ class StockInvestment:
         self.total_fees_paid = 0
         self.total_tax_drag_cost = 0
     
-    def simulate_month(self, year, annual_return_rate, monthly_contribution=0, tfsa_limit_room=0, rrsp_limit_room=0, mer_fee_rate=0.0, tax_drag_rate=0.0):
+    def _add_lot(self, amount, units=None):
+        if self.lot_tail == len(self.lots):
+            self._make_room()
+        self.lots[self.lot_tail] = (amount / self.unit_value if units is None else units, amount)
+        self.lot_tail += 1
+
+    def _make_room(self):
+        """
+        Frees a row of the full ledger. Sold lots go first (exact). Otherwise the two neighbouring
+        lots with the closest cost per unit become one: exact when their bases are equal, else a sale
+        that ends inside the merged lot realizes its gain at their average basis instead of the older
+        lot's (the gain moves between years; the total over selling both is unchanged).
+        """
+        live = self.lots[self.lot_head:self.lot_tail].copy()
+        if self.lot_head > 0:
+            self.lots[:len(live)] = live
+            self.lots[len(live):] = 0.0
+        else:
+            basis = live[:, 1] / np.maximum(live[:, 0], 1e-300)
+            i = int(np.argmin(np.abs(np.diff(basis)) / np.maximum(basis[:-1], 1e-300)))
+            live[i] += live[i + 1]
+            live = np.delete(live, i + 1, axis=0)
+            self.lots[:len(live)] = live
+            self.lots[len(live):] = 0.0
+        self.lot_head = 0
+        self.lot_tail = len(live)
+
+    def _sell_taxable(self, amount):
+        """Sells `amount` from the taxable account, oldest lots first. Returns the realized gain."""
+        sell_all = amount >= self.taxable_balance
+        units_left = amount / self.unit_value
+        cost_sold = 0.0
+        while self.lot_head < self.lot_tail and (sell_all or units_left > 0):
+            lot_units, lot_cost = self.lots[self.lot_head]
+            if sell_all or lot_units <= units_left:
+                cost_sold += lot_cost
+                units_left -= lot_units
+                self.lot_head += 1
+            else:
+                part_cost = lot_cost * (units_left / lot_units)
+                self.lots[self.lot_head] = (lot_units - units_left, lot_cost - part_cost)
+                cost_sold += part_cost
+                units_left = 0.0
+        if sell_all:
+            self.taxable_balance = 0.0
+            self.taxable_book_cost = 0.0
+        else:
+            self.taxable_balance -= amount
+            self.taxable_book_cost -= cost_sold
+        return amount - cost_sold
+
+    def withdraw(self, amount, marginal_tax_rate=0.4):
+        """
+        Takes `amount` (after tax) out of the accounts: Taxable first, then TFSA, then RRSP.
+        RRSP withdrawals are grossed up for income tax. Returns the amount that could not be covered.
+        """
+        need = amount
+        if self.taxable_balance > 0:
+            sold = min(need, self.taxable_balance)
+            self.annual_realized_gains += self._sell_taxable(sold)
+            need -= sold
+        if need > 0 and self.tfsa_balance > 0:
+            taken = min(need, self.tfsa_balance)
+            self.tfsa_balance -= taken
+            self.tfsa_withdrawn += taken
+            need -= taken
+        if need > 0 and self.rrsp_balance > 0 and marginal_tax_rate < 1:
+            gross = min(need / (1 - marginal_tax_rate), self.rrsp_balance)
+            self.rrsp_balance -= gross
+            self.total_withdrawal_tax += gross * marginal_tax_rate
+            need -= gross * (1 - marginal_tax_rate)
+        if need > 0:
+            self.unfunded_shortfall += need
+        self.total_withdrawals += amount - need
+        return need
+
+    def settle_capital_gains(self, year, marginal_tax_rate=0.4):
+        """End of year: tax on the net gains realized this year (losses carry forward). Returns the tax owed."""
+        import data_loader
+        net_gains = self.annual_realized_gains - self.capital_loss_carryforward
+        if net_gains > 0:
+            self.capital_gains_tax_due = net_gains * data_loader.get_inclusion_rate(year) * marginal_tax_rate
+            self.capital_loss_carryforward = 0.0
+        else:
+            self.capital_gains_tax_due = 0.0
+            self.capital_loss_carryforward = -net_gains
+        self.annual_realized_gains = 0.0
+        self.total_withdrawal_tax += self.capital_gains_tax_due
+        return self.capital_gains_tax_due
+
+    def simulate_month(self, year, annual_return_rate, monthly_contribution=0, tfsa_limit_room=0, rrsp_limit_room=0, mer_fee_rate=0.0, tax_drag_rate=0.0,
+                       marginal_tax_rate=0.4):
         # Calculates Monthly Return Factor
         
         # Effective Returns for different account types
@@ -213,6 +379,7 @@ class StockInvestment:
         self.tfsa_balance *= (1 + monthly_return_reg)
         self.rrsp_balance *= (1 + monthly_return_reg)
         self.taxable_balance *= (1 + monthly_return_tax)
+        self.unit_value *= (1 + monthly_return_tax)
         
         # 2. Contributions
         used_tfsa = 0
@@ -241,6 +408,11 @@ class StockInvestment:
             if remaining_contribution > 0:
                 self.taxable_balance += remaining_contribution
                 self.taxable_book_cost += remaining_contribution
+                self._add_lot(remaining_contribution)
+        
+        # 3. Withdrawals (renting costs more than owning this month)
+        elif monthly_contribution < 0:
+            self.withdraw(-monthly_contribution, marginal_tax_rate)
         
         return {
             "year": year,
@@ -249,6 +421,122 @@ class StockInvestment:
             "rrsp_used": used_rrsp
         }
 
+    def simulate_period(self, year, annual_return_rate, monthly_contributions, refund=0, refund_month=2, tfsa_limit_room=0,
+                        rrsp_limit_room=0, mer_fee_rate=0.0, tax_drag_rate=0.0, marginal_tax_rate=0.4):
+        """
+        len(monthly_contributions) months of simulate_month in closed form, for coarse-grained runs
+        (a quarter or a year; room and the refund are yearly, so a period never spans a January).
+        The contributions are spread evenly (their average every month); the refund is deposited
+        on its own in month refund_month of the period. Balances compound with geometric series and
+        the period is split exactly where TFSA / RRSP room runs out. Periods with a withdrawal are
+        stepped monthly.
+        """
+        n = len(monthly_contributions)
+        contribution = sum(monthly_contributions) / n
+        if min(monthly_contributions) < 0 or (refund and min(monthly_contributions[refund_month], contribution) + refund < 0):
+            used_tfsa = used_rrsp = 0
+            for m, contribution in enumerate(monthly_contributions):
+                s_stat = self.simulate_month(year, annual_return_rate, contribution + (refund if m == refund_month else 0),
+                                             tfsa_limit_room - used_tfsa, rrsp_limit_room - used_rrsp,
+                                             mer_fee_rate, tax_drag_rate, marginal_tax_rate)
+                used_tfsa += s_stat['tfsa_used']
+                used_rrsp += s_stat['rrsp_used']
+            return {"year": year, "balance": self.balance, "tfsa_used": used_tfsa, "rrsp_used": used_rrsp}
+        
+        growth_reg = (1 + annual_return_rate - mer_fee_rate)**(1/12)
+        growth_tax = (1 + annual_return_rate - mer_fee_rate - tax_drag_rate)**(1/12)
+        
+        # Constant deposit streams (start month, end month, amount per month)
+        if refund:
+            streams = [(0, refund_month, contribution), (refund_month, refund_month + 1, contribution + refund),
+                       (refund_month + 1, n, contribution)]
+        else:
+            streams = [(0, n, contribution)]
+        
+        # Route the streams TFSA -> RRSP -> Taxable. Where an account's room runs out mid-stream,
+        # that month is split and the remaining months go to the next account.
+        rooms = [tfsa_limit_room, rrsp_limit_room]
+        pieces = []  # (account, start, end, amount per month); 0 = TFSA, 1 = RRSP, 2 = Taxable
+        
+        def route(start, end, amount, account):
+            while start < end and amount > 0:
+                if account < 2 and rooms[account] <= 0:
+                    account += 1
+                    continue
+                if account == 2 or rooms[account] >= amount * (end - start):
+                    pieces.append((account, start, end, amount))
+                    if account < 2:
+                        rooms[account] -= amount * (end - start)
+                    return
+                full_months = int(rooms[account] // amount)
+                if full_months:
+                    pieces.append((account, start, start + full_months, amount))
+                    rooms[account] -= full_months * amount
+                split = start + full_months
+                if rooms[account] > 0:
+                    pieces.append((account, split, split + 1, rooms[account]))
+                route(split, split + 1, amount - rooms[account], account + 1)
+                rooms[account] = 0
+                start, account = split + 1, account + 1
+        
+        for start, end, amount in streams:
+            route(start, end, amount, 0)
+        
+        # g^k for k = 0..n, so the series below are differences of table entries
+        powers = {g: [g**k for k in range(n + 1)] for g in (growth_reg, growth_tax)}
+        
+        def series(g, start, end):
+            # sum of g^(n - 1 - j) for deposit months j in [start, end): growth from deposit to period end
+            if g == 1:
+                return end - start
+            return (powers[g][n - start] - powers[g][n - end]) / (g - 1)
+        
+        def months_held(g, start, end):
+            # sum over deposit months j of the balances it adds at the start of later months (fee base)
+            if g == 1:
+                return sum(n - 1 - j for j in range(start, end))
+            return (series(g, start, end) - (end - start)) / (g - 1)
+        
+        def opening(g, balance):
+            # Growth over the period and sum of the month-start balances of an existing balance
+            if g == 1:
+                return balance, balance * n
+            return balance * powers[g][n], balance * (powers[g][n] - 1) / (g - 1)
+        
+        self.tfsa_balance, tfsa_months = opening(growth_reg, self.tfsa_balance)
+        self.rrsp_balance, rrsp_months = opening(growth_reg, self.rrsp_balance)
+        self.taxable_balance, taxable_months = opening(growth_tax, self.taxable_balance)
+        start_unit_value = self.unit_value
+        self.unit_value *= growth_tax**n
+        
+        used_tfsa = used_rrsp = 0
+        for account, start, end, amount in pieces:
+            deposited = amount * (end - start)
+            if account == 0:
+                self.tfsa_balance += amount * series(growth_reg, start, end)
+                tfsa_months += amount * months_held(growth_reg, start, end)
+                used_tfsa += deposited
+            elif account == 1:
+                self.rrsp_balance += amount * series(growth_reg, start, end)
+                rrsp_months += amount * months_held(growth_reg, start, end)
+                used_rrsp += deposited
+                self.annual_rrsp_contributions += deposited
+            else:
+                self.taxable_balance += amount * series(growth_tax, start, end)
+                taxable_months += amount * months_held(growth_tax, start, end)
+                self.taxable_book_cost += deposited
+                # One lot per stream; units bought at each month's unit value (after that month's growth)
+                if growth_tax == 1:
+                    units = deposited / start_unit_value
+                else:
+                    units = amount / start_unit_value * growth_tax**-(start + 1) * (1 - growth_tax**-(end - start)) / (1 - 1 / growth_tax)
+                self._add_lot(deposited, units)
+        
+        self.total_fees_paid += (tfsa_months + rrsp_months + taxable_months) * (mer_fee_rate / 12)
+        self.total_tax_drag_cost += taxable_months * (tax_drag_rate / 12)
+        
+        return {"year": year, "balance": self.balance, "tfsa_used": used_tfsa, "rrsp_used": used_rrsp}
+
     @property
     def balance(self):
         return self.tfsa_balance + self.taxable_balance + self.rrsp_balance
@@ -264,7 +552,7 @@ class StockInvestment:
         rrsp_val_net = self.rrsp_balance * (1 - marginal_tax_rate)
         
         # Taxable Account
-        gain = self.taxable_balance - self.taxable_book_cost
+        gain = self.taxable_balance - self.taxable_book_cost - self.capital_loss_carryforward
         if gain < 0: gain = 0 
         
         inclusion_rate = data_loader.get_inclusion_rate(year)
@@ -272,4 +560,5 @@ class StockInvestment:
         tax_owed = taxable_gain * marginal_tax_rate
         taxable_net = self.taxable_balance - tax_owed
         
-        return tfsa_val + rrsp_val_net + taxable_net
+        # Tax on last year's realized gains, if not settled yet
+        return tfsa_val + rrsp_val_net + taxable_net - self.capital_gains_tax_due
@@ -0,0 +1,242 @@
+"""
+Monte Carlo and cohort percentile bands, aggregated as the paths are produced.
+
+Monte Carlo paths resample history: year 0 is the scenario's real first year
+(the buyer knows the price and the rate), every later year is drawn, in blocks
+of consecutive years, from the city's whole history. A drawn year brings its
+stock return, inflation, mortgage rate, rent growth and twelve monthly house
+price changes together, so their correlations (and some of their persistence)
+carry over. TFSA / RRSP limits and inclusion rates stay on the calendar.
+
+Each path runs on the kernel and goes straight into a sketches.PathAggregator
+(House Equity and Stock Balance per month, final net wealth per path), so
+memory stays flat however many paths run; with processes > 1 every worker
+aggregates its share and the aggregators are merged.
+
+Cohort bands run every historical start year of every city instead and line
+them up by months since purchase (in real dollars by default), which also
+works on synthetic data (synthetic.installed) for hundreds of regions.
+
+    python monte_carlo.py --paths 100000 --parallel
+    python monte_carlo.py --check        # sketch percentiles against exact ones on 5,000 kept paths
+"""
+from multiprocessing import Pool
+
+import numpy as np
+
+import data_loader
+import kernel
+import metrics
+import sketches
+import warmup
+
+PATH_METRICS = ("House Equity", "Stock Balance")
+FINALS = ("final_house_net", "final_stock_net", "house_minus_stock")
+_HISTORY_COLUMNS = {"House Equity": kernel.H_HOUSE_EQUITY, "Stock Balance": kernel.H_STOCK_BALANCE}
+
+BLOCK_YEARS = 5
+BATCH_SIZE = 500
+
+paths_run = metrics.counter("hvs_monte_carlo_paths_total", "Paths simulated by the Monte Carlo engine")
+
+
+def _year_pool(city):
+    """Per-year draws from the city's whole history: (stock, inflation, rate, rent growth, (n, 12) monthly log changes)."""
+    history = kernel.build_market_arrays(min(data_loader.STOCK_RETURNS), city)
+    log_price = np.log(history.monthly_price)
+    # Year y's changes run from last December to this December, so year 0 (no December before it) is left out
+    monthly = np.diff(log_price)[11:].reshape(-1, 12)
+    return (history.stock_return[1:], history.inflation[1:], history.mortgage_rate[1:],
+            history.rent[1:] / history.rent[:-1], monthly)
+
+
+def _draw_years(rng, n_paths, n_years, pool_size, block_years):
+    """(n_paths, n_years) indices into the pool, in blocks of consecutive years."""
+    block_years = min(block_years, pool_size)
+    n_blocks = -(-n_years // block_years)
+    starts = rng.integers(0, pool_size - block_years + 1, (n_paths, n_blocks))
+    years = (starts[:, :, None] + np.arange(block_years)).reshape(n_paths, -1)
+    return years[:, :n_years]
+
+
+def path_markets(market, pool, years, initial_rent=None):
+    """One MarketArrays per row of drawn years (see _draw_years): year 0 from market, the rest from the pool."""
+    stock, inflation, rate, rent_growth, monthly = pool
+    markets = []
+    for drawn in years:
+        path_inflation = np.concatenate((market.inflation[:1], inflation[drawn]))
+        if initial_rent is not None:
+            # Same rule as the rent override in kernel: CPI from the first rent on
+            rent = initial_rent * np.concatenate(([1.0], np.cumprod(1 + path_inflation[:-1])))
+        else:
+            rent = market.rent[0] * np.concatenate(([1.0], np.cumprod(rent_growth[drawn])))
+        later = market.monthly_price[11] * np.exp(np.cumsum(monthly[drawn].ravel()))
+        markets.append(market._replace(
+            stock_return=np.concatenate((market.stock_return[:1], stock[drawn])),
+            inflation=path_inflation,
+            mortgage_rate=np.concatenate((market.mortgage_rate[:1], rate[drawn])),
+            rent=rent,
+            monthly_price=np.concatenate((market.monthly_price[:12], later)),
+        ))
+    return markets
+
+
+def simulate_paths(scenario, n_paths, seed=None, block_years=BLOCK_YEARS, batch_size=BATCH_SIZE):
+    """
+    Yields batches of bootstrapped paths of one scenario (run_simulation keyword arguments):
+    ({metric: (batch, n_months) array} for PATH_METRICS, {name: (batch,) array} for FINALS).
+    """
+    market, params, _ = kernel.prepare_run(**scenario)
+    n_months = len(market.monthly_price)
+    pool = _year_pool(scenario.get("city", "National"))
+    rng = np.random.default_rng(seed)
+    down_payment_pct = scenario["down_payment_pct"]
+    insurance = scenario.get("monthly_insurance", 150)
+
+    for start in range(0, n_paths, batch_size):
+        size = min(batch_size, n_paths - start)
+        years = _draw_years(rng, size, len(market.stock_return) - 1, len(pool[0]), block_years)
+        paths = {metric: np.empty((size, n_months)) for metric in PATH_METRICS}
+        finals = {name: np.empty(size) for name in FINALS}
+        history = np.zeros((n_months, kernel.HISTORY_SIZE))
+        for i, path_market in enumerate(path_markets(market, pool, years, scenario.get("initial_rent"))):
+            state = kernel.initial_state(path_market, params, down_payment_pct, insurance)
+            kernel.advance(state, params, path_market, 0, n_months, history)
+            for metric, column in _HISTORY_COLUMNS.items():
+                paths[metric][i] = history[:, column]
+            summary = kernel.summarize(state, params, path_market, down_payment_pct)
+            finals["final_house_net"][i] = summary["final_house_net"]
+            finals["final_stock_net"][i] = summary["final_stock_net"]
+        finals["house_minus_stock"] = finals["final_house_net"] - finals["final_stock_net"]
+        paths_run.inc(size)
+        yield paths, finals
+
+
+def _aggregate(args):
+    scenario, n_paths, seed, block_years, k = args
+    aggregator = None
+    for paths, finals in simulate_paths(scenario, n_paths, seed, block_years):
+        if aggregator is None:
+            aggregator = sketches.PathAggregator(PATH_METRICS, next(iter(paths.values())).shape[1], k, seed)
+        for metric, values in paths.items():
+            aggregator.add_paths(metric, values)
+        for name, values in finals.items():
+            aggregator.add_finals(name, values)
+    return aggregator
+
+
+@metrics.timed("hvs_monte_carlo", "run_monte_carlo")
+def run_monte_carlo(scenario, n_paths, seed=0, processes=None, block_years=BLOCK_YEARS, k=sketches.DEFAULT_K):
+    """
+    n_paths bootstrapped paths of one scenario, aggregated: a sketches.PathAggregator
+    (bands("House Equity"), bands("Stock Balance"), final_quantiles("final_house_net"), ...).
+    processes > 1 splits the paths over a multiprocessing pool and merges the workers' aggregators.
+    """
+    n_workers = max(1, min(processes or 1, n_paths))
+    seeds = np.random.SeedSequence(seed).spawn(n_workers)
+    jobs = [(scenario, n, s, block_years, k)
+            for n, s in zip(np.diff(np.linspace(0, n_paths, n_workers + 1).astype(int)), seeds) if n]
+    if n_workers == 1:
+        parts = [_aggregate(job) for job in jobs]
+    else:
+        with Pool(n_workers) as pool:
+            parts = pool.map(_aggregate, jobs)
+    aggregator = parts[0]
+    for part in parts[1:]:
+        aggregator.merge(part)
+    return aggregator
+
+
+@metrics.timed("hvs_monte_carlo", "cohort_bands")
+def cohort_bands(cities=None, start_years=None, amortization=25, down_payment_pct=20, marginal_tax_pct=40,
+                 move_freq="Never", real=True, k=sketches.DEFAULT_K, seed=0):
+    """
+    Every historical (city, start year) run of one set of sidebar values, lined up by months since purchase.
+    Returns a sketches.PathAggregator; real=True deflates to purchase-year dollars first.
+    Defaults: the app's cities and every start year with at least a year of data.
+    """
+    cities = cities or warmup.CITIES
+    start_years = start_years or range(min(data_loader.STOCK_RETURNS), kernel.END_YEAR)
+    n_months = (kernel.END_YEAR - min(start_years) + 1) * 12
+    aggregator = sketches.PathAggregator(PATH_METRICS, n_months, k, seed)
+    for city in cities:
+        for start_year in start_years:
+            scenario = warmup.app_scenario(start_year, amortization, down_payment_pct, None, city,
+                                           marginal_tax_pct, move_freq)
+            market, params, state = kernel.prepare_run(**scenario)
+            history = np.zeros((len(market.monthly_price), kernel.HISTORY_SIZE))
+            kernel.advance(state, params, market, 0, len(history), history)
+            deflator = history[:, kernel.H_INFLATION_INDEX] if real else 1.0
+            for metric, column in _HISTORY_COLUMNS.items():
+                aggregator.add_paths(metric, (history[:, column] / deflator)[None, :])
+            summary = kernel.summarize(state, params, market, down_payment_pct)
+            final_deflator = state[kernel.S_INFLATION_INDEX] if real else 1.0
+            house, stock = summary["final_house_net"] / final_deflator, summary["final_stock_net"] / final_deflator
+            aggregator.add_finals("final_house_net", house)
+            aggregator.add_finals("final_stock_net", stock)
+            aggregator.add_finals("house_minus_stock", house - stock)
+    return aggregator
+
+
+def _print_bands(aggregator, every=60):
+    for metric in PATH_METRICS:
+        bands = aggregator.bands(metric)
+        bands = bands[(bands["Month"] % every == every - 1) | (bands["Month"] == bands["Month"].max())]
+        print(f"\n{metric} ({aggregator.n_paths(metric):,} paths)")
+        print(bands.drop(columns=["Min", "Max"]).to_string(index=False, float_format=lambda v: f"{v:,.0f}"))
+    print()
+    for name in aggregator.finals:
+        row = aggregator.final_quantiles(name)
+        print(f"{name:<20}" + "".join(f"{key} {value:>12,.0f}  " for key, value in row.items()))
+
+
+def _check(scenario, n_paths=5000, seed=0):
+    """Sketch percentiles against exact ones, keeping every path (what the sketches avoid)."""
+    aggregator, kept = None, {metric: [] for metric in PATH_METRICS}
+    for paths, finals in simulate_paths(scenario, n_paths, seed):
+        if aggregator is None:
+            aggregator = sketches.PathAggregator(PATH_METRICS, next(iter(paths.values())).shape[1], seed=seed)
+        for metric, values in paths.items():
+            aggregator.add_paths(metric, values)
+            kept[metric].append(values)
+    quantiles = np.array(sketches.DEFAULT_QUANTILES)
+    print(f"{'Metric':<16}{'Max rank error':>16}{'Sketch items':>14}{'Kept values':>14}")
+    for metric in PATH_METRICS:
+        exact = np.concatenate(kept[metric])
+        ordered = np.sort(exact, axis=0)
+        approx = aggregator.bands(metric)[[f"P{q * 100:g}" for q in quantiles]].to_numpy()
+        # Ranks as [below, at or below]: every path shares the first year's values
+        low = np.array([np.searchsorted(ordered[:, m], approx[m], side="left") for m in range(len(approx))]) / len(exact)
+        high = np.array([np.searchsorted(ordered[:, m], approx[m], side="right") for m in range(len(approx))]) / len(exact)
+        rank_error = np.maximum(0, np.maximum(low - quantiles, quantiles - high)).max()
+        items = sum(s.size() for s in aggregator.months[metric])
+        print(f"{metric:<16}{rank_error:>16.4f}{items:>14,}{exact.size:>14,}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description="Percentile bands of House Equity and Stock Balance.")
+    parser.add_argument("--paths", type=int, default=20000, help="bootstrapped Monte Carlo paths")
+    parser.add_argument("--start-year", type=int, default=1990)
+    parser.add_argument("--city", default="National")
+    parser.add_argument("--parallel", action="store_true", help="one worker per core")
+    parser.add_argument("--cohorts", action="store_true", help="historical cohorts instead of Monte Carlo")
+    parser.add_argument("--check", action="store_true", help="compare sketch percentiles with exact ones")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    scenario = warmup.app_scenario(args.start_year, 25, 20, None, args.city, 40, "Never")
+    start = time.perf_counter()
+    if args.check:
+        _check(scenario, seed=args.seed)
+    elif args.cohorts:
+        _print_bands(cohort_bands(seed=args.seed))
+    else:
+        aggregator = run_monte_carlo(scenario, args.paths, args.seed, os.cpu_count() if args.parallel else None)
+        _print_bands(aggregator)
+        print(f"\nSketches hold {aggregator.size():,} values "
+              f"(keeping every path: {aggregator.n_paths(PATH_METRICS[0]) * aggregator.n_months * len(PATH_METRICS):,})")
+    print(f"{time.perf_counter() - start:.1f}s")
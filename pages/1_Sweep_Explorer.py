@@ -0,0 +1,67 @@
+import os
+import streamlit as st
+import explorer
+
+st.set_page_config(page_title="Sweep Explorer", layout="wide")
+
+
+@st.cache_resource
+def load_index(path, dataset_key):
+    # Once per dataset version and server process; dataset_key changes when files are added
+    return explorer.open_index(path)
+
+
+st.title("🔎 Sweep Explorer")
+st.markdown("Filter, sort and page through sweep results. Only the page on screen is sent to the browser.")
+
+path = st.sidebar.text_input("Results Dataset", value=explorer.DEFAULT_PATH)
+index = load_index(path, explorer.dataset_key(path)) if os.path.isdir(path) else None
+if index is None:
+    st.info(f"No sweep results at `{path}`. Build them with `python explorer.py --build {path}`, "
+            "or write run_sweep rows there with `export.write_parquet(export.sweep_to_batch(rows), path)`.")
+    st.stop()
+
+keys = index.keys
+all_cities = sorted(set(keys["city"].unique().to_pylist()))
+start_years = keys["start_year"].unique().to_pylist()
+first_year, last_year = min(start_years), max(start_years)
+
+st.sidebar.header("Filters")
+cities = st.sidebar.multiselect("City", all_cities, default=[])
+years = st.sidebar.slider("Start Year", first_year, last_year, (first_year, last_year))
+winner = st.sidebar.radio("Winner", ["All", "House", "Stocks"], horizontal=True)
+margin_low = st.sidebar.number_input("Min House - Stock ($)", value=None, step=10000)
+margin_high = st.sidebar.number_input("Max House - Stock ($)", value=None, step=10000)
+
+st.sidebar.header("View")
+sortable = [explorer.MARGIN] + [c for c in keys.column_names if c not in ("row", explorer.MARGIN)]
+sort_by = st.sidebar.selectbox("Sort By", sortable)
+descending = st.sidebar.toggle("Descending", value=True)
+default_columns = [c for c in explorer.INDEX_COLUMNS if c in index.columns]
+columns = st.sidebar.multiselect("Columns", index.columns, default=default_columns)
+page_size = st.sidebar.selectbox("Rows per Page", [25, 50, 100, 250], index=1)
+
+filters = dict(cities=cities, years=years if years != (first_year, last_year) else None,
+               winner=None if winner == "All" else winner,
+               margin=(margin_low, margin_high) if margin_low is not None or margin_high is not None else None)
+# Back to the first page whenever the filters or the order change
+query_key = repr((filters, sort_by, descending, page_size))
+if st.session_state.get("explorer_query") != query_key:
+    st.session_state["explorer_query"] = query_key
+    st.session_state["explorer_page"] = 1
+
+# One filter and sort per (filters, order), cached on the index; the page widget's value is
+# already in session state (reset to 1 above whenever the page count can change)
+page = st.session_state["explorer_page"]
+frame, n_matching = explorer.query(index, **filters, sort_by=sort_by, descending=descending,
+                                   page=page - 1, page_size=page_size, columns=columns)
+n_pages = max(1, -(-n_matching // page_size))
+st.number_input(f"Page (of {n_pages:,})", min_value=1, max_value=n_pages, key="explorer_page")
+
+st.caption(f"{n_matching:,} of {keys.num_rows:,} scenarios match · rows {(page - 1) * page_size + 1:,}-"
+           f"{min(page * page_size, n_matching):,}")
+# Formatted in the browser
+dollars = st.column_config.NumberColumn(format="dollar", step=1)
+money = [c for c in frame.columns if c.startswith(("final_", "total_", "initial_", "closing_", "selling_", "start_house"))
+         or c in (explorer.MARGIN, "unfunded_shortfall")]
+st.dataframe(frame, hide_index=True, column_config={c: dollars for c in money})
@@ -0,0 +1,134 @@
+"""
+Scaling benchmark on synthetic data (see synthetic.py).
+
+Measures how time and peak Python memory (tracemalloc) grow with:
+  - regions and horizon: generating the dataset, building one city's market arrays
+  - horizon: one run on each engine (months simulated per second)
+  - scenario count: sweeps on the python, kernel and tree engines (scenarios per second)
+
+    python scaling.py            # default sizes, a few minutes
+    python scaling.py --quick    # small sizes, a smoke test
+
+Market arrays are built cold (lru cache cleared) so lookup costs show up;
+the first kernel call also pays numba's compile, so it is warmed up first.
+Each measurement runs twice: timed without tracemalloc (tracing slows Python
+code several times over), then traced for the peak.
+"""
+import sys
+import time
+import tracemalloc
+
+import kernel
+import simulation
+import sweep
+import synthetic
+
+START_YEAR = 1975
+
+
+def measure(func, *args, setup=None, **kwargs):
+    """
+    (result, seconds, peak MB allocated by Python while running), from an untraced
+    timed run and a separate traced one. setup() runs before each (e.g. clearing a cache).
+    """
+    if setup is not None:
+        setup()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak / 1e6
+
+
+def _scenario(data, end_year, **overrides):
+    return {"start_year": START_YEAR, "mortgage_years": 25, "down_payment_pct": 20,
+            "city": data.cities[len(data.cities) // 2], "end_year": end_year, **overrides}
+
+
+def bench_generate(region_counts, horizons):
+    rows = []
+    for n_regions in region_counts:
+        for n_years in horizons:
+            data, seconds, peak = measure(synthetic.generate, n_regions=n_regions, start_year=START_YEAR,
+                                          n_years=n_years, seed=0)
+            with synthetic.installed(data):
+                _, build_seconds, build_peak = measure(kernel.build_market_arrays, START_YEAR, data.cities[0],
+                                                       end_year=data.years[-1],
+                                                       setup=kernel._build_market_arrays.cache_clear)
+            rows.append((n_regions, n_years, seconds, peak, build_seconds, build_peak))
+    return rows
+
+
+def bench_engines(n_regions, horizons):
+    # Warm up numba on the bundled data
+    simulation.run_simulation(2000, 25, 20, summary_only=True, engine="kernel")
+    rows = []
+    for n_years in horizons:
+        data = synthetic.generate(n_regions=n_regions, start_year=START_YEAR, n_years=n_years, seed=0)
+        end_year = data.years[-1]
+        with synthetic.installed(data):
+            kernel.build_market_arrays(START_YEAR, _scenario(data, end_year)["city"], end_year=end_year)
+            row = [n_years]
+            for engine in ("python", "kernel"):
+                _, seconds, peak = measure(simulation.run_simulation, **_scenario(data, end_year),
+                                           summary_only=True, engine=engine)
+                row += [n_years * 12 / seconds, peak]
+        rows.append(tuple(row))
+    return rows
+
+
+def bench_sweep(n_regions, n_years, scenario_counts):
+    data = synthetic.generate(n_regions=n_regions, start_year=START_YEAR, n_years=n_years, seed=0)
+    end_year = data.years[-1]
+    rows = []
+    with synthetic.installed(data):
+        for count in scenario_counts:
+            # Distinct cities and start years, then move frequencies: the tree engine shares those prefixes
+            scenarios = sweep.scenario_grid(
+                start_year=[START_YEAR + 5 * i for i in range(max(1, count // 16))],
+                city=data.cities[:4],
+                move_freq_years=["Never", 5, 10, 20],
+            )[:count]
+            scenarios = [{**s, "mortgage_years": 25, "down_payment_pct": 20, "end_year": end_year}
+                         for s in scenarios]
+            row = [len(scenarios)]
+            for engine in ("python", "kernel", "tree"):
+                _, seconds, peak = measure(sweep.run_sweep, scenarios, engine=engine,
+                                           setup=kernel._build_market_arrays.cache_clear)
+                row += [len(scenarios) / seconds, peak]
+            rows.append(tuple(row))
+    return rows
+
+
+def main(quick=False):
+    if quick:
+        region_counts, horizons, engine_horizons, scenario_counts = (20, 80), (50, 150), (50, 200), (16, 64)
+    else:
+        region_counts, horizons, engine_horizons, scenario_counts = (50, 200, 800), (100, 300), (50, 200, 800), (16, 64, 256)
+
+    print("Dataset generation and one city's market arrays (cold)")
+    print(f"{'Regions':>8}{'Years':>7}{'Generate s':>12}{'Peak MB':>10}{'Build s':>10}{'Peak MB':>10}")
+    for n_regions, n_years, seconds, peak, build_seconds, build_peak in bench_generate(region_counts, horizons):
+        print(f"{n_regions:>8}{n_years:>7}{seconds:>12.3f}{peak:>10.1f}{build_seconds:>10.3f}{build_peak:>10.1f}")
+
+    print("\nOne run per engine (summary only), months simulated per second")
+    print(f"{'Years':>7}{'Python m/s':>14}{'Peak MB':>10}{'Kernel m/s':>14}{'Peak MB':>10}")
+    for n_years, python_rate, python_peak, kernel_rate, kernel_peak in bench_engines(region_counts[0], engine_horizons):
+        print(f"{n_years:>7}{python_rate:>14,.0f}{python_peak:>10.1f}{kernel_rate:>14,.0f}{kernel_peak:>10.1f}")
+
+    print(f"\nSweeps over {horizons[0]} years, scenarios per second (market arrays cold)")
+    print(f"{'Scenarios':>10}{'Python':>10}{'Peak MB':>10}{'Kernel':>10}{'Peak MB':>10}{'Tree':>10}{'Peak MB':>10}")
+    for row in bench_sweep(region_counts[0], horizons[0], scenario_counts):
+        print(f"{row[0]:>10}" + "".join(f"{rate:>10,.1f}{peak:>10.1f}" for rate, peak in zip(row[1::2], row[2::2])))
+
+
+if __name__ == "__main__":
+    main(quick="--quick" in sys.argv)
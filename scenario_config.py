@@ -0,0 +1,334 @@
+"""
+Scenario config files, compiled into deduplicated execution plans.
+
+A config (TOML, or YAML when PyYAML is installed) declares named scenarios of
+run_simulation arguments:
+
+    [defaults]                      # every scenario starts from these
+    mortgage_years = 25
+    down_payment_pct = 20
+
+    [scenarios.toronto]
+    city = "Toronto"
+    start_year = { range = [1975, 2020, 5] }   # start, stop, step; stop included
+    move_freq_years = ["Never", 5, 10]         # a list is a sweep axis
+
+    [scenarios.toronto_low_down]
+    extends = "toronto"             # or a list of names, later ones win
+    down_payment_pct = [5, 10]
+
+A scenario with `abstract = true` is only a base for others. Each scenario
+expands to the product of its list / range axes, so hand-written configs
+repeat themselves quickly; compile_plan() canonicalizes every expanded
+scenario (defaults filled in, 20 == 20.0, a move frequency past the horizon
+is "Never"), runs each distinct one once, and batches them by market data
+(city, start year, horizon, rent) with runs that only differ in the move
+frequency next to each other, where the prefix-sharing tree simulates their
+common months once (see scenario_tree.py). plan.report says what that saved.
+
+Runs that only differ in the marginal tax rate or the rent share their whole
+housing leg (mortgage, house value, costs, moves). The plan counts those
+("housing_legs") but doesn't simulate the leg once for them: the kernel runs
+both legs in one loop, the stock side consuming each month's housing cash
+flow as it goes, so sharing it would mean splitting the kernel (and every
+engine built on it) into a housing pass and a stock pass with a cash-flow
+buffer per run. Prefix sharing covers the common case of move-frequency axes.
+
+    python scenario_config.py scenarios.toml                   # print the plan report
+    python scenario_config.py scenarios.toml --run out.parquet # run it, one row per expanded scenario
+    python scenario_config.py scenarios.toml --set marginal_tax_rate=0.3
+"""
+import inspect
+import itertools
+import os
+import tomllib
+from collections import namedtuple
+from multiprocessing import Pool
+
+import metrics
+import scenario_tree
+import simulation
+import sweep
+
+try:
+    import yaml
+except ImportError:  # Optional dependency, TOML configs work without it
+    yaml = None
+
+# run_simulation arguments that choose how to run, not what: set by the plan, not the config
+EXECUTION_OPTIONS = ("engine", "summary_only", "snapshot_freq", "closing_costs", "stock_step", "time_step")
+
+_SIGNATURE = inspect.signature(simulation.run_simulation).parameters
+SCENARIO_PARAMS = tuple(name for name in _SIGNATURE if name not in EXECUTION_OPTIONS)
+REQUIRED_PARAMS = tuple(name for name in SCENARIO_PARAMS if _SIGNATURE[name].default is inspect.Parameter.empty)
+DEFAULTS = {name: _SIGNATURE[name].default for name in SCENARIO_PARAMS if name not in REQUIRED_PARAMS}
+
+# Config keys that aren't run_simulation arguments
+_META_KEYS = ("extends", "abstract")
+
+# entries: [(scenario name, scenario as expanded)], one per line of the plan
+# scenarios: distinct canonical scenarios, index: entry -> its scenario
+# batches: lists of scenario indices sharing market data, run together
+Plan = namedtuple("Plan", ["entries", "scenarios", "index", "batches", "report"])
+
+
+def load(path):
+    """Reads a .toml / .yaml / .yml config into a dict."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".toml":
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    if ext in (".yaml", ".yml"):
+        if yaml is None:
+            raise ImportError("YAML configs need PyYAML (pip install pyyaml); TOML works without it")
+        with open(path) as f:
+            return yaml.safe_load(f) or {}
+    raise ValueError(f"Unknown config format: {path!r} (use .toml, .yaml or .yml)")
+
+
+def _resolve(name, declared, resolved, chain=()):
+    # Flattens `extends` (depth first, later bases win, the scenario's own keys last)
+    if name in resolved:
+        return resolved[name]
+    if name in chain:
+        raise ValueError(f"Scenario inheritance cycle: {' -> '.join(chain + (name,))}")
+    if name not in declared:
+        raise ValueError(f"Scenario {chain[-1]!r} extends unknown scenario {name!r}")
+    own = declared[name]
+    bases = own.get("extends", [])
+    merged = {}
+    for base in [bases] if isinstance(bases, str) else bases:
+        merged.update(_resolve(base, declared, resolved, chain + (name,)))
+    merged.update({k: v for k, v in own.items() if k not in _META_KEYS})
+    resolved[name] = merged
+    return merged
+
+
+def _axis(value):
+    """The values one parameter takes: a list, a {range = [start, stop, step]} or a single value."""
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        if set(value) != {"range"} or len(value["range"]) != 3:
+            raise ValueError(f"Expected {{range = [start, stop, step]}}, got {value!r}")
+        start, stop, step = value["range"]
+        if step <= 0:
+            raise ValueError(f"Range step must be positive: {value!r}")
+        # Counted, not accumulated, so float steps don't drift; the stop is included
+        n = int((stop - start) / step + 1e-9) + 1
+        return [round(start + i * step, 10) for i in range(n)]
+    return [value]
+
+
+def expand(config, overrides=None):
+    """
+    Every concrete scenario of a config: [(scenario name, run_simulation arguments)].
+    overrides: {param: value} applied to every scenario on top of the config (ranges and lists too).
+    """
+    unknown = set(config) - {"defaults", "scenarios"}
+    if unknown:
+        raise ValueError(f"Unknown config sections: {sorted(unknown)}")
+    declared = config.get("scenarios", {})
+    defaults = config.get("defaults", {})
+    resolved = {}
+    entries = []
+    for name, own in declared.items():
+        if own.get("abstract", False):
+            continue
+        spec = {**defaults, **_resolve(name, declared, resolved), **(overrides or {})}
+        params = list(spec)
+        for values in itertools.product(*(_axis(spec[p]) for p in params)):
+            entries.append((name, dict(zip(params, values))))
+    return entries
+
+
+def _number(value):
+    # 20 and 20.0 are the same scenario
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def canonical(scenario):
+    """
+    The run_simulation arguments of a scenario in one normal form: defaults filled in,
+    integral floats as ints, "never" spelled "Never", and a move frequency the horizon never
+    reaches as "Never" (no move happens either way). Raises ValueError on unknown or missing parameters.
+    """
+    unknown = set(scenario) - set(SCENARIO_PARAMS)
+    if unknown:
+        hint = " (set by the plan, not the config)" if unknown & set(EXECUTION_OPTIONS) else ""
+        raise ValueError(f"Unknown scenario parameters {sorted(unknown)}{hint}")
+    missing = [p for p in REQUIRED_PARAMS if p not in scenario]
+    if missing:
+        raise ValueError(f"Scenario {scenario!r} is missing {missing}")
+    result = {p: _number(v) for p, v in {**DEFAULTS, **scenario}.items()}
+
+    move = result["move_freq_years"]
+    if isinstance(move, str) and move.lower() == "never":
+        move = "Never"
+    elif move * 12 >= _horizon_months(result):
+        move = "Never"
+    result["move_freq_years"] = move
+    return result
+
+
+def _horizon_months(scenario):
+    return (scenario["end_year"] - scenario["start_year"] + 1) * 12
+
+
+def _market_key(scenario):
+    # What kernel.build_market_arrays is keyed on
+    return scenario["city"], scenario["start_year"], scenario["end_year"], scenario["initial_rent"]
+
+
+def _prefix_key(scenario):
+    # Runs equal apart from the move frequency share every month before their first different move
+    return tuple(sorted((k, v) for k, v in scenario.items() if k != "move_freq_years"))
+
+
+def _housing_key(scenario):
+    # Everything the housing leg reads: runs equal apart from these share it (see module docstring)
+    return tuple(sorted((k, v) for k, v in scenario.items() if k not in ("marginal_tax_rate", "initial_rent")))
+
+
+def _move_month(scenario):
+    move = scenario["move_freq_years"]
+    return _horizon_months(scenario) if move == "Never" else move * 12
+
+
+def _tree_months(group):
+    """
+    Months the prefix-sharing tree simulates for runs that only differ in the move frequency.
+    Schedules moving every a < b years first differ at month 12a, so with the distinct first-move
+    months d1 < ... < dk (the horizon n for "Never") the trunk runs n months and the
+    run forking at each d_i (but the last) adds n - d_i.
+    """
+    n = _horizon_months(group[0])
+    first_moves = sorted({_move_month(s) for s in group})
+    return n + sum(n - d for d in first_moves[:-1])
+
+
+@metrics.timed("hvs_scenario_plan", "compile_plan")
+def compile_plan(config, overrides=None):
+    """
+    Compiles a config (dict, see load) into a Plan. plan.report counts the work:
+    lines (expanded scenarios), unique (after canonicalizing), duplicates removed,
+    market batches, prefix groups, distinct housing legs (counted, not shared),
+    and months to simulate as written, once each,
+    and with shared prefixes ("months_planned"), plus the share of months removed.
+    """
+    entries = expand(config, overrides)
+    scenarios, index, seen = [], [], {}
+    months_requested = 0
+    for _, scenario in entries:
+        form = canonical(scenario)
+        months_requested += _horizon_months(form)
+        key = tuple(sorted(form.items()))
+        if key not in seen:
+            seen[key] = len(scenarios)
+            scenarios.append(form)
+        index.append(seen[key])
+
+    batches, prefix_groups = {}, {}
+    for i, scenario in enumerate(scenarios):
+        batches.setdefault(_market_key(scenario), []).append(i)
+        prefix_groups.setdefault(_prefix_key(scenario), []).append(scenario)
+    # Runs sharing a prefix next to each other (the tree finds them within a batch either way)
+    batches = [sorted(batch, key=lambda i: (_prefix_key(scenarios[i]), _move_month(scenarios[i])))
+               for batch in batches.values()]
+
+    months_unique = sum(_horizon_months(s) for s in scenarios)
+    months_planned = sum(_tree_months(group) for group in prefix_groups.values())
+    report = {
+        "lines": len(entries),
+        "unique": len(scenarios),
+        "duplicates_removed": len(entries) - len(scenarios),
+        "batches": len(batches),
+        "prefix_groups": len(prefix_groups),
+        "housing_legs": len({_housing_key(s) for s in scenarios}),
+        "months_requested": months_requested,
+        "months_unique": months_unique,
+        "months_planned": months_planned,
+        "work_removed": 1 - months_planned / months_requested if months_requested else 0.0,
+    }
+    return Plan(entries, scenarios, index, batches, report)
+
+
+def _run_batch(scenarios):
+    results, stats = scenario_tree.run_tree(scenarios, closing_costs=sweep.scenario_closing_costs(scenarios))
+    return results, stats["months_simulated"]
+
+
+@metrics.timed("hvs_scenario_plan_run", "run_plan")
+def run_plan(plan, engine="tree", processes=None):
+    """
+    Runs every distinct scenario of a plan once and returns (rows, months_simulated):
+    one row per line of the plan (scenario name, its parameters as written, results).
+    engine="tree" runs batch by batch on the prefix-sharing tree (processes > 1 spreads
+    the batches, each worker builds a batch's market data once); "kernel" / "python" run
+    each distinct scenario alone through run_sweep.
+    """
+    if engine == "tree":
+        jobs = [[plan.scenarios[i] for i in batch] for batch in plan.batches]
+        if not processes or processes <= 1:
+            outputs = [_run_batch(job) for job in jobs]
+        else:
+            with Pool(processes) as pool:
+                outputs = pool.map(_run_batch, jobs)
+        results = [None] * len(plan.scenarios)
+        for batch, (batch_results, _) in zip(plan.batches, outputs):
+            for i, result in zip(batch, batch_results):
+                results[i] = result
+        months_simulated = sum(months for _, months in outputs)
+    else:
+        rows = sweep.run_sweep(plan.scenarios, engine=engine, processes=processes)
+        results = [{k: v for k, v in row.items() if k not in SCENARIO_PARAMS} for row in rows]
+        months_simulated = plan.report["months_unique"]
+    rows = [{"scenario": name, **scenario, **results[i]} for (name, scenario), i in zip(plan.entries, plan.index)]
+    return rows, months_simulated
+
+
+def _parse_override(text):
+    # --set key=value, value in TOML syntax (bare words are strings: --set city=Toronto)
+    key, _, value = text.partition("=")
+    try:
+        return key.strip(), tomllib.loads(f"v = {value}")["v"]
+    except tomllib.TOMLDecodeError:
+        return key.strip(), value.strip()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Compile (and run) a scenario config.")
+    parser.add_argument("config", help=".toml, .yaml or .yml scenario config")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="override a parameter in every scenario (TOML value, repeatable)")
+    parser.add_argument("--run", metavar="OUT", help="run the plan and write one row per line (.parquet or .csv)")
+    parser.add_argument("--engine", default="tree", choices=["tree", "kernel", "python"])
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    plan = compile_plan(load(args.config), dict(_parse_override(s) for s in args.set))
+    r = plan.report
+    print(f"{r['lines']:,} scenario lines -> {r['unique']:,} unique ({r['duplicates_removed']:,} duplicates removed)")
+    print(f"{r['batches']:,} market batches, {r['prefix_groups']:,} prefix groups, "
+          f"{r['housing_legs']:,} distinct housing legs (not shared, see the module docstring)")
+    print(f"Months to simulate: {r['months_requested']:,} as written, {r['months_unique']:,} unique, "
+          f"{r['months_planned']:,} with shared prefixes ({r['work_removed']:.1%} removed)")
+
+    if args.run:
+        start = time.perf_counter()
+        rows, months = run_plan(plan, engine=args.engine, processes=args.processes)
+        print(f"Ran in {time.perf_counter() - start:.1f}s, {months:,} months simulated")
+        df = pd.DataFrame(rows)
+        df["move_freq_years"] = df["move_freq_years"].astype(str)  # "Never" and years in one column
+        if args.run.endswith(".csv"):
+            df.to_csv(args.run, index=False)
+        else:
+            df.to_parquet(args.run, index=False)
+        print(f"{len(df):,} rows -> {args.run}")
@@ -0,0 +1,136 @@
+"""
+Prefix-sharing scheduler: runs many scenarios, simulating shared months once.
+
+Scenarios that start from the same month-0 state and parameters (apart from
+the move frequency) see identical inputs until some month: e.g. moving every
+10 vs 15 years is the same run for the first 10 years, and a stress overlay
+only differs from the base from its shock date on. The scheduler advances one
+kernel state over the common prefix, checkpoints it at the first month where
+the inputs diverge (the state vector holds everything: balances, TFSA/RRSP
+room, pending refund, taxable lots) and forks a copy per distinct branch.
+
+Total work is the number of distinct (prefix, month) pairs instead of
+scenarios x months. Results are the same as running each scenario alone.
+
+Sharing only pays without Numba: a JIT-compiled month costs less than the
+divergence checks and forks, so by default (share_prefixes=None) run_tree
+shares prefixes only when kernel.JIT_AVAILABLE is false and otherwise runs
+every scenario straight through. On the 1,150-scenario city x start year x
+move frequency grid: with Numba (warm) 0.15-0.21s sharing vs 0.09-0.11s
+straight through; without it 2.1s sharing vs 3.0s.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+import kernel
+
+# Yearly arrays the kernel reads every month of the year
+_YEARLY_FIELDS = ("stock_return", "inflation", "rent", "mortgage_rate", "tfsa_limit", "rrsp_limit",
+                  "yearly_inclusion_rate")
+
+_Leaf = namedtuple("_Leaf", ["index", "market", "params", "state", "n_months", "down_payment_pct"])
+
+
+def _move_schedule(move_months, months):
+    if move_months == 0:
+        return np.zeros(len(months), dtype=bool)
+    return (months > 0) & (months % move_months == 0)
+
+
+def _divergence(a, b, month):
+    """First month >= `month` where the kernel inputs of leaves a and b differ (n_months if never)."""
+    first = a.n_months
+    for field in _YEARLY_FIELDS + ("monthly_price",):
+        values_a, values_b = getattr(a.market, field), getattr(b.market, field)
+        if values_a is values_b:  # Overlays only copy the arrays they change
+            continue
+        per = 1 if field == "monthly_price" else 12
+        start = month // per
+        differs = np.flatnonzero(values_a[start:] != values_b[start:])
+        if len(differs):
+            first = min(first, (start + int(differs[0])) * per)
+
+    move_a, move_b = int(a.params[kernel.P_MOVE_MONTHS]), int(b.params[kernel.P_MOVE_MONTHS])
+    if move_a != move_b and first > month:
+        months = np.arange(month, first)
+        differs = np.flatnonzero(_move_schedule(move_a, months) != _move_schedule(move_b, months))
+        if len(differs):
+            first = month + int(differs[0])
+    return max(first, month)
+
+
+def _group_key(leaf):
+    # Everything except the move schedule must match from month 0 to share anything
+    params = leaf.params.copy()
+    params[kernel.P_MOVE_MONTHS] = 0
+    return leaf.n_months, params.tobytes(), leaf.state.tobytes()
+
+
+def _run_group(leaves, results, stats):
+    stack = [(leaves[0].state.copy(), 0, leaves)]
+    while stack:
+        state, month, group = stack.pop()
+        ref = group[0]
+        n_months = ref.n_months
+        split = min((_divergence(ref, leaf, month) for leaf in group[1:]), default=n_months)
+
+        # Every leaf in the group has the same inputs until `split`
+        kernel.advance(state, ref.params, ref.market, month, split)
+        stats["months_simulated"] += split - month
+
+        if split == n_months:
+            for leaf in group:
+                results[leaf.index] = kernel.summarize(state, leaf.params, leaf.market, leaf.down_payment_pct)
+            continue
+
+        # Fork: leaves that agree on month `split` stay together
+        branches = []
+        for leaf in group:
+            for branch in branches:
+                if _divergence(branch[0], leaf, split) > split:
+                    branch.append(leaf)
+                    break
+            else:
+                branches.append([leaf])
+        stats["branches"] += len(branches) - 1
+        for i, branch in enumerate(branches):
+            # The last branch can keep the checkpoint itself
+            stack.append((state if i == len(branches) - 1 else state.copy(), split, branch))
+
+
+def run_tree(scenarios, overlays=None, closing_costs=None, share_prefixes=None):
+    """
+    Runs every scenario (run_simulation keyword arguments) in summary-only mode, sharing common prefixes.
+    overlays: optional list (one per scenario) of market overlays (see stress.py) or None.
+    closing_costs: optional list of purchase closing costs (see sweep.scenario_closing_costs).
+    share_prefixes: None shares them only when the kernel isn't JIT-compiled (see the module docstring).
+
+    Returns (results, stats): kernel.summarize dicts in scenario order, and
+    {"months_simulated", "months_total", "branches"}.
+    """
+    overlays = overlays or [None] * len(scenarios)
+    closing_costs = closing_costs or [None] * len(scenarios)
+    if share_prefixes is None:
+        share_prefixes = not kernel.JIT_AVAILABLE
+
+    groups = {}
+    prepared = {}  # The same scenario under several overlays is only prepared once
+    for index, (scenario, overlay, cost) in enumerate(zip(scenarios, overlays, closing_costs)):
+        key = (repr(sorted(scenario.items())), cost)
+        if key not in prepared:
+            prepared[key] = kernel.prepare_run(**scenario, closing_costs=cost)
+        market, params, state = prepared[key]
+        if overlay is not None:
+            market = overlay(market)
+            state = kernel.initial_state(market, params, scenario["down_payment_pct"],
+                                         scenario.get("monthly_insurance", 150))
+        leaf = _Leaf(index, market, params, state, len(market.monthly_price), scenario["down_payment_pct"])
+        groups.setdefault(_group_key(leaf) if share_prefixes else index, []).append(leaf)
+
+    results = [None] * len(scenarios)
+    stats = {"months_simulated": 0, "months_total": 0, "branches": 0}
+    for leaves in groups.values():
+        stats["months_total"] += sum(leaf.n_months for leaf in leaves)
+        _run_group(leaves, results, stats)
+    return results, stats
@@ -0,0 +1,215 @@
+"""
+Global (Sobol) sensitivity analysis of the model's hardcoded assumptions.
+
+Each assumption gets a plausible range. Saltelli sampling draws two base
+matrices A and B (N rows) plus one hybrid matrix per assumption (A with that
+column taken from B), so N * (D + 2) runs give:
+
+  first-order index S1: share of the output variance explained by the assumption alone
+  total index ST:       share that involves it at all (alone or through interactions)
+
+An ST close to 0 means the assumption doesn't matter for this scenario and
+its hardcoded value is harmless. Runs go through the flat-array kernel in
+batches (one market build per scenario, optionally spread over a Pool).
+
+Uses scipy's scrambled Sobol sequence when scipy is installed, plain
+uniform random samples otherwise.
+"""
+from collections import namedtuple
+from multiprocessing import Pool
+
+import numpy as np
+
+import data_loader
+import kernel
+import metrics
+import warmup
+
+try:
+    from scipy.stats import qmc
+except ImportError:
+    qmc = None
+
+Assumption = namedtuple("Assumption", ["name", "baseline", "low", "high", "description"])
+
+# Selling costs the simulation charges by default (data_loader.SELLING_COSTS)
+COMMISSION, SALES_TAX = data_loader.get_selling_cost_rates("National")
+
+ASSUMPTIONS = [
+    Assumption("maintenance_rate", kernel.MAINTENANCE_RATE, 0.005, 0.02, "Maintenance, share of purchase price per year (1% rule)"),
+    Assumption("mer", kernel.MER_RATE, 0.0005, 0.01, "Fund MER"),
+    Assumption("dividend_yield", kernel.DIVIDEND_YIELD, 0.01, 0.03, "Dividend yield (taxed each year)"),
+    Assumption("insurance_rate", warmup.INSURANCE_RATE, 0.001, 0.004, "Home insurance, share of purchase price per year"),
+    Assumption("commission", COMMISSION, COMMISSION - 0.02, COMMISSION + 0.02, "Realtor commission on sale"),
+    Assumption("sales_tax", SALES_TAX, SALES_TAX - 0.05, SALES_TAX + 0.05, "Sales tax (HST) on the commission"),
+    Assumption("seasonality_scale", 1.0, 0.0, 2.0, "Scale of SEASONALITY_INDEX (0 = no seasonality)"),
+    Assumption("fallback_growth", 0.03, 0.0, 0.06, "House price growth assumed when next year's price is missing"),
+]
+
+OUTPUTS = {
+    "House - Stock": lambda r: r["final_house_net"] - r["final_stock_net"],
+    "House Net": lambda r: r["final_house_net"],
+    "Stock Net": lambda r: r["final_stock_net"],
+}
+
+SEASONALITY = np.array([data_loader.SEASONALITY_INDEX[m] for m in range(1, 13)])
+
+
+def _sample_matrices(n, d, seed=None):
+    """Two independent (n, d) matrices of points in the unit cube."""
+    if qmc is not None:
+        points = qmc.Sobol(2 * d, scramble=True, seed=seed).random(n)
+    else:
+        points = np.random.default_rng(seed).random((n, 2 * d))
+    return points[:, :d], points[:, d:]
+
+
+def saltelli_samples(n, assumptions=ASSUMPTIONS, seed=None):
+    """
+    Saltelli design in assumption units: rows of A, then B, then AB_1..AB_D.
+    Returns an (n * (d + 2), d) array.
+    """
+    d = len(assumptions)
+    a, b = _sample_matrices(n, d, seed)
+    blocks = [a, b]
+    for i in range(d):
+        ab = a.copy()
+        ab[:, i] = b[:, i]
+        blocks.append(ab)
+    unit = np.vstack(blocks)
+    low = np.array([x.low for x in assumptions])
+    high = np.array([x.high for x in assumptions])
+    return low + unit * (high - low)
+
+
+def _fallback_years(market, city):
+    # Years whose next-year price comes from the 3% fallback in get_monthly_housing_price
+    years = range(market.start_year, market.start_year + len(market.stock_return))
+    return np.array([data_loader.get_housing_price(y + 1, city) is None or data_loader.get_housing_price(y, city) <= 0
+                     for y in years])
+
+
+def _apply_market(market, values, fallback_mask):
+    """Market arrays with the seasonality scale and fallback growth of one sample."""
+    seasonality = np.tile(SEASONALITY, len(market.stock_return))
+    trend = market.monthly_price / seasonality
+    if fallback_mask.any():
+        # Replace the trend of fallback years with the sampled growth (from each year's first month)
+        months = np.tile(np.arange(12), len(fallback_mask))
+        growth = (1 + values["fallback_growth"]) ** (months / 12.0)
+        first = np.repeat(trend[::12], 12)
+        trend = np.where(np.repeat(fallback_mask, 12), first * growth, trend)
+    monthly_price = trend * (1 + values["seasonality_scale"] * (seasonality - 1))
+    return market._replace(monthly_price=monthly_price)
+
+
+def full_scenario(scenario=None):
+    """
+    run_simulation arguments for a partial scenario: the app's defaults for its city and
+    start year (property tax and insurance follow them), overridden by what it sets.
+    """
+    scenario = scenario or {}
+    base = warmup.app_scenario(**{**warmup.DEFAULTS, "city": scenario.get("city", warmup.DEFAULTS["city"]),
+                                  "start_year": scenario.get("start_year", warmup.DEFAULTS["start_year"])})
+    return {**base, **scenario}
+
+
+def _evaluate_batch(args):
+    scenario, names, rows, output = args
+    scenario = full_scenario(scenario)
+    base_market, base_params, _ = kernel.prepare_run(**scenario)
+    fallback_mask = _fallback_years(base_market, scenario["city"])
+    n_months = len(base_market.monthly_price)
+    values_out = np.empty(len(rows))
+    for i, row in enumerate(rows):
+        values = dict(zip(names, row))
+        market = _apply_market(base_market, values, fallback_mask)
+        params = kernel.make_params(
+            scenario["mortgage_years"], scenario["marginal_tax_rate"], scenario["move_freq_years"],
+            scenario["property_tax_rate_pct"], base_params[kernel.P_CLOSING_COSTS], scenario["city"],
+            mer=values["mer"], dividend_yield=values["dividend_yield"],
+            selling_rates=(values["commission"], values["sales_tax"]),
+        )
+        state = kernel.initial_state(market, params, scenario["down_payment_pct"],
+                                     monthly_insurance=market.house_price * values["insurance_rate"] / 12,
+                                     maintenance_rate=values["maintenance_rate"])
+        kernel.advance(state, params, market, 0, n_months)
+        values_out[i] = OUTPUTS[output](kernel.summarize(state, params, market, scenario["down_payment_pct"]))
+    return values_out
+
+
+def evaluate(samples, scenario=None, output="House - Stock", assumptions=ASSUMPTIONS,
+             processes=None, batch_size=256):
+    """Model output for every sample row (kernel runs, batched)."""
+    names = [x.name for x in assumptions]
+    scenario = scenario or {}
+    batches = [(scenario, names, samples[i:i + batch_size], output)
+               for i in range(0, len(samples), batch_size)]
+    if not processes or processes <= 1:
+        return np.concatenate([_evaluate_batch(batch) for batch in batches])
+    with Pool(processes) as pool:
+        return np.concatenate(pool.map(_evaluate_batch, batches))
+
+
+def sobol_indices(y, n, d, n_bootstrap=200, seed=None):
+    """
+    First-order (Saltelli 2010) and total (Jansen) indices from outputs in
+    saltelli_samples() order, with bootstrap 95% confidence half-widths.
+    """
+    y = y - y[:2 * n].mean()  # Centering keeps the S1 estimator stable when the mean is large
+    f_a, f_b = y[:n], y[n:2 * n]
+    f_ab = y[2 * n:].reshape(d, n)
+
+    def estimate(idx):
+        a, b, ab = f_a[idx], f_b[idx], f_ab[:, idx]
+        variance = np.var(np.concatenate((a, b)))
+        if variance == 0:
+            return np.zeros(d), np.zeros(d)
+        s1 = np.mean(b * (ab - a), axis=1) / variance
+        st = 0.5 * np.mean((a - ab) ** 2, axis=1) / variance
+        return s1, st
+
+    s1, st = estimate(np.arange(n))
+    rng = np.random.default_rng(seed)
+    boot = [estimate(rng.integers(0, n, n)) for _ in range(n_bootstrap)]
+    s1_conf = 1.96 * np.std([b[0] for b in boot], axis=0)
+    st_conf = 1.96 * np.std([b[1] for b in boot], axis=0)
+    return s1, st, s1_conf, st_conf
+
+
+@metrics.timed("hvs_sensitivity", "sobol_analysis")
+def sobol_analysis(scenario=None, n=256, output="House - Stock", assumptions=ASSUMPTIONS,
+                   processes=None, seed=None):
+    """
+    Sobol indices of every assumption for one scenario (run_simulation arguments; any
+    left out come from full_scenario, e.g. {"city": "Vancouver"} gets Vancouver's
+    property tax). n should be a power of two.
+    Returns (rows, info): one row per assumption sorted by total index, and
+    {"runs", "mean", "std"} of the output.
+    """
+    d = len(assumptions)
+    samples = saltelli_samples(n, assumptions, seed)
+    y = evaluate(samples, scenario, output, assumptions, processes)
+    s1, st, s1_conf, st_conf = sobol_indices(y, n, d, seed=seed)
+
+    rows = [{
+        "Assumption": x.name,
+        "Baseline": x.baseline,
+        "Range": (x.low, x.high),
+        "S1": s1[i],
+        "S1 conf": s1_conf[i],
+        "ST": st[i],
+        "ST conf": st_conf[i],
+        "Description": x.description,
+    } for i, x in enumerate(assumptions)]
+    rows.sort(key=lambda r: -r["ST"])
+    base = y[:2 * n]
+    return rows, {"runs": len(y), "mean": float(base.mean()), "std": float(base.std())}
+
+
+if __name__ == "__main__":
+    rows, info = sobol_analysis(seed=0)
+    print(f"{info['runs']} runs, House - Stock mean ${info['mean']:,.0f}, std ${info['std']:,.0f}")
+    print(f"{'Assumption':<20}{'S1':>8}{'ST':>8}")
+    for r in rows:
+        print(f"{r['Assumption']:<20}{r['S1']:>8.3f}{r['ST']:>8.3f}")
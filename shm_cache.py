@@ -0,0 +1,278 @@
+"""
+Cross-process shared-memory store for market arrays and hot results.
+
+Values are published once into named multiprocessing.shared_memory segments
+and read by every process on the machine: NumPy arrays come back as read-only
+views of the shared segment (zero copy), other objects are pickled.
+
+A small JSON index (itself a shared segment) maps keys to segments and tracks
+sizes and last use. It is guarded by a file lock. When the total size would go
+over max_bytes, or the index would outgrow its INDEX_BYTES segment (many small
+values), the least recently used segments are unlinked. Each process
+keeps the segments it reads mapped, and at most every SYNC_SECONDS per key it
+checks them against the index: it touches the key's last use (so the LRU sees
+local hits too) and unmaps whatever the index no longer lists, so evicted
+segments don't stay mapped past the budget. Views handed out earlier stay
+valid until they are dropped.
+
+Enabled with HVS_SHM_CACHE_MB=<budget>; default_store() returns None otherwise.
+Needs fcntl (Linux / macOS).
+"""
+import hashlib
+import json
+import os
+import pickle
+import struct
+import tempfile
+import time
+from multiprocessing import resource_tracker, shared_memory
+from threading import Lock
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+INDEX_BYTES = 1 << 20
+_HEADER = struct.Struct("<I")  # Length of the JSON index
+SYNC_SECONDS = 1.0  # How long a local hit is served without looking at the index
+INDEX_SLACK = 4096  # Index bytes kept free for last_used updates between publishes
+
+
+def _untrack(shm):
+    # The resource tracker would unlink segments when the creating (or, before
+    # Python 3.13, any attaching) process exits; the store manages their lifetime.
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def _entry_bytes(key, meta):
+    # What an entry adds to json.dumps(index): '"key": {...}, '
+    return len(json.dumps(key).encode()) + len(json.dumps(meta).encode()) + 4
+
+
+def _unlink(name):
+    # Attaching registers it with the resource tracker, which unlink() expects
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _release(shm):
+    # Arrays from get_array hold a reference to the mmap object (their base), not a buffer
+    # export, so close() would unmap it under them (and another thread may be reading buf).
+    # Dropping the store's references instead unmaps it now if nothing else uses it, or
+    # when the last array / buffer is freed.
+    shm._buf = None
+    shm._mmap = None
+    shm.close()  # Just the file descriptor now
+
+
+class _FileLock:
+    # Threads of this process (local lock), then other processes (file lock)
+    def __init__(self, store):
+        self.store = store
+
+    def __enter__(self):
+        self.store._local_lock.acquire()
+        self.f = open(self.store._lock_path, "a+")
+        fcntl.flock(self.f, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+        self.store._local_lock.release()
+
+
+class SharedMemoryStore:
+    def __init__(self, namespace="hvs", max_bytes=256 << 20):
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{namespace}_shm.lock")
+        self._local_lock = Lock()
+        self._attached = {}  # key -> (SharedMemory, buffer, meta, last index check), see _attach
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        with self._locked():
+            try:
+                self._index_shm = shared_memory.SharedMemory(name=f"{namespace}_idx")
+            except FileNotFoundError:
+                self._index_shm = shared_memory.SharedMemory(name=f"{namespace}_idx", create=True, size=INDEX_BYTES)
+                self._write_index({})
+            _untrack(self._index_shm)
+
+    # --- Index (call with the file lock held) ---
+    def _locked(self):
+        return _FileLock(self)
+
+    def _read_index(self):
+        buf = self._index_shm.buf
+        (length,) = _HEADER.unpack_from(buf, 0)
+        return json.loads(bytes(buf[_HEADER.size:_HEADER.size + length]) or b"{}")
+
+    def _write_index(self, index):
+        data = json.dumps(index).encode()
+        if _HEADER.size + len(data) > INDEX_BYTES:
+            raise MemoryError("shared memory index is full")
+        buf = self._index_shm.buf
+        buf[_HEADER.size:_HEADER.size + len(data)] = data
+        _HEADER.pack_into(buf, 0, len(data))
+
+    def _segment_name(self, key):
+        return f"{self.namespace}_{hashlib.sha256(key.encode()).hexdigest()[:20]}"
+
+    def _evict_for(self, index, incoming, incoming_entry=0):
+        # Makes room for `incoming` segment bytes and `incoming_entry` index bytes
+        used = sum(meta["size"] for meta in index.values())
+        (index_used,) = _HEADER.unpack_from(self._index_shm.buf, 0)  # index is as last written
+        index_limit = INDEX_BYTES - _HEADER.size - INDEX_SLACK
+        for key in sorted(index, key=lambda k: index[k]["last_used"]):
+            if used + incoming <= self.max_bytes and index_used + incoming_entry <= index_limit:
+                break
+            meta = index.pop(key)
+            used -= meta["size"]
+            index_used -= _entry_bytes(key, meta)
+            self.evictions += 1
+            _unlink(meta["name"])
+
+    # --- Publish / lookup ---
+    def _publish(self, key, payload, meta):
+        size = max(len(payload), 1)
+        if size > self.max_bytes:
+            return False
+        with self._locked():
+            index = self._read_index()
+            if key in index:
+                return True
+            name = self._segment_name(key)
+            # created tells a republished segment (same name) from the one a process mapped before
+            entry = dict(meta, name=name, size=size, created=time.time_ns(), last_used=time.time())
+            entry_bytes = _entry_bytes(key, entry)
+            if entry_bytes > INDEX_BYTES - _HEADER.size - INDEX_SLACK:
+                return False
+            self._evict_for(index, size, entry_bytes)
+            try:
+                shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # Left over from an entry that was dropped from the index
+                _unlink(name)
+                shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            _untrack(shm)
+            shm.buf[:len(payload)] = payload
+            shm.close()
+            index[key] = entry
+            try:
+                self._write_index(index)
+            except MemoryError:
+                # Don't leave an unindexed segment behind (still record the evictions)
+                del index[key]
+                _unlink(name)
+                self._write_index(index)
+                return False
+            finally:
+                self._drop_stale(index)
+        return True
+
+    def _drop_stale(self, index):
+        # Unmaps local segments that were evicted or replaced since they were mapped
+        for key, (shm, _, meta, _) in list(self._attached.items()):
+            current = index.get(key)
+            if current is None or current.get("created") != meta.get("created"):
+                del self._attached[key]
+                _release(shm)
+
+    def _attach(self, key):
+        now = time.monotonic()
+        cached = self._attached.get(key)
+        if cached is not None and now - cached[3] < SYNC_SECONDS:
+            self.hits += 1
+            return cached[1], cached[2]
+        with self._locked():
+            index = self._read_index()
+            self._drop_stale(index)
+            meta = index.get(key)
+            if meta is None:
+                self.misses += 1
+                return None
+            cached = self._attached.get(key)
+            if cached is not None:
+                shm, buf = cached[0], cached[1]
+            else:
+                try:
+                    shm = shared_memory.SharedMemory(name=meta["name"])
+                except FileNotFoundError:
+                    del index[key]
+                    self._write_index(index)
+                    self.misses += 1
+                    return None
+                _untrack(shm)
+                buf = shm.buf
+            meta["last_used"] = time.time()
+            self._write_index(index)
+        self._attached[key] = (shm, buf, meta, now)
+        self.hits += 1
+        return buf, meta
+
+    def put_array(self, key, array):
+        array = np.ascontiguousarray(array)
+        return self._publish(key, array.tobytes(), {"kind": "array", "dtype": array.dtype.str,
+                                                    "shape": list(array.shape)})
+
+    def get_array(self, key):
+        """Read-only NumPy view of a shared array (no copy), or None."""
+        found = self._attach(key)
+        if found is None:
+            return None
+        buf, meta = found
+        array = np.ndarray(meta["shape"], dtype=np.dtype(meta["dtype"]), buffer=buf)
+        array.flags.writeable = False
+        return array
+
+    def put_object(self, key, value):
+        return self._publish(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), {"kind": "pickle"})
+
+    def get_object(self, key, default=None):
+        found = self._attach(key)
+        if found is None:
+            return default
+        buf, meta = found
+        return pickle.loads(buf[:meta["size"]])
+
+    def keys(self):
+        with self._locked():
+            return list(self._read_index())
+
+    def used_bytes(self):
+        with self._locked():
+            return sum(meta["size"] for meta in self._read_index().values())
+
+    def clear(self):
+        """Unlinks every segment in the store (all processes)."""
+        with self._locked():
+            index = self._read_index()
+            self._evict_for(index, self.max_bytes + 1)
+            self._write_index({})
+            self._drop_stale({})
+
+
+_default_store = None
+
+
+def default_store():
+    """Process-wide store configured by HVS_SHM_CACHE_MB (None if unset or unsupported)."""
+    global _default_store
+    budget_mb = os.environ.get("HVS_SHM_CACHE_MB")
+    if not budget_mb or fcntl is None:
+        return None
+    if _default_store is None:
+        _default_store = SharedMemoryStore(max_bytes=int(float(budget_mb) * (1 << 20)))
+    return _default_store
@@ -1,11 +1,83 @@
 import data_loader
+import metrics
+import transaction_costs
 from models import HousingInvestment, StockInvestment
 
+# Snapshot frequency -> months between history rows
+SNAPSHOT_MONTHS = {"monthly": 1, "quarterly": 3, "annual": 12}
+
+# Time step -> months per step of the simulation loop
+TIME_STEP_MONTHS = {"monthly": 1, "annual": 12}
+
+STOCK_STEPS = ("monthly", "annual")
+
+# Bump when a model change alters results (cache keys include it, so older cached results stop matching)
+MODEL_VERSION = 2
+
+@metrics.timed("hvs_simulation", "run_simulation")
 def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=None, city="National", marginal_tax_rate=0.40, move_freq_years="Never",
-                   property_tax_rate_pct=0.6, monthly_insurance=150):
+                   property_tax_rate_pct=0.6, monthly_insurance=150, engine="python", summary_only=False, snapshot_freq="monthly",
+                   closing_costs=None, stock_step="monthly", end_year=2024, time_step="monthly"):
     """
     Runs the simulation and returns a dictionary with results and history.
+
+    engine="kernel" runs the same model on the flat-array kernel (kernel.py),
+    which is JIT-compiled when Numba is installed. engine="events" runs it as
+    dated events with closed-form stretches in between (events.py).
+    summary_only=True skips the history entirely ("history" is an empty list);
+    sweeps and optimizers only need the final numbers.
+    snapshot_freq ("monthly", "quarterly", "annual") records one history row per
+    period, taken at the period's last month. Flow columns (Refund Reinvested,
+    Transaction Cost) are summed over the period.
+    closing_costs: purchase closing costs if already known (run_sweep computes
+    them for every scenario in one vectorized call).
+    time_step="annual" (or stock_step="annual", the same thing) steps the whole
+    model a year at a time, for coarse-grained analyses, skipping the monthly loop:
+    the housing leg in closed form with every month's price
+    (HousingInvestment.simulate_period), the stock accounts with
+    StockInvestment.simulate_period fed each month's contribution (monthly_costs),
+    so months where rent exceeds the owner's costs still withdraw. Renewals, moves
+    and room accrual fall on Januaries; the March refund is deposited in its month.
+    House net is exact, stock net within ~0.06%, 1.5-2x faster than monthly (see
+    accuracy.py). Stock balances only exist at year end, so it needs
+    summary_only=True or snapshot_freq="annual", and engine="python".
+    end_year: last simulated year (longer horizons need data tables that cover
+    them, e.g. synthetic.installed()).
     """
+    if snapshot_freq not in SNAPSHOT_MONTHS:
+        raise ValueError(f"Unknown snapshot_freq: {snapshot_freq!r}")
+    snapshot_months = SNAPSHOT_MONTHS[snapshot_freq]
+    if time_step not in TIME_STEP_MONTHS:
+        raise ValueError(f"Unknown time_step: {time_step!r}")
+    step_months = TIME_STEP_MONTHS[time_step]
+    if stock_step not in STOCK_STEPS:
+        raise ValueError(f"Unknown stock_step: {stock_step!r}")
+    # Months per loop iteration: a year with either option (the housing leg in closed form
+    # with every month's price, per-month costs for the stock contributions)
+    loop_months = 12 if stock_step == "annual" else step_months
+    if loop_months > 1 and engine != "python":
+        raise ValueError("stock_step and time_step other than 'monthly' need engine='python'")
+    if not summary_only and snapshot_months % loop_months:
+        raise ValueError(f"snapshot_freq={snapshot_freq!r} is finer than the time step; "
+                         "use summary_only=True or a coarser snapshot_freq")
+
+    if engine == "kernel":
+        import kernel
+        return kernel.run_kernel(start_year, mortgage_years, down_payment_pct, initial_rent=initial_rent,
+                                 city=city, marginal_tax_rate=marginal_tax_rate, move_freq_years=move_freq_years,
+                                 property_tax_rate_pct=property_tax_rate_pct, monthly_insurance=monthly_insurance,
+                                 summary_only=summary_only, snapshot_freq=snapshot_freq,
+                                 closing_costs=closing_costs, end_year=end_year)
+    elif engine == "events":
+        import events
+        return events.run_events(start_year, mortgage_years, down_payment_pct, initial_rent=initial_rent,
+                                 city=city, marginal_tax_rate=marginal_tax_rate, move_freq_years=move_freq_years,
+                                 property_tax_rate_pct=property_tax_rate_pct, monthly_insurance=monthly_insurance,
+                                 summary_only=summary_only, snapshot_months=snapshot_months,
+                                 closing_costs=closing_costs, end_year=end_year)
+    elif engine != "python":
+        raise ValueError(f"Unknown engine: {engine!r}")
+
     # 1. Setup Data - Regional
     house_price = data_loader.get_housing_price(start_year, city=city)
     
@@ -22,8 +94,9 @@ def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=No
     raw_down_payment = house_price * (down_payment_pct / 100.0)
     
     # Temporary placeholder to calc costs
-    temp_house = HousingInvestment(start_year, house_price, raw_down_payment) 
-    closing_costs = temp_house.get_closing_costs(city)
+    if closing_costs is None:
+        temp_house = HousingInvestment(start_year, house_price, raw_down_payment) 
+        closing_costs = temp_house.get_closing_costs(city)
     
     # Total Initial Capital Required for Housing Path
     total_initial_capital = raw_down_payment + closing_costs
@@ -43,13 +116,14 @@ def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=No
 
     # Stock Model Setup
     # Invests the FULL capital (Downpayment + The money that would have gone to LTT)
+    # Lot ledger sized for the initial deposit + at most one purchase per month
     stock_model = StockInvestment(
         start_year=start_year,
-        initial_deposit=total_initial_capital 
+        initial_deposit=total_initial_capital,
+        max_lots=(end_year - start_year + 1) * 12 + 1
     )
     
     # 2. Simulation Loop
-    end_year = 2024
     cumulative_inflation_index = 1.0
     
     current_rent_override = initial_rent
@@ -64,6 +138,12 @@ def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=No
     pending_tax_refund = 0
     
     total_stock_contributions = 0
+    
+    # Running totals (so summary-only runs don't need the history)
+    total_rent_paid = 0
+    total_transaction_friction = 0
+    period_refund = 0
+    period_transaction_cost = 0
 
     for y in range(start_year, end_year + 1):
         # Year Data
@@ -83,8 +163,10 @@ def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=No
         # Add TFSA Room for this year
         # (Assuming user was 18+ and resident; simplified for 'Scenario' user)
         # Note: data_loader.get_tfsa_limit(y) returns 0 if before 2009
+        # Last year's TFSA withdrawals add their room back
         annual_tfsa_limit = data_loader.get_tfsa_limit(y)
-        unused_tfsa_room += annual_tfsa_limit
+        unused_tfsa_room += annual_tfsa_limit + stock_model.tfsa_withdrawn
+        stock_model.tfsa_withdrawn = 0
         unused_rrsp_room += data_loader.get_rrsp_limit(y)
         
         # Reset Annual Contribution Tracker for Refund Calc
@@ -97,10 +179,13 @@ def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=No
         else:
              year_rent = data_loader.get_average_rent(y, city=city)
 
-        # Monthly Loop
-        for m in range(12):
+        # Monthly Loop (a single iteration on annual steps: m is the step's first month)
+        for m in range(0, 12, loop_months):
+            last_month = m + loop_months - 1
+            
             # Dynamic Monthly Price
-            current_month_price = data_loader.get_monthly_housing_price(y, m+1, city)
+            # (Coarse steps take the step's last month, so the final December value is the same)
+            current_month_price = data_loader.get_monthly_housing_price(y, last_month+1, city)
             
             # Update Housing Model with new Market Value
             # We don't use 'annual appreciation rate' anymore for value updates, 
@@ -111,6 +196,7 @@ def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=No
             housing_model.equity = housing_model.current_value - housing_model.remaining_principal
             
             # Check for Mortgage Renewal (Every 5 years)
+            # (Always a January, so the first month of a coarse step)
             months_elapsed = (y - start_year) * 12 + m
             if months_elapsed > 0 and months_elapsed % (5 * 12) == 0:
                 new_rate_pct = data_loader.get_mortgage_rate(y)
@@ -122,7 +208,13 @@ def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=No
 
             # Process Monthly Payment & Expenses
             # (Inflation passed for maintenance scaling)
-            h_stat = housing_model.simulate_month(y, annual_appreciation_rate=0, annual_inflation_rate=annual_inflation)
+            if loop_months == 1:
+                h_stat = housing_model.simulate_month(y, annual_appreciation_rate=0, annual_inflation_rate=annual_inflation)
+            else:
+                year_prices = data_loader.get_monthly_housing_prices(y, city)
+                month_costs = housing_model.monthly_costs(12, annual_inflation, year_prices)
+                h_stat = housing_model.simulate_period(y, 12, annual_inflation_rate=annual_inflation,
+                                                       monthly_values=year_prices)
             
             # --- Moving Scenario Logic (Friction Costs) ---
             transaction_cost_this_month = 0
@@ -133,19 +225,29 @@ def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=No
                     # SELL OLD HOUSE
                     # Costs: Agent Fees (~5%) + Legal
                     # Use existing helper (calculates commission)
-                    net_proceeds = housing_model.get_net_proceeds()
-                    selling_friction = housing_model.equity - net_proceeds
+                    if loop_months == 1:
+                        net_proceeds = housing_model.get_net_proceeds(city)
+                        selling_friction = housing_model.equity - net_proceeds
+                    else:
+                        # Sold in the step's first month, at that month's price
+                        move_price = data_loader.get_monthly_housing_price(y, m+1, city)
+                        selling_friction = transaction_costs.selling_costs(move_price, city)
                     
                     # BUY NEW HOUSE (Lateral Move)
                     # Assume buying same price house (Lateral Upgrade)
                     # Costs: Land Transfer Tax (LTT) + Legal
-                    buying_friction = housing_model.get_closing_costs(city)
+                    # (Charged on the original purchase price, so same as the initial closing costs)
+                    buying_friction = closing_costs
                     
                     total_friction = selling_friction + buying_friction
                     transaction_cost_this_month = total_friction
+                    total_transaction_friction += total_friction
                     
                     # Deduct from Equity (Wealth Destruction)
-                    housing_model.equity -= total_friction
+                    # (Equity is recomputed from the price next month, so this only shows in the
+                    # move month's snapshot; coarse steps end after the move month and skip it)
+                    if loop_months == 1:
+                        housing_model.equity -= total_friction
                     
                     # Re-Amortize? 
                     # Usually people port mortgages or start new 25y. 
@@ -158,15 +260,20 @@ def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=No
                         
             # Cash Flow
             # Now includes Property Tax + Insurance
+            # (Totals over the step for coarse steps)
             housing_monthly_cost = h_stat['payment'] + h_stat['maintenance'] + h_stat['property_tax'] + h_stat['insurance']
-            monthly_stock_contribution = housing_monthly_cost - year_rent
+            monthly_stock_contribution = housing_monthly_cost - year_rent * loop_months
+            total_rent_paid += year_rent * loop_months
             
             # Inject PROCESSED Tax Refund in March (Standard Canada timing)
+            # Net of capital gains tax owed on last year's withdrawals (can be negative)
             refund_this_month = 0
-            if m == 2 and pending_tax_refund > 0:
-                monthly_stock_contribution += pending_tax_refund
-                refund_this_month = pending_tax_refund
-                pending_tax_refund = 0 # Consumed
+            if m <= 2 <= last_month:
+                if pending_tax_refund != 0:
+                    monthly_stock_contribution += pending_tax_refund
+                    refund_this_month = pending_tax_refund
+                    pending_tax_refund = 0 # Consumed
+                stock_model.capital_gains_tax_due = 0
             
             total_stock_contributions += monthly_stock_contribution
 
@@ -179,18 +286,37 @@ def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=No
             div_yield = 0.018
             tax_drag = div_yield * marginal_tax_rate
             
-            s_stat = stock_model.simulate_month(y, annual_return_rate=annual_stock_return, 
-                                                monthly_contribution=monthly_stock_contribution,
-                                                tfsa_limit_room=unused_tfsa_room,
-                                                rrsp_limit_room=unused_rrsp_room,
-                                                mer_fee_rate=mer_rate,
-                                                tax_drag_rate=tax_drag)
+            if loop_months == 1:
+                s_stat = stock_model.simulate_month(y, annual_return_rate=annual_stock_return, 
+                                                    monthly_contribution=monthly_stock_contribution,
+                                                    tfsa_limit_room=unused_tfsa_room,
+                                                    rrsp_limit_room=unused_rrsp_room,
+                                                    mer_fee_rate=mer_rate,
+                                                    tax_drag_rate=tax_drag,
+                                                    marginal_tax_rate=marginal_tax_rate)
+            else:
+                # The whole year in one step, each month's own contribution (refund apart, in March)
+                s_stat = stock_model.simulate_period(y, annual_stock_return,
+                                                     [cost - year_rent for cost in month_costs],
+                                                     refund=refund_this_month, refund_month=2,
+                                                     tfsa_limit_room=unused_tfsa_room,
+                                                     rrsp_limit_room=unused_rrsp_room,
+                                                     mer_fee_rate=mer_rate,
+                                                     tax_drag_rate=tax_drag,
+                                                     marginal_tax_rate=marginal_tax_rate)
             
             # Deduct used room
             unused_tfsa_room -= s_stat.get('tfsa_used', 0)
             unused_rrsp_room -= s_stat.get('rrsp_used', 0)
             
             # Snapshot
+            if summary_only:
+                continue
+            period_refund += refund_this_month
+            period_transaction_cost += transaction_cost_this_month
+            if (last_month + 1) % snapshot_months != 0:
+                continue
+            
             real_house_equity = housing_model.equity / cumulative_inflation_index
             real_stock_balance = stock_model.balance / cumulative_inflation_index
             
@@ -198,8 +324,8 @@ def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=No
             
             history_data.append({
                 "Year": y,
-                "Month": m + 1,
-                "Date": f"{y}-{m+1:02d}",
+                "Month": last_month + 1,
+                "Date": f"{y}-{last_month+1:02d}",
                 "House Price": housing_model.current_value,
                 "House Equity": housing_model.equity,
                 "Stock Balance": stock_model.balance,
@@ -208,26 +334,25 @@ def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=No
                 "Inflation Index": cumulative_inflation_index,
                 "Rent Paid (Stock Scenario)": year_rent, # Monthly Rent
                 "Mortgage Rate (%)": current_mortgage_rate_display,
-                "Refund Reinvested": refund_this_month,
-                "Transaction Cost": transaction_cost_this_month
+                "Refund Reinvested": period_refund,
+                "Transaction Cost": period_transaction_cost
             })
+            period_refund = 0
+            period_transaction_cost = 0
         
         # End of Year: Calculate Tax Refund for NEXT year
-        # Refund = RRSP Contributions * Marginal Tax Rate
-        pending_tax_refund = stock_model.annual_rrsp_contributions * marginal_tax_rate
+        # Refund = RRSP Contributions * Marginal Tax Rate - Tax on capital gains realized this year
+        capital_gains_tax = stock_model.settle_capital_gains(y, marginal_tax_rate)
+        pending_tax_refund = stock_model.annual_rrsp_contributions * marginal_tax_rate - capital_gains_tax
     
     # Final 'Net Cash' Calculation (After Taxes/Fees)
     # Housing: Net Proceeds = Equity - Agent Fees - Legal
-    final_net_housing = housing_model.get_net_proceeds() 
+    final_net_housing = housing_model.get_net_proceeds(city) 
     selling_costs = housing_model.equity - final_net_housing
     
     # Stocks: After Tax Value
     final_net_stocks = stock_model.get_after_tax_value(end_year, marginal_tax_rate)
     
-    # Calculate Totals for Analysis
-    total_rent_paid = sum(d['Rent Paid (Stock Scenario)'] for d in history_data)
-    total_transaction_friction = sum(d['Transaction Cost'] for d in history_data)
-        
     return {
         "history": history_data,
         "final_house_equity_gross": housing_model.equity,
@@ -248,5 +373,8 @@ def run_simulation(start_year, mortgage_years, down_payment_pct, initial_rent=No
         "total_stock_contributions": total_stock_contributions,
         "total_transaction_friction": total_transaction_friction,
         "total_stock_fees": stock_model.total_fees_paid,
-        "total_stock_tax_drag": stock_model.total_tax_drag_cost
+        "total_stock_tax_drag": stock_model.total_tax_drag_cost,
+        "total_stock_withdrawals": stock_model.total_withdrawals,
+        "total_withdrawal_tax": stock_model.total_withdrawal_tax,
+        "unfunded_shortfall": stock_model.unfunded_shortfall
     }
@@ -0,0 +1,106 @@
+"""
+Stress-test library: named shocks applied as overlays on the market data.
+
+An overlay takes the kernel's MarketArrays for a scenario and returns a
+modified copy (only the arrays it touches are copied). The data_loader tables
+are never edited. run_stress_tests() evaluates the base and every overlay on
+the kernel, sharing the months before each shock.
+
+Shock timing is relative to the scenario's start (year index 0 = start_year).
+"""
+from functools import partial
+
+import numpy as np
+
+import metrics
+import scenario_tree
+
+
+def _with(market, field, values):
+    values = np.asarray(values, dtype=float)
+    values.flags.writeable = False
+    return market._replace(**{field: values})
+
+
+def rate_spike(market, bp=300, from_year=5):
+    """Mortgage rates +bp from `from_year` on (year 5 = first renewal)."""
+    rates = market.mortgage_rate.copy()
+    rates[from_year:] += bp / 10000.0
+    return _with(market, "mortgage_rate", rates)
+
+
+def house_price_drop(market, drop=0.30, from_year=1, over_years=2):
+    """House prices fall by `drop` (geometrically) over `over_years`, then stay that much below the base path."""
+    months = np.arange(len(market.monthly_price))
+    start, length = from_year * 12, over_years * 12
+    progress = np.clip((months - start + 1) / length, 0.0, 1.0)
+    return _with(market, "monthly_price", market.monthly_price * (1 - drop) ** progress)
+
+
+def stock_crash(market, annual_return=-0.40, year=0):
+    """Replaces one year's stock return with a crash."""
+    returns = market.stock_return.copy()
+    returns[year] = annual_return
+    return _with(market, "stock_return", returns)
+
+
+def lost_decade(market, from_year=0, years=10):
+    """Flat (0%) stock returns for a decade."""
+    returns = market.stock_return.copy()
+    returns[from_year:from_year + years] = 0.0
+    return _with(market, "stock_return", returns)
+
+
+def rent_freeze(market, from_year=0, years=5):
+    """Rent control: rent is held flat for `years`, then grows as before from the frozen level."""
+    rent = market.rent.copy()
+    end = min(from_year + years, len(rent) - 1)
+    frozen = rent[from_year]
+    if end > from_year:
+        rent[end:] *= frozen / rent[end]
+    rent[from_year:end] = frozen
+    return _with(market, "rent", rent)
+
+
+def inflation_surge(market, extra=0.05, from_year=0, years=3):
+    """CPI several points higher for a few years (maintenance, insurance and real values)."""
+    inflation = market.inflation.copy()
+    inflation[from_year:from_year + years] += extra
+    return _with(market, "inflation", inflation)
+
+
+STRESS_SCENARIOS = {
+    "+300bp Rate Spike at Renewal": partial(rate_spike, bp=300, from_year=5),
+    "30% House Price Drop over 2 Years": partial(house_price_drop, drop=0.30, from_year=1, over_years=2),
+    "Stock Crash in Year 1": partial(stock_crash, annual_return=-0.40, year=0),
+    "Lost Decade for Stocks": partial(lost_decade, from_year=0, years=10),
+    "Rent Control Freeze (5 Years)": partial(rent_freeze, from_year=0, years=5),
+    "Inflation Surge (+5pts, 3 Years)": partial(inflation_surge, extra=0.05, from_year=0, years=3),
+}
+
+
+@metrics.timed("hvs_stress_tests", "run_stress_tests")
+def run_stress_tests(scenario, overlays=None):
+    """
+    Evaluates the base scenario (run_simulation keyword arguments) and every overlay.
+    Returns one row per scenario: House Net, Stock Net, Difference and changes vs Base.
+    Without Numba the months before each shock are simulated once for all of them (scenario_tree.py).
+    """
+    overlays = STRESS_SCENARIOS if overlays is None else overlays
+    names = ["Base"] + list(overlays)
+    results, _ = scenario_tree.run_tree([scenario] * len(names), [None] + list(overlays.values()))
+
+    base = results[0]
+    rows = []
+    for name, result in zip(names, results):
+        house, stock = result["final_house_net"], result["final_stock_net"]
+        rows.append({
+            "Scenario": name,
+            "House Net": house,
+            "Stock Net": stock,
+            "House - Stock": house - stock,
+            "Winner": "House" if house > stock else "Stocks",
+            "House vs Base": house - base["final_house_net"],
+            "Stock vs Base": stock - base["final_stock_net"],
+        })
+    return rows
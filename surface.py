@@ -0,0 +1,195 @@
+"""
+Precomputed outcome surface over the app's sidebar inputs, for live previews.
+
+The sidebar spans a small bounded space. City, start year, amortization and
+move frequency take few (integer) values and get every value on the grid;
+down payment and marginal tax rate get a set of nodes and are interpolated
+bilinearly in between. House net wealth is linear in both (exact); stock net
+wealth is piecewise linear, with kinks where contributions fill the registered
+accounts, so it is off by a fraction of a percent near those.
+
+Built offline (~1.5 minutes on the kernel; --parallel uses every core):
+
+    python surface.py            # writes surface.npz (or $HVS_SURFACE_PATH)
+
+The build checks itself against exact runs at random off-grid slider positions
+and stores the largest error it saw. That is an empirical maximum over those
+N_VALIDATION samples, not a guarantee: a point it didn't sample can be further
+off. The file carries a stamp of the data tables and the model version; load()
+ignores a stale one.
+Previews need historical rent (the rent override isn't a grid dimension).
+"""
+import bisect
+import itertools
+import json
+import os
+from collections import namedtuple
+from multiprocessing import Pool
+
+import numpy as np
+
+import dataset_version
+import metrics
+import scenario_tree
+import simulation
+import sweep
+import warmup
+
+DEFAULT_PATH = os.environ.get("HVS_SURFACE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "surface.npz"))
+
+# Grid axes, in the order of the values array
+AXES = {
+    "city": tuple(warmup.CITIES),
+    "start_year": tuple(range(1975, 2021)),
+    "amortization": (15, 20, 25, 30),
+    "move_freq": ("Never", 5, 7, 10, 15),
+    # Every 5 points: coarser nodes miss the kinks where contributions outgrow TFSA / RRSP room
+    "down_payment_pct": tuple(range(5, 55, 5)),
+    "marginal_tax_pct": tuple(range(0, 55, 5)) + (54,),
+}
+
+METRICS = ("final_house_net", "final_stock_net")
+
+N_VALIDATION = 300  # Off-grid spot checks behind the stated error
+
+# axes: {name: node tuple}, values: (*axis lengths, len(METRICS)) array,
+# error_bound: {metric or "house_minus_stock": {"max_abs", "p95_abs", "max_rel", "n_samples"}} (empirical, see measure_error)
+Surface = namedtuple("Surface", ["axes", "values", "error_bound", "stamp", "model_version"])
+
+
+def _slice_scenarios(city, start_year, axes):
+    # Every grid point of one (city, start year): its market data is built once
+    return [warmup.app_scenario(start_year, amortization, dp, None, city, tax, move)
+            for amortization, move, dp, tax in itertools.product(
+                axes["amortization"], axes["move_freq"], axes["down_payment_pct"], axes["marginal_tax_pct"])]
+
+
+def _run(scenarios):
+    results, _ = scenario_tree.run_tree(scenarios, closing_costs=sweep.scenario_closing_costs(scenarios))
+    return np.array([[r[m] for m in METRICS] for r in results])
+
+
+def _run_slice(args):
+    city, start_year, axes = args
+    return _run(_slice_scenarios(city, start_year, axes))
+
+
+@metrics.timed("hvs_surface_build", "build")
+def build(axes=AXES, processes=None, n_validation=N_VALIDATION, seed=0):
+    """Runs every grid point (kernel, via scenario_tree.run_tree) and measures the interpolation error."""
+    jobs = [(city, year, axes) for city in axes["city"] for year in axes["start_year"]]
+    if not processes or processes <= 1:
+        slices = [_run_slice(job) for job in jobs]
+    else:
+        with Pool(processes) as pool:
+            slices = pool.map(_run_slice, jobs)
+    shape = tuple(len(nodes) for nodes in axes.values()) + (len(METRICS),)
+    # Slices are city-major, then year; inside a slice amortization, move, down payment, tax
+    values = np.stack(slices).reshape(shape)
+
+    surface = Surface(axes, values, {}, dataset_version.stamp(dataset_version.SIMULATION_TABLES),
+                      simulation.MODEL_VERSION)
+    return surface._replace(error_bound=measure_error(surface, n_validation, seed))
+
+
+def _off_grid(nodes, low, high, rng, n):
+    # Integer slider positions that aren't grid nodes (the nodes themselves are exact)
+    choices = [v for v in range(low, high + 1) if v not in nodes]
+    return rng.choice(choices, n)
+
+
+def measure_error(surface, n=N_VALIDATION, seed=0):
+    """
+    Interpolation error against exact runs at n random off-grid slider positions.
+    The maxima are the largest errors among those n samples, not bounds over the whole space.
+    """
+    if n <= 0:
+        return {}
+    axes = surface.axes
+    rng = np.random.default_rng(seed)
+    dps = _off_grid(axes["down_payment_pct"], axes["down_payment_pct"][0], axes["down_payment_pct"][-1], rng, n)
+    taxes = _off_grid(axes["marginal_tax_pct"], axes["marginal_tax_pct"][0], axes["marginal_tax_pct"][-1], rng, n)
+    points = [dict(city=axes["city"][rng.integers(len(axes["city"]))],
+                   start_year=int(rng.choice(axes["start_year"])),
+                   amortization=int(rng.choice(axes["amortization"])),
+                   move_freq=axes["move_freq"][rng.integers(len(axes["move_freq"]))],
+                   down_payment_pct=int(dp), marginal_tax_pct=int(tax))
+              for dp, tax in zip(dps, taxes)]
+    exact = _run([warmup.app_scenario(p["start_year"], p["amortization"], p["down_payment_pct"], None, p["city"],
+                                      p["marginal_tax_pct"], p["move_freq"]) for p in points])
+    approx = np.array([[e[m] for m in METRICS] for e in (evaluate(surface, **p) for p in points)])
+
+    columns = {m: i for i, m in enumerate(METRICS)}
+    bounds = {}
+    for name, (a, b) in {**{m: (approx[:, i], exact[:, i]) for m, i in columns.items()},
+                         "house_minus_stock": (approx[:, 0] - approx[:, 1], exact[:, 0] - exact[:, 1])}.items():
+        error = np.abs(a - b)
+        bounds[name] = {
+            "max_abs": float(error.max()),
+            "p95_abs": float(np.percentile(error, 95)),
+            "max_rel": float(np.max(error / np.maximum(np.abs(b), 1.0))),
+            "n_samples": n,
+        }
+    return bounds
+
+
+def _bracket(nodes, value):
+    # (lower index, weight of the upper node), clamped to the grid
+    if value <= nodes[0]:
+        return 0, 0.0
+    if value >= nodes[-1]:
+        return len(nodes) - 2, 1.0
+    i = bisect.bisect_right(nodes, value) - 1
+    return i, (value - nodes[i]) / (nodes[i + 1] - nodes[i])
+
+
+def evaluate(surface, city, start_year, amortization, down_payment_pct, marginal_tax_pct, move_freq):
+    """
+    Interpolated final metrics for one slider position: {metric: value}.
+    Exact on the other axes' grid values; raises KeyError outside them.
+    """
+    axes = surface.axes
+    cell = surface.values[axes["city"].index(city), axes["start_year"].index(start_year),
+                          axes["amortization"].index(amortization), axes["move_freq"].index(move_freq)]
+    i, u = _bracket(axes["down_payment_pct"], down_payment_pct)
+    j, v = _bracket(axes["marginal_tax_pct"], marginal_tax_pct)
+    corners = cell[i:i + 2, j:j + 2]
+    interpolated = ((1 - u) * ((1 - v) * corners[0, 0] + v * corners[0, 1])
+                    + u * ((1 - v) * corners[1, 0] + v * corners[1, 1]))
+    return dict(zip(METRICS, interpolated.tolist()))
+
+
+def save(surface, path=DEFAULT_PATH):
+    meta = {"axes": surface.axes, "error_bound": surface.error_bound, "stamp": surface.stamp,
+            "model_version": surface.model_version}
+    with open(path, "wb") as f:
+        np.savez_compressed(f, values=surface.values, meta=np.array(json.dumps(meta)))
+
+
+def load(path=DEFAULT_PATH):
+    """The saved surface, or None if there is none or it was built from other tables / model version."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        values = data["values"]
+    if meta["model_version"] != simulation.MODEL_VERSION or not dataset_version.is_current(meta["stamp"]):
+        return None
+    # JSON turns tuples into lists (and the "Never" move frequency stays a string)
+    axes = {name: tuple(nodes) for name, nodes in meta["axes"].items()}
+    return Surface(axes, values, meta["error_bound"], meta["stamp"], meta["model_version"])
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    start = time.perf_counter()
+    surface = build(processes=os.cpu_count() if "--parallel" in sys.argv else None)
+    save(surface)
+    points = int(np.prod(surface.values.shape[:-1]))
+    print(f"{points:,} grid points in {time.perf_counter() - start:.0f}s -> {DEFAULT_PATH}")
+    print(f"Interpolation error in {N_VALIDATION} random off-grid spot checks (empirical, not a guarantee)")
+    print(f"{'Metric':<20}{'Max $':>12}{'p95 $':>10}{'Max %':>8}")
+    for name, bound in surface.error_bound.items():
+        print(f"{name:<20}{bound['max_abs']:>12,.0f}{bound['p95_abs']:>10,.0f}{bound['max_rel'] * 100:>8.2f}")
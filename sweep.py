@@ -0,0 +1,79 @@
+"""
+Parameter sweeps: run_simulation over many scenarios, keeping only the final numbers.
+"""
+import itertools
+from multiprocessing import Pool
+
+import numpy as np
+
+import data_loader
+import metrics
+import scenario_tree
+import simulation
+import transaction_costs
+
+scenarios_run = metrics.counter("hvs_sweep_scenarios_total", "Scenarios run by run_sweep")
+pool_queue_depth = metrics.gauge("hvs_sweep_queue_depth", "Sweep scenarios submitted to the worker pool and not finished yet")
+
+
+def scenario_grid(**param_values):
+    """
+    Cartesian product of run_simulation keyword arguments.
+    e.g. scenario_grid(start_year=range(1975, 2021), city=["Toronto", "Calgary"], mortgage_years=[25])
+    """
+    names = list(param_values)
+    return [dict(zip(names, values)) for values in itertools.product(*param_values.values())]
+
+
+def scenario_closing_costs(scenarios):
+    """Purchase closing costs for every scenario, computed in one vectorized call."""
+    if not scenarios:
+        return []
+    cities = [s.get("city", "National") for s in scenarios]
+    years = np.array([s["start_year"] for s in scenarios])
+    prices = np.array([data_loader.get_housing_price(s["start_year"], city=c) for s, c in zip(scenarios, cities)])
+    return transaction_costs.closing_costs(prices, np.array(cities, dtype=object), years).tolist()
+
+
+def run_scenario(scenario, engine="python", closing_costs=None):
+    """Runs one scenario in summary-only mode and returns a flat result row."""
+    results = simulation.run_simulation(**scenario, engine=engine, summary_only=True,
+                                        closing_costs=closing_costs)
+    del results["history"]
+    row = dict(scenario)
+    row.update(results)
+    return row
+
+
+def _run_scenario_star(args):
+    return run_scenario(*args)
+
+
+@metrics.timed("hvs_sweep", "run_sweep")
+def run_sweep(scenarios, engine="python", processes=None, chunksize=16):
+    """
+    Runs every scenario and returns one result row per scenario (same order).
+    processes > 1 spreads the work over a multiprocessing pool.
+    engine="tree" runs on the kernel through scenario_tree.run_tree, which simulates months
+    shared by several scenarios (e.g. move frequencies) only once when Numba is missing.
+    """
+    costs = scenario_closing_costs(scenarios)
+    if engine == "tree":
+        scenarios_run.inc(len(scenarios))
+        results, _ = scenario_tree.run_tree(scenarios, closing_costs=costs)
+        return [dict(scenario, **result) for scenario, result in zip(scenarios, results)]
+
+    jobs = [(scenario, engine, cost) for scenario, cost in zip(scenarios, costs)]
+    scenarios_run.inc(len(jobs))
+    if not processes or processes <= 1:
+        return [_run_scenario_star(job) for job in jobs]
+    rows = []
+    pool_queue_depth.inc(len(jobs))
+    try:
+        with Pool(processes) as pool:
+            for row in pool.imap(_run_scenario_star, jobs, chunksize=chunksize):
+                rows.append(row)
+                pool_queue_depth.inc(-1)
+    finally:
+        pool_queue_depth.inc(len(rows) - len(jobs))
+    return rows
@@ -0,0 +1,161 @@
+"""
+Synthetic market data at scale, for stress-testing the loader and the engines.
+
+Simulates monthly paths for a national economy (CPI, mortgage rates, stock
+returns, house prices, rent) with correlated shocks, plus any number of
+regions whose prices load on the national housing cycle with their own
+mean-reverting premium. The monthly paths are then aggregated into the same
+tables data_loader uses (HOUSING_PRICES, STOCK_RETURNS, REGIONAL_PREMIUMS, ...),
+so everything downstream runs unchanged:
+
+    data = synthetic.generate(n_regions=300, n_years=300, seed=1)
+    with synthetic.installed(data):
+        simulation.run_simulation(1975, 25, 20, city="Region 0042", end_year=2274)
+
+Parameters are rough long-run Canadian magnitudes, not a calibrated model.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+import data_loader
+
+SyntheticData = namedtuple("SyntheticData", ["tables", "monthly", "cities", "years"])
+
+# Correlation of the monthly shocks: stocks, inflation, real rate, house prices
+SHOCK_CORRELATION = np.array([
+    [1.0, -0.2, -0.1, 0.2],
+    [-0.2, 1.0, 0.3, 0.1],
+    [-0.1, 0.3, 1.0, -0.3],
+    [0.2, 0.1, -0.3, 1.0],
+])
+
+INFLATION_MEAN = 0.025
+REAL_RATE_MEAN = 0.025
+MORTGAGE_SPREAD = 0.015
+EQUITY_PREMIUM = 0.045
+STOCK_VOL = 0.16
+HOUSING_REAL_GROWTH = 0.015
+PRICE_RENT_REVERSION = 0.004  # Monthly pull of prices and rents towards the long-run price-to-rent ratio
+HOUSING_VOL = 0.002  # Monthly shock to the (persistent) growth momentum, ~8% annual growth volatility
+
+
+def _ar1(shocks, mean, persistence, vol, start):
+    """Monthly AR(1) path around `mean` driven by standard normal shocks."""
+    path = np.empty(len(shocks))
+    level = start
+    for t, shock in enumerate(shocks):
+        level = mean + persistence * (level - mean) + vol * shock
+        path[t] = level
+    return path
+
+
+def _indexed_limits(real_limits, cpi_index, years, last_real_year, rounding):
+    """Real table up to last_real_year, then the last limit indexed to CPI (rounded like the real ones)."""
+    limits = dict(real_limits)
+    base = real_limits.get(last_real_year, 0)
+    base_index = cpi_index[years.index(last_real_year)] if last_real_year in years else 1.0
+    for i, year in enumerate(years):
+        if year > last_real_year and base:
+            limits[year] = float(round(base * cpi_index[i] / base_index / rounding) * rounding)
+    return limits
+
+
+def generate(n_regions=100, start_year=1975, n_years=100, seed=None):
+    """
+    Synthetic dataset with n_regions regions ("Region 0001", ...) over n_years years.
+    Returns SyntheticData(tables, monthly, cities, years): tables in data_loader's schema
+    (attribute name -> value), the monthly paths they were aggregated from, region names and years.
+    """
+    rng = np.random.default_rng(seed)
+    # One extra year: the loader interpolates each year's prices towards next January's
+    n_months = (n_years + 1) * 12
+    years = list(range(start_year, start_year + n_years))
+
+    # --- National factors ---
+    shocks = rng.standard_normal((n_months, 4)) @ np.linalg.cholesky(SHOCK_CORRELATION).T
+    inflation = _ar1(shocks[:, 1], INFLATION_MEAN, 0.98, 0.003, INFLATION_MEAN)  # Annualized
+    real_rate = _ar1(shocks[:, 2], REAL_RATE_MEAN, 0.99, 0.002, REAL_RATE_MEAN)
+    mortgage_rate = np.maximum(real_rate + inflation + MORTGAGE_SPREAD, 0.01)
+
+    # Stocks: equity premium over the rate level, hit by rate changes
+    rate_change = np.diff(mortgage_rate, prepend=mortgage_rate[0])
+    stock_return = np.exp((real_rate + inflation + EQUITY_PREMIUM - STOCK_VOL**2 / 2) / 12
+                          + STOCK_VOL / np.sqrt(12) * shocks[:, 0] - 2.0 * rate_change) - 1
+
+    # House prices: CPI + real drift, momentum (prices trend), pressured by rate changes.
+    # Rent follows CPI. Both are pulled back towards the starting price-to-rent ratio,
+    # so prices can run ahead of rents for years but not forever.
+    momentum = _ar1(shocks[:, 3], 0.0, 0.95, HOUSING_VOL, 0.0)
+    rent_noise = 0.001 * rng.standard_normal(n_months)
+    log_price = np.empty(n_months)
+    log_rent = np.empty(n_months)
+    price_level, rent_level = np.log(42000), np.log(190)
+    anchor = price_level - rent_level
+    for t in range(n_months):
+        gap = price_level - rent_level - anchor
+        price_level += ((inflation[t] + HOUSING_REAL_GROWTH) / 12 + momentum[t] - 0.5 * rate_change[t]
+                        - PRICE_RENT_REVERSION * gap)
+        rent_level += (inflation[t] + HOUSING_REAL_GROWTH) / 12 + PRICE_RENT_REVERSION * gap + rent_noise[t]
+        log_price[t] = price_level
+        log_rent[t] = rent_level
+    house_price = np.exp(log_price)
+    rent = np.exp(log_rent)
+
+    # --- Regions: lognormal premium level; the deviation from it mean-reverts, amplifies or
+    # damps the national cycle (loading) and has its own shocks ---
+    cities = [f"Region {i + 1:04d}" for i in range(n_regions)]
+    level = rng.lognormal(0.0, 0.35, n_regions)
+    loading = rng.normal(1.0, 0.3, n_regions)
+    log_premium = np.empty((n_months, n_regions))
+    deviation = np.zeros(n_regions)
+    for t in range(n_months):
+        deviation = 0.99 * deviation + (loading - 1) * momentum[t] + 0.005 * rng.standard_normal(n_regions)
+        log_premium[t] = np.log(level) + deviation
+    premium = np.exp(log_premium)
+
+    # --- Aggregate to data_loader's annual tables ---
+    january = np.arange(0, n_years * 12, 12)
+    by_year = lambda monthly: monthly[:n_years * 12].reshape(n_years, 12)
+    cpi_index = np.cumprod(np.prod(1 + by_year(inflation) / 12, axis=1))
+
+    tables = {
+        # Annual values are read as the price at the start of the year
+        "HOUSING_PRICES": {y: float(round(p)) for y, p in zip(years + [years[-1] + 1], house_price[::12])},
+        "STOCK_RETURNS": {y: float(r) for y, r in zip(years, (np.prod(1 + by_year(stock_return), axis=1) - 1) * 100)},
+        "INFLATION_RATES": {y: float(r) for y, r in zip(years, (np.prod(1 + by_year(inflation) / 12, axis=1) - 1) * 100)},
+        "RENTAL_PRICES": {y: float(round(r)) for y, r in zip(years, by_year(rent).mean(axis=1))},
+        "MORTGAGE_RATES": {y: float(round(r, 2)) for y, r in zip(years, by_year(mortgage_rate).mean(axis=1) * 100)},
+        "REGIONAL_PREMIUMS": {y: dict(zip(cities, np.round(premium[m], 4).tolist())) for y, m in zip(years, january)},
+        # Rents are less dispersed than prices
+        "RENT_PREMIUMS": dict(zip(cities, np.round(level**0.6, 3).tolist())),
+        # Dearer regions tend to have lower rates
+        "PROPERTY_TAX_RATES": {**dict(zip(cities, np.round(np.clip(1.0 / level, 0.25, 1.6), 2).tolist())),
+                               "National": data_loader.PROPERTY_TAX_RATES["National"]},
+        "TFSA_LIMITS": _indexed_limits(data_loader.TFSA_LIMITS, cpi_index, years, 2025, 500),
+        "RRSP_LIMITS": _indexed_limits(data_loader.RRSP_LIMITS, cpi_index, years, 2025, 10),
+    }
+    monthly = {name: path[:n_years * 12] for name, path in (
+        ("inflation", inflation),
+        ("mortgage_rate", mortgage_rate),
+        ("stock_return", stock_return),
+        ("house_price", house_price),
+        ("rent", rent),
+        ("regional_premium", premium),
+    )}
+    return SyntheticData(tables, monthly, cities, years)
+
+
+@contextmanager
+def installed(data):
+    """Swaps the synthetic tables into data_loader for the duration of the block."""
+    tables = data.tables if isinstance(data, SyntheticData) else data
+    saved = {name: getattr(data_loader, name) for name in tables}
+    try:
+        for name, value in tables.items():
+            setattr(data_loader, name, value)
+        yield data
+    finally:
+        for name, value in saved.items():
+            setattr(data_loader, name, value)
@@ -0,0 +1,81 @@
+"""
+Buying and selling costs, driven by the schedule tables in data_loader.
+
+Everything here works on whole arrays of prices at once: each bracket schedule
+is compiled into (floors, rates, cumulative tax at each floor) arrays, and a
+price is taxed with one searchsorted lookup instead of a chain of ifs.
+Scalars in -> float out, arrays in -> array out.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+import data_loader
+import dataset_version
+
+
+@lru_cache(maxsize=1024)
+def _compiled_schedule(jurisdiction, year, dataset_hash):
+    """Returns (flat_fee, floors, rates, base_tax) for the schedule in force in `year`."""
+    schedules = data_loader.LAND_TRANSFER_TAX_SCHEDULES[jurisdiction]
+    in_force = [s for s in schedules if s[0] <= year] or schedules[:1]
+    _, flat_fee, brackets = max(in_force, key=lambda s: s[0])
+
+    floors = np.array([floor for floor, _ in brackets], dtype=float)
+    rates = np.array([rate for _, rate in brackets], dtype=float)
+    # Tax owed on everything below each floor
+    base_tax = np.concatenate(([0.0], np.cumsum(np.diff(floors) * rates[:-1])))
+    return float(flat_fee), floors, rates, base_tax
+
+
+def _schedule_tax(prices, jurisdiction, year):
+    flat_fee, floors, rates, base_tax = _compiled_schedule(
+        jurisdiction, int(year), dataset_version.dataset_hash(dataset_version.TRANSACTION_COST_TABLES))
+    idx = np.searchsorted(floors, prices, side="right") - 1
+    idx = np.clip(idx, 0, len(floors) - 1)
+    return flat_fee + base_tax[idx] + (prices - floors[idx]) * rates[idx]
+
+
+def _as_output(values, scalar_input):
+    return float(values[()]) if scalar_input else values
+
+
+def land_transfer_tax(prices, city="National", year=None):
+    """
+    Land Transfer Tax owed on purchase price(s) in a city.
+    `city` and `year` may be scalars or arrays broadcastable against `prices`.
+    year=None uses the latest schedules.
+    """
+    scalar_input = np.ndim(prices) == 0 and np.ndim(city) == 0 and np.ndim(year) == 0
+    if year is None:
+        year = 9999
+    prices, cities, years = np.broadcast_arrays(np.asarray(prices, dtype=float),
+                                                np.asarray(city, dtype=object),
+                                                np.asarray(year))
+    flat_prices = prices.ravel()
+    flat_tax = np.zeros(flat_prices.shape)
+
+    # One vectorized pass per distinct (city, year) group
+    city_names, city_idx = np.unique(cities.ravel().astype(str), return_inverse=True)
+    year_values, year_idx = np.unique(years.ravel(), return_inverse=True)
+    group_idx = city_idx * len(year_values) + year_idx
+    for group in np.unique(group_idx):
+        members = group_idx == group
+        group_city = city_names[group // len(year_values)]
+        group_year = year_values[group % len(year_values)]
+        for jurisdiction in data_loader.get_land_transfer_jurisdictions(group_city):
+            flat_tax[members] += _schedule_tax(flat_prices[members], jurisdiction, group_year)
+    return _as_output(flat_tax.reshape(prices.shape), scalar_input)
+
+
+def closing_costs(prices, city="National", year=None):
+    """Land Transfer Tax + legal fees paid on purchase."""
+    return land_transfer_tax(prices, city, year) + data_loader.PURCHASE_LEGAL_FEES
+
+
+def selling_costs(values, city="National"):
+    """Agent commission + sales tax on the commission when selling at `values`."""
+    scalar_input = np.ndim(values) == 0
+    commission, sales_tax = data_loader.get_selling_cost_rates(city)
+    fees = np.asarray(values, dtype=float) * commission * (1 + sales_tax)
+    return _as_output(fees, scalar_input)
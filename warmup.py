@@ -0,0 +1,96 @@
+"""
+Startup cache warming.
+
+Fills cache.results_cache in a background thread with the app's default
+scenario first, then a configurable set of popular ones (every city x start
+year at the default amortization / down payment), so most first clicks on
+"Run Simulation" are cache hits.
+
+HVS_WARMUP=off disables it, HVS_WARMUP=default warms only the default scenario.
+"""
+import os
+import threading
+
+import cache
+import data_loader
+import kernel
+
+CITIES = ["National", "Toronto", "Vancouver", "Calgary", "Montreal"]
+
+# Sidebar defaults in app.py
+DEFAULTS = {
+    "start_year": 1990,
+    "amortization": 25,
+    "down_payment_pct": 20,
+    "initial_rent": None,
+    "city": "National",
+    "marginal_tax_pct": 40,
+    "move_freq": "Never",
+}
+
+# Estimated insurance: ~0.2% of purchase price annually
+INSURANCE_RATE = 0.002
+
+POPULAR_START_YEARS = range(1975, 2021)
+POPULAR_CITIES = CITIES
+
+
+def app_scenario(start_year, amortization, down_payment_pct, initial_rent, city, marginal_tax_pct, move_freq):
+    """The run_simulation arguments app.py uses for a set of sidebar values."""
+    start_price = data_loader.get_housing_price(start_year, city)
+    return dict(
+        start_year=start_year,
+        mortgage_years=amortization,
+        down_payment_pct=down_payment_pct,
+        initial_rent=initial_rent,
+        city=city,
+        marginal_tax_rate=marginal_tax_pct / 100.0,
+        move_freq_years=move_freq,
+        property_tax_rate_pct=data_loader.get_property_tax_rate(city),
+        monthly_insurance=(start_price * INSURANCE_RATE) / 12,
+    )
+
+
+def default_scenario():
+    return app_scenario(**DEFAULTS)
+
+
+def popular_scenarios(cities=POPULAR_CITIES, start_years=POPULAR_START_YEARS):
+    """Every city x start year with the other sidebar values at their defaults."""
+    return [app_scenario(**{**DEFAULTS, "city": city, "start_year": year})
+            for city in cities for year in start_years]
+
+
+def warm_cache(scenarios, stop_event=None):
+    """Runs each scenario through the shared results cache. Returns how many were processed."""
+    done = 0
+    for scenario in scenarios:
+        if stop_event is not None and stop_event.is_set():
+            break
+        cache.cached_run_simulation(**scenario)
+        done += 1
+    return done
+
+
+def start_background_warmup(mode=None):
+    """
+    Starts warming in a daemon thread and returns (thread, stop_event), or None if disabled.
+    mode: "off", "default" or "popular" (default: $HVS_WARMUP, else "popular").
+    """
+    mode = mode or os.environ.get("HVS_WARMUP", "popular")
+    if mode == "off":
+        return None
+
+    scenarios = [default_scenario()]
+    if mode == "popular":
+        scenarios += popular_scenarios()
+
+    stop_event = threading.Event()
+
+    def work():
+        kernel.warmup()  # Loads the compiled kernel (if Numba is installed)
+        warm_cache(scenarios, stop_event)
+
+    thread = threading.Thread(target=work, name="cache-warmup", daemon=True)
+    thread.start()
+    return thread, stop_event